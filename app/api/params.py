@@ -0,0 +1,52 @@
+# app/api/params.py
+from __future__ import annotations
+
+import base64
+import json
+from typing import Any, Iterable, Optional, Sequence
+
+from fastapi import HTTPException
+
+
+def parse_fields(fields: Optional[str], allowed: Iterable[str]) -> Optional[set[str]]:
+    """
+    Sparse fieldsets: "siteId,name" -> {"siteId", "name"}.
+
+    Returns None when no selection was given (= every field).
+    Unknown names are a 400 so typos don't silently return empty objects.
+    """
+    if not fields:
+        return None
+
+    wanted = {f.strip() for f in str(fields).split(",") if f.strip()}
+    if not wanted:
+        return None
+
+    unknown = wanted - set(allowed)
+    if unknown:
+        raise HTTPException(400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return wanted
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """
+    Opaque keyset cursor: the sort key of the last row on a page.
+    """
+    raw = json.dumps(list(values), separators=(",", ":"), default=str).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], size: int) -> Optional[list]:
+    """
+    Inverse of encode_cursor. Returns None for no cursor, 400 for a malformed one.
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except Exception:
+        raise HTTPException(400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(400, detail="Invalid cursor")
+    return values
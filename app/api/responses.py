@@ -0,0 +1,90 @@
+# app/api/responses.py
+from __future__ import annotations
+
+import json
+from datetime import date, datetime
+from typing import Any, Iterable, Sequence
+
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware, GZipResponder
+from starlette.types import Message, Receive, Scope, Send
+
+try:
+    import orjson  # type: ignore
+except Exception:
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """
+    Compact JSON bytes. Uses orjson when installed, stdlib json otherwise.
+    """
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+        default=_default,
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response for hot endpoints.
+
+    Return it directly from the route (`return FastJSONResponse(payload)`)
+    so FastAPI skips jsonable_encoder and the payload is serialised once.
+    Content must already be plain JSON types (dict/list/str/int/float/bool/None,
+    datetimes are isoformatted).
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def to_columnar(rows: Sequence[dict], keys: Iterable[str]) -> dict[str, list]:
+    """
+    [{"a": 1, "b": 2}, {"a": 3, "b": 4}] -> {"a": [1, 3], "b": [2, 4]}
+
+    Map views with hundreds of rows stop repeating every key per row.
+    """
+    return {k: [r.get(k) for r in rows] for k in keys}
+
+
+# bodies that are compressed files themselves (e.g. /export ... format=csv)
+COMPRESSED_MEDIA_TYPES = frozenset({"application/gzip", "application/x-gzip"})
+
+
+class _GZipResponder(GZipResponder):
+    async def send_with_gzip(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            media_type = Headers(raw=message["headers"]).get("content-type", "").split(";")[0].strip()
+            await super().send_with_gzip(message)
+            # passed through as-is, like a body that already has a Content-Encoding
+            if media_type in COMPRESSED_MEDIA_TYPES:
+                self.content_encoding_set = True
+            return
+        await super().send_with_gzip(message)
+
+
+class SkipCompressedGZipMiddleware(GZipMiddleware):
+    """
+    GZipMiddleware that leaves COMPRESSED_MEDIA_TYPES bodies alone, so a
+    .csv.gz download isn't gzipped a second time.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and "gzip" in Headers(scope=scope).get("Accept-Encoding", ""):
+            responder = _GZipResponder(self.app, self.minimum_size, compresslevel=self.compresslevel)
+            await responder(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
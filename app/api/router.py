@@ -2,23 +2,33 @@ from fastapi import APIRouter
 
 from app.api.v1.health import router as health
 from app.api.v1.admin_sync import router as admin
+from app.api.v1.alert_metrics import router as alert_metrics_router
 from app.api.v1.catalog import router as catalog
 from app.api.v1.prices import router as prices
 from app.api.v1.auth import router as auth_router
 from app.api.v1.rules import router as rules_router
+from app.api.v1.rule_conflicts import router as rule_conflicts_router
 from app.api.v1.me import router as me_router
+from app.api.v1.dashboard import router as dashboard_router
 from app.api.v1.owned_sites import router as owned_sites_router
 from app.api.v1 import competitors
 from app.api.v1.notifications import router as notifications_router
+from app.api.v1.export import router as export_router
+from app.api.v1.snapshots import router as snapshots_router
 api = APIRouter()
 
 api.include_router(health, prefix="/v1")
 api.include_router(admin, prefix="/v1")
+api.include_router(alert_metrics_router, prefix="/v1")
 api.include_router(catalog, prefix="/v1")
 api.include_router(prices, prefix="/v1")
 api.include_router(auth_router, prefix="/v1")
 api.include_router(rules_router, prefix="/v1")
+api.include_router(rule_conflicts_router, prefix="/v1")
 api.include_router(me_router, prefix="/v1", tags=["me"])
+api.include_router(dashboard_router, prefix="/v1")
 api.include_router(owned_sites_router, prefix="/v1")
 api.include_router(competitors.router, prefix="/v1")
 api.include_router(notifications_router, prefix="/v1", tags=["notifications"])
+api.include_router(export_router, prefix="/v1")
+api.include_router(snapshots_router, prefix="/v1")
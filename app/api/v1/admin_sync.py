@@ -4,6 +4,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.session import get_db
 from app.ingestion.service import IngestionService
 from app.ingestion.lock import INGESTION_LOCK
+from app.services.rule_read_model import rebuild_rule_read_models
 
 router = APIRouter()
 svc = IngestionService()
@@ -17,3 +18,8 @@ async def sync_master(db: AsyncSession = Depends(get_db)):
 async def sync_prices(db: AsyncSession = Depends(get_db)):
     async with INGESTION_LOCK:
         return await svc.sync_prices_latest(db)
+
+@router.post("/admin/rebuild/rule-read-models")
+async def rebuild_rules_read_model(db: AsyncSession = Depends(get_db)):
+    # e.g. after restoring pricing_rules from a backup
+    return {"rules": await rebuild_rule_read_models(db)}
@@ -0,0 +1,42 @@
+# app/api/v1/alert_metrics.py
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.settings import settings
+from app.db.models_notifications import AlertWorker
+from app.db.session import get_db
+from app.notifications.metrics import AlertMetrics, alert_metrics
+from app.notifications.partitions import LEASE_SECONDS
+
+router = APIRouter()
+
+
+@router.get("/admin/alerts/metrics")
+async def alert_pipeline_metrics(
+    ticks: int = Query(20, ge=1, le=120),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Per-stage alert latency histograms (with the slowest deliveries) and
+    per-tick evaluation / delivery counts. With ALERT_EXTERNAL_WORKERS the
+    pipeline runs elsewhere, so this merges what the live workers published
+    with their last heartbeat; otherwise it is this process's own.
+    """
+    if not settings.ALERT_EXTERNAL_WORKERS:
+        return alert_metrics.to_dict(ticks=ticks)
+
+    res = await db.execute(
+        select(AlertWorker.worker_id, AlertWorker.metrics)
+        .where(AlertWorker.heartbeat_at > datetime.utcnow() - timedelta(seconds=LEASE_SECONDS))
+        .where(AlertWorker.metrics.is_not(None))
+    )
+    rows = res.all()
+    return {
+        **AlertMetrics.merged([m for _, m in rows]).to_dict(ticks=ticks),
+        "workers": sorted(w for w, _ in rows),
+    }
@@ -1,15 +1,43 @@
 from fastapi import APIRouter, Depends, Query, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import and_, or_, select
 from math import cos, radians, asin, sqrt
 from typing import Optional
 
+from app.api.params import decode_cursor, encode_cursor, parse_fields
+from app.api.responses import FastJSONResponse, to_columnar
 from app.db.session import get_db
 from app.db.models.master import Brand, FuelType, Site
 from app.db.models.prices import PriceLatest
 
 router = APIRouter()
 
+# response shapes: "rows" = list of objects (default), "columnar" = parallel arrays
+FORMAT_PATTERN = "^(rows|columnar)$"
+
+NEARBY_KEYS = ("siteId", "name", "brandId", "address", "postcode", "lat", "lng", "distanceKm", "prices")
+SEARCH_KEYS = ("SiteId", "Name", "Address", "BrandId", "Postcode", "G1SuburbId", "G2CityId", "G3StateId", "Lat", "Lng")
+
+# response key -> column, so a sparse fieldset only selects what it returns
+NEARBY_COLUMNS = {
+    "name": Site.name,
+    "brandId": Site.brand_id,
+    "address": Site.address,
+    "postcode": Site.postcode,
+}
+SEARCH_COLUMNS = {
+    "SiteId": Site.site_id,
+    "Name": Site.name,
+    "Address": Site.address,
+    "BrandId": Site.brand_id,
+    "Postcode": Site.postcode,
+    "G1SuburbId": Site.g1_suburb_id,
+    "G2CityId": Site.g2_city_id,
+    "G3StateId": Site.g3_state_id,
+    "Lat": Site.lat,
+    "Lng": Site.lng,
+}
+
 # ------------------------------------------------------------
 # Helpers
 # ------------------------------------------------------------
@@ -59,7 +87,7 @@ def _haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
 # ------------------------------------------------------------
 # Nearby sites (map dashboard)
 # ------------------------------------------------------------
-@router.get("/catalog/sites/nearby")
+@router.get("/catalog/sites/nearby", response_class=FastJSONResponse)
 async def sites_nearby(
     lat: float = Query(...),
     lng: float = Query(...),
@@ -68,8 +96,18 @@ async def sites_nearby(
     include_prices: bool = Query(False),
     # IMPORTANT: accept comma-separated "2,4,5"
     fuel_ids: str | None = Query(None),
+    format_: str = Query("rows", alias="format", pattern=FORMAT_PATTERN),
+    # sparse fieldset, e.g. "siteId,lat,lng,prices"
+    fields: str | None = Query(None),
+    # opaque keyset cursor from a previous page's "nextCursor"
+    cursor: str | None = Query(None),
     db: AsyncSession = Depends(get_db),
 ):
+    after = decode_cursor(cursor, 2)
+    wanted = parse_fields(fields, NEARBY_KEYS)
+    keys = [k for k in NEARBY_KEYS if wanted is None or k in wanted]
+    want_prices = include_prices and "prices" in keys
+
     # 1) bounding box filter (fast)
     # ~111km per degree latitude
     dlat = radius_km / 111.0
@@ -79,36 +117,54 @@ async def sites_nearby(
     min_lat, max_lat = lat - dlat, lat + dlat
     min_lng, max_lng = lng - dlng, lng + dlng
 
+    # Sort key: equirectangular distance (km^2), plain arithmetic so SQLite can
+    # ORDER BY it and page with a (distance, site_id) keyset. Within 100km the
+    # order matches haversine to a few metres; distanceKm below is still haversine.
+    kx = 111.0 * cos(radians(lat))
+    dist2 = (
+        (Site.lat - lat) * (Site.lat - lat) * (111.0 * 111.0)
+        + (Site.lng - lng) * (Site.lng - lng) * (kx * kx)
+    )
+
+    # only pull the columns the response needs (id + coords are always needed for distance)
+    extra_cols = [k for k in keys if k in NEARBY_COLUMNS]
     stmt = (
-        select(Site)
+        select(Site.site_id, Site.lat, Site.lng, dist2, *[NEARBY_COLUMNS[k] for k in extra_cols])
         .where(Site.lat.isnot(None))
         .where(Site.lng.isnot(None))
         .where(Site.lat.between(min_lat, max_lat))
         .where(Site.lng.between(min_lng, max_lng))
-        .limit(limit * 5)  # grab extra, we'll filter precisely by radius
+        .where(dist2 <= radius_km * radius_km)
     )
+    if after is not None:
+        stmt = stmt.where(
+            or_(dist2 > float(after[0]), and_(dist2 == float(after[0]), Site.site_id > int(after[1])))
+        )
+    stmt = stmt.order_by(dist2, Site.site_id).limit(limit + 1)
+
+    rows = (await db.execute(stmt)).all()
 
-    rows = (await db.execute(stmt)).scalars().all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1][3], int(rows[-1][0])])
 
-    # 2) precise radius filter + distance sort
+    # 2) precise radius filter (already in distance order)
     sites_with_dist = []
-    for s in rows:
+    for row in rows:
         try:
-            d = _haversine_km(lat, lng, float(s.lat), float(s.lng))
+            d = _haversine_km(lat, lng, float(row[1]), float(row[2]))
         except Exception:
             continue
         if d <= radius_km:
-            sites_with_dist.append((s, d))
-
-    sites_with_dist.sort(key=lambda x: x[1])
-    sites_with_dist = sites_with_dist[:limit]
+            sites_with_dist.append((row, d))
 
-    site_ids = [int(s.site_id) for s, _ in sites_with_dist]
+    site_ids = [int(row[0]) for row, _ in sites_with_dist]
 
     # 3) Prices (optional)
     prices_map: dict[int, list[dict]] = {sid: [] for sid in site_ids}
 
-    if include_prices and site_ids:
+    if want_prices and site_ids:
         fids = _parse_csv_ints(fuel_ids)
 
         # if no fuel_ids provided, show ALL fuel types available for these sites
@@ -147,39 +203,45 @@ async def sites_nearby(
             prices_map[sid].sort(key=lambda x: (x["fuelId"] or 0))
 
     # 4) Response
-    return {
+    sites = []
+    for row, d in sites_with_dist:
+        sid = int(row[0])
+        full = {
+            "siteId": sid,
+            "lat": float(row[1]),
+            "lng": float(row[2]),
+            "distanceKm": round(d, 3),
+            "prices": prices_map.get(sid, []) if include_prices else None,
+        }
+        full.update(zip(extra_cols, row[4:]))
+        sites.append({k: full[k] for k in keys})
+
+    body = {
         "center": {"lat": lat, "lng": lng},
         "radiusKm": radius_km,
-        "count": len(sites_with_dist),
-        "sites": [
-            {
-                "siteId": int(s.site_id),
-                "name": s.name,
-                "brandId": s.brand_id,
-                "address": s.address,
-                "postcode": s.postcode,
-                "lat": float(s.lat),
-                "lng": float(s.lng),
-                "distanceKm": round(d, 3),
-                "prices": prices_map.get(int(s.site_id), []) if include_prices else None,
-            }
-            for (s, d) in sites_with_dist
-        ],
+        "count": len(sites),
+        "sites": sites,
+        "nextCursor": next_cursor,
     }
+    if format_ == "columnar":
+        body["format"] = "columnar"
+        body["sites"] = to_columnar(sites, keys)
 
-@router.get("/catalog/brands")
+    return FastJSONResponse(body)
+
+@router.get("/catalog/brands", response_class=FastJSONResponse)
 async def brands(db: AsyncSession = Depends(get_db)):
-    rows = (await db.execute(select(Brand).order_by(Brand.name))).scalars().all()
-    return [{"BrandId": r.brand_id, "Name": r.name} for r in rows]
+    rows = (await db.execute(select(Brand.brand_id, Brand.name).order_by(Brand.name))).all()
+    return FastJSONResponse([{"BrandId": bid, "Name": name} for bid, name in rows])
 
 
-@router.get("/catalog/fuels")
+@router.get("/catalog/fuels", response_class=FastJSONResponse)
 async def fuels(db: AsyncSession = Depends(get_db)):
-    rows = (await db.execute(select(FuelType).order_by(FuelType.fuel_id))).scalars().all()
-    return [{"FuelId": r.fuel_id, "Name": r.name} for r in rows]
+    rows = (await db.execute(select(FuelType.fuel_id, FuelType.name).order_by(FuelType.fuel_id))).all()
+    return FastJSONResponse([{"FuelId": fid, "Name": name} for fid, name in rows])
 
 
-@router.get("/catalog/sites/search")
+@router.get("/catalog/sites/search", response_class=FastJSONResponse)
 async def site_search(
     q: str = Query("", max_length=100),
     brand_id: int | None = None,
@@ -187,9 +249,19 @@ async def site_search(
     g2: int | None = None,
     g1: int | None = None,
     limit: int = Query(20, ge=1, le=100),
+    format_: str = Query("rows", alias="format", pattern=FORMAT_PATTERN),
+    # sparse fieldset, e.g. "SiteId,Name"
+    fields: str | None = Query(None),
+    # opaque keyset cursor from the previous page's X-Next-Cursor header
+    cursor: str | None = Query(None),
     db: AsyncSession = Depends(get_db),
 ):
-    stmt = select(Site)
+    after = decode_cursor(cursor, 2)
+    wanted = parse_fields(fields, SEARCH_KEYS)
+    keys = [k for k in SEARCH_KEYS if wanted is None or k in wanted]
+
+    # name + site_id trail the selected columns: they are the keyset
+    stmt = select(*[SEARCH_COLUMNS[k] for k in keys], Site.name, Site.site_id)
 
     if q:
         like = f"%{q}%"
@@ -204,23 +276,29 @@ async def site_search(
     if g1 is not None:
         stmt = stmt.where(Site.g1_suburb_id == g1)
 
-    rows = (await db.execute(stmt.order_by(Site.name).limit(limit))).scalars().all()
-
-    return [
-        {
-            "SiteId": s.site_id,
-            "Name": s.name,
-            "Address": s.address,
-            "BrandId": s.brand_id,
-            "Postcode": s.postcode,
-            "G1SuburbId": s.g1_suburb_id,
-            "G2CityId": s.g2_city_id,
-            "G3StateId": s.g3_state_id,
-            "Lat": s.lat,
-            "Lng": s.lng,
-        }
-        for s in rows
-    ]
+    if after is not None:
+        stmt = stmt.where(
+            or_(Site.name > str(after[0]), and_(Site.name == str(after[0]), Site.site_id > int(after[1])))
+        )
+
+    rows = (await db.execute(stmt.order_by(Site.name, Site.site_id).limit(limit + 1))).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1][-2], rows[-1][-1]])
+
+    out = [dict(zip(keys, row)) for row in rows]
+
+    if format_ == "columnar":
+        response = FastJSONResponse(
+            {"format": "columnar", "count": len(out), "sites": to_columnar(out, keys), "nextCursor": next_cursor}
+        )
+    else:
+        response = FastJSONResponse(out)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
 
 
 @router.get("/catalog/sites/{site_id}")
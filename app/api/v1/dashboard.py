@@ -0,0 +1,130 @@
+# app/api/v1/dashboard.py
+from __future__ import annotations
+
+from datetime import datetime
+
+from fastapi import APIRouter, Depends
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.responses import FastJSONResponse
+from app.auth.deps import get_current_user
+from app.db.chunks import chunked
+from app.db.models.master import FuelType, Site
+from app.db.models.prices import PriceLatest
+from app.db.models.stations import UserOwnedSite
+from app.db.models_rules import PricingRuleReadModel
+from app.db.session import get_db
+from app.notifications.rule_index import compile_condition, evaluate_compiled
+from app.services.competitive_rank import competitive_ranking
+from app.services.rule_read_model import rule_out
+
+router = APIRouter(prefix="/me", tags=["me"])
+
+
+@router.get("/dashboard", response_class=FastJSONResponse)
+async def owner_dashboard(
+    db: AsyncSession = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    """
+    Everything the owner dashboard renders, in one call: each owned site
+    with its current prices and its rules, every condition carrying both
+    prices, the diff it compares and its trigger state, plus its
+    precomputed competitive ranking.
+
+    Five queries (price and site lookups chunked per 500 sites) however
+    many sites and rules the owner has; rules come from the rules read model.
+    """
+    owned = (
+        await db.execute(
+            select(UserOwnedSite)
+            .where(UserOwnedSite.user_id == user.id)
+            .order_by(UserOwnedSite.is_primary.desc(), UserOwnedSite.id)
+        )
+    ).scalars().all()
+
+    rules = (
+        await db.execute(
+            select(
+                PricingRuleReadModel.owned_site_id,
+                PricingRuleReadModel.doc,
+                PricingRuleReadModel.triggered,
+                PricingRuleReadModel.last_triggered_at,
+            )
+            .where(PricingRuleReadModel.user_id == user.id)
+            .order_by(PricingRuleReadModel.created_at, PricingRuleReadModel.rule_id)
+        )
+    ).all()
+
+    site_ids = sorted(
+        {int(o.site_id) for o in owned} | {int(r.doc["competitorSiteId"]) for r in rules}
+    )
+    prices: dict[tuple[int, int], PriceLatest] = {}
+    names: dict[int, str | None] = {}
+    for chunk in chunked(site_ids):
+        res = await db.execute(
+            select(
+                PriceLatest.site_id,
+                PriceLatest.fuel_id,
+                PriceLatest.price_cents,
+                PriceLatest.unavailable,
+                PriceLatest.transaction_date_utc,
+            ).where(PriceLatest.site_id.in_(chunk))
+        )
+        for row in res.all():
+            prices[(int(row.site_id), int(row.fuel_id))] = row
+        res = await db.execute(select(Site.site_id, Site.name).where(Site.site_id.in_(chunk)))
+        names.update((int(sid), name) for sid, name in res.all())
+
+    fuel_names = dict((await db.execute(select(FuelType.fuel_id, FuelType.name))).all())
+
+    def _price(site_id: int, fuel_id: int) -> int | None:
+        p = prices.get((site_id, fuel_id))
+        return None if p is None or p.unavailable else int(p.price_cents)
+
+    own_prices: dict[int, list[dict]] = {}
+    for (sid, fid), p in sorted(prices.items()):
+        own_prices.setdefault(sid, []).append({
+            "fuelId": fid,
+            "fuelName": fuel_names.get(fid),
+            "priceCents": int(p.price_cents),
+            "unavailable": bool(p.unavailable),
+            "transactionDateUtc": p.transaction_date_utc,
+        })
+
+    site_of = {str(o.id): int(o.site_id) for o in owned}
+    rules_by_site: dict[str, list[dict]] = {}
+    for r in rules:
+        rule = rule_out(r.doc, r.triggered, r.last_triggered_at)
+        own_site = site_of.get(r.owned_site_id)
+        comp_site = int(rule["competitorSiteId"])
+        for c in rule["conditions"]:
+            own = _price(own_site, c["ownFuelId"]) if own_site is not None else None
+            comp = _price(comp_site, c["competitorFuelId"])
+            op, sign, threshold, flags = compile_condition(c["direction"], c["comparator"], c["thresholdCents"])
+            c["ownPriceCents"] = own
+            c["competitorPriceCents"] = comp
+            c["diffCents"] = sign * (comp - own) if own is not None and comp is not None else None
+            c["firesNow"] = evaluate_compiled([own], [comp], [sign], [op], [threshold], [flags])[0]
+        rule.pop("ownedSite", None)
+        rules_by_site.setdefault(r.owned_site_id, []).append(rule)
+
+    await competitive_ranking.ensure(db)
+
+    return FastJSONResponse({
+        "generatedAt": datetime.utcnow(),
+        "ownedSites": [
+            {
+                "ownedSiteId": str(o.id),
+                "siteId": int(o.site_id),
+                "siteName": names.get(int(o.site_id)),
+                "nickname": o.nickname,
+                "isPrimary": bool(o.is_primary),
+                "prices": own_prices.get(int(o.site_id), []),
+                "rules": rules_by_site.get(str(o.id), []),
+                "ranking": competitive_ranking.ranks_for(str(o.id)),
+            }
+            for o in owned
+        ],
+    })
@@ -0,0 +1,197 @@
+# app/api/v1/export.py
+from __future__ import annotations
+
+import csv
+import hashlib
+import io
+import zlib
+from contextlib import AsyncExitStack
+from typing import AsyncIterator, Awaitable, Callable, Sequence
+
+from fastapi import APIRouter, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.background import BackgroundTask
+
+from app.api.responses import dumps
+from app.db.session import SessionLocal
+from app.db.models.master import Site
+from app.db.models.prices import PriceHistory, PriceLatest
+
+router = APIRouter(prefix="/export", tags=["export"])
+
+# rows fetched per round trip from the server-side cursor
+EXPORT_BATCH = 1000
+
+SITE_KEYS = ("SiteId", "Name", "Address", "BrandId", "Postcode", "G1SuburbId", "G2CityId", "G3StateId", "Lat", "Lng")
+SITE_COLUMNS = (
+    Site.site_id,
+    Site.name,
+    Site.address,
+    Site.brand_id,
+    Site.postcode,
+    Site.g1_suburb_id,
+    Site.g2_city_id,
+    Site.g3_state_id,
+    Site.lat,
+    Site.lng,
+)
+
+PRICE_KEYS = (
+    "SiteId",
+    "FuelId",
+    "Price",
+    "PriceCents",
+    "Unavailable",
+    "TransactionDateUtc",
+    "CollectionMethod",
+    "IngestedAt",
+)
+PRICE_COLUMNS = (
+    PriceLatest.site_id,
+    PriceLatest.fuel_id,
+    PriceLatest.price_raw,
+    PriceLatest.price_cents,
+    PriceLatest.unavailable,
+    PriceLatest.transaction_date_utc,
+    PriceLatest.collection_method,
+    PriceLatest.ingested_at,
+)
+
+
+# -------------------------
+# Helpers
+# -------------------------
+def _version(*parts) -> str:
+    return hashlib.sha1("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()[:16]
+
+
+async def _sites_version(db: AsyncSession) -> str:
+    count, last_modified = (
+        await db.execute(select(func.count(Site.site_id), func.max(Site.last_modified_at)))
+    ).one()
+    return _version("sites", count, last_modified)
+
+
+async def _prices_version(db: AsyncSession) -> str:
+    # every real change (new pair, price move, flip to unavailable, late
+    # report with an older date) appends to fpd_price_changes; cycles that
+    # only re-stamp ingested_at leave the version alone
+    count = (await db.execute(select(func.count(PriceLatest.id)))).scalar_one()
+    last_change = (await db.execute(select(func.max(PriceHistory.id)))).scalar()
+    return _version("prices", count, last_change)
+
+
+async def _pin_read_snapshot(session: AsyncSession) -> None:
+    """
+    Holds one SQLite read transaction for the version query and the whole
+    stream, so the ETag describes exactly the rows sent (pysqlite only
+    opens transactions before writes on its own).
+    """
+    conn = await session.connection()
+    raw = await conn.get_raw_connection()
+    if not raw.driver_connection.in_transaction:
+        await conn.exec_driver_sql("BEGIN")
+
+
+async def _iter_batches(session: AsyncSession, stmt) -> AsyncIterator[Sequence]:
+    """
+    Streams rows in EXPORT_BATCH partitions from a server-side cursor.
+    """
+    result = await session.stream(stmt.execution_options(yield_per=EXPORT_BATCH))
+    async for batch in result.partitions():
+        yield batch
+
+
+def _jsonable(value):
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+async def _ndjson(session: AsyncSession, stmt, keys: Sequence[str]) -> AsyncIterator[bytes]:
+    async for batch in _iter_batches(session, stmt):
+        yield b"".join(dumps({k: _jsonable(v) for k, v in zip(keys, row)}) + b"\n" for row in batch)
+
+
+async def _csv_gz(session: AsyncSession, stmt, keys: Sequence[str]) -> AsyncIterator[bytes]:
+    gz = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+
+    writer.writerow(keys)
+    async for batch in _iter_batches(session, stmt):
+        writer.writerows([_jsonable(v) for v in row] for row in batch)
+        chunk = gz.compress(buf.getvalue().encode("utf-8"))
+        buf.seek(0)
+        buf.truncate(0)
+        if chunk:
+            yield chunk
+
+    yield gz.compress(buf.getvalue().encode("utf-8")) + gz.flush()
+
+
+async def _export_response(
+    request: Request,
+    *,
+    name: str,
+    version_of: Callable[[AsyncSession], Awaitable[str]],
+    fmt: str,
+    stmt,
+    keys,
+) -> Response:
+    """
+    Version and body come from one session and read snapshot. It is opened
+    here rather than taken from get_db, which is closed before a
+    StreamingResponse starts sending; the response closes it when done.
+    """
+    stack = AsyncExitStack()
+    try:
+        session = await stack.enter_async_context(SessionLocal())
+        await _pin_read_snapshot(session)
+        version = await version_of(session)
+    except BaseException:
+        await stack.aclose()
+        raise
+
+    etag = f'"{version}"'
+    headers = {"X-Snapshot-Version": version, "ETag": etag}
+
+    if request.headers.get("if-none-match") == etag:
+        await stack.aclose()
+        return Response(status_code=304, headers=headers)
+
+    close = BackgroundTask(stack.aclose)
+    if fmt == "csv":
+        headers["Content-Disposition"] = f'attachment; filename="{name}-{version}.csv.gz"'
+        return StreamingResponse(
+            _csv_gz(session, stmt, keys), media_type="application/gzip", headers=headers, background=close
+        )
+
+    return StreamingResponse(
+        _ndjson(session, stmt, keys), media_type="application/x-ndjson", headers=headers, background=close
+    )
+
+
+# -------------------------
+# Endpoints
+# -------------------------
+@router.get("/sites")
+async def export_sites(
+    request: Request,
+    format_: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+):
+    stmt = select(*SITE_COLUMNS).order_by(Site.site_id)
+    return await _export_response(
+        request, name="sites", version_of=_sites_version, fmt=format_, stmt=stmt, keys=SITE_KEYS
+    )
+
+
+@router.get("/prices")
+async def export_prices(
+    request: Request,
+    format_: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+):
+    stmt = select(*PRICE_COLUMNS).order_by(PriceLatest.site_id, PriceLatest.fuel_id)
+    return await _export_response(
+        request, name="prices", version_of=_prices_version, fmt=format_, stmt=stmt, keys=PRICE_KEYS
+    )
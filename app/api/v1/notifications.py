@@ -10,6 +10,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.auth.deps import get_current_user
 from app.db.models_notifications import UserDevice
 from app.db.session import get_db
+from app.notifications.device_directory import device_directory
 
 router = APIRouter(prefix="/me/notifications", tags=["notifications"])
 
@@ -36,6 +37,7 @@ async def upsert_expo_token(
     )
     existing = res.scalar_one_or_none()
 
+    previous_user_id = existing.user_id if existing else None
     if existing:
         existing.user_id = user.id
         existing.kind = "expo"
@@ -51,6 +53,9 @@ async def upsert_expo_token(
         )
 
     await db.commit()
+    device_directory.invalidate(user.id)
+    if previous_user_id and previous_user_id != user.id:
+        device_directory.invalidate(previous_user_id)
     return {"ok": True}
 
 
@@ -78,6 +83,7 @@ async def upsert_webpush(
     )
     existing = res.scalar_one_or_none()
 
+    previous_user_id = existing.user_id if existing else None
     if existing:
         existing.user_id = user.id
         existing.kind = "webpush"
@@ -97,6 +103,9 @@ async def upsert_webpush(
         )
 
     await db.commit()
+    device_directory.invalidate(user.id)
+    if previous_user_id and previous_user_id != user.id:
+        device_directory.invalidate(previous_user_id)
     return {"ok": True}
 
 
@@ -194,6 +203,7 @@ async def register_device(
         existing.web_push_subscription = body.web_push_subscription
 
     await db.commit()
+    device_directory.invalidate(me.id)
     await db.refresh(existing)
 
     return {"ok": True, "device_id": existing.id}
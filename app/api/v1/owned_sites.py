@@ -6,9 +6,13 @@ from pydantic import BaseModel, Field
 from sqlalchemy import select, update, delete
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.api.responses import FastJSONResponse
 from app.auth.deps import get_current_user
 from app.db.session import get_db
 from app.db.models.stations import UserOwnedSite  # <-- you must have this model/table
+from app.notifications.alert_scheduler import rules_changed
+from app.services.competitive_rank import competitive_ranking
+from app.services.rule_read_model import refresh_user_rules
 
 router = APIRouter(prefix="/me/owned-sites", tags=["owned-sites"])
 
@@ -85,8 +89,15 @@ async def create_owned_site(
         is_primary=1 if payload.isPrimary else 0,
     )
     db.add(row)
+    rule_ids: list[str] = []
+    if payload.isPrimary:
+        await db.flush()
+        rule_ids = await refresh_user_rules(db, user.id)
     await db.commit()
     await db.refresh(row)
+    if rule_ids:
+        rules_changed(rule_ids)
+    competitive_ranking.invalidate_owned_sites([row.id])
 
     return {
         "id": row.id,
@@ -127,8 +138,13 @@ async def update_owned_site(
     if payload.nickname is not None:
         row.nickname = payload.nickname
 
+    # rules embed the owned site (and isPrimary of all the user's sites)
+    await db.flush()
+    rule_ids = await refresh_user_rules(db, user.id)
     await db.commit()
     await db.refresh(row)
+    if rule_ids:
+        rules_changed(rule_ids)
 
     return {
         "id": row.id,
@@ -162,5 +178,35 @@ async def delete_owned_site(
             UserOwnedSite.user_id == user.id,
         )
     )
+    rule_ids = await refresh_user_rules(db, user.id, owned_site_id)
     await db.commit()
+    # the site's rules lost their owned site: recompile (drops them from the index)
+    if rule_ids:
+        rules_changed(rule_ids)
+    competitive_ranking.invalidate_owned_sites([owned_site_id])
     return {"deleted": True, "id": owned_site_id}
+
+
+@router.get("/{owned_site_id}/ranking", response_class=FastJSONResponse)
+async def owned_site_ranking(
+    owned_site_id: str,
+    db: AsyncSession = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    """
+    Where this site's price ranks per fuel among its competitors (rule
+    competitors plus nearest sites); precomputed, updated on ingestion.
+    """
+    row = (
+        await db.execute(
+            select(UserOwnedSite.id).where(
+                UserOwnedSite.id == owned_site_id,
+                UserOwnedSite.user_id == user.id,
+            )
+        )
+    ).scalar_one_or_none()
+    if not row:
+        raise HTTPException(404, detail="Owned site not found")
+
+    await competitive_ranking.ensure(db)
+    return FastJSONResponse({"ownedSiteId": owned_site_id, "fuels": competitive_ranking.ranks_for(owned_site_id)})
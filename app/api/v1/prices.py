@@ -1,22 +1,26 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
+from app.api.responses import FastJSONResponse
 from app.db.session import get_db
 from app.db.models.prices import PriceLatest
+from app.services.price_movers import MAX_MOVERS, WINDOWS, price_movers
 
 router = APIRouter()
 
+MOVERS_WINDOW_PATTERN = "^(" + "|".join(WINDOWS) + ")$"
 
-@router.get("/prices/latest")
+
+@router.get("/prices/latest", response_class=FastJSONResponse)
 async def latest(site_id: int, fuel_id: int, db: AsyncSession = Depends(get_db)):
     row = (await db.execute(
         select(PriceLatest).where(PriceLatest.site_id == site_id, PriceLatest.fuel_id == fuel_id)
     )).scalar_one_or_none()
 
     if not row:
-        return {"found": False}
+        return FastJSONResponse({"found": False})
 
-    return {
+    return FastJSONResponse({
         "found": True,
         "SiteId": row.site_id,
         "FuelId": row.fuel_id,
@@ -26,7 +30,29 @@ async def latest(site_id: int, fuel_id: int, db: AsyncSession = Depends(get_db))
         "TransactionDateUtc": row.transaction_date_utc.isoformat(),
         "CollectionMethod": row.collection_method,
         "IngestedAt": row.ingested_at.isoformat(),
-    }
+    })
+
+
+@router.get("/prices/movers", response_class=FastJSONResponse)
+async def price_movers_feed(
+    fuelId: int,
+    window: str = Query("1h", pattern=MOVERS_WINDOW_PATTERN),
+    # 0 = everywhere, 1 = suburb, 2 = city, 3 = state (fpd_sites g1/g2/g3)
+    regionLevel: int = Query(0, ge=0, le=3),
+    regionId: int = 0,
+    limit: int = Query(10, ge=1, le=MAX_MOVERS),
+):
+    """
+    Largest net price rises and drops over the window, maintained in memory
+    from ingestion changes.
+    """
+    return FastJSONResponse({
+        "window": window,
+        "fuelId": fuelId,
+        "regionLevel": regionLevel,
+        "regionId": regionId if regionLevel else 0,
+        **price_movers.movers(window, fuelId, regionLevel, regionId, limit),
+    })
 
 
 from fastapi import Query
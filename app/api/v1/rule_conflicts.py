@@ -0,0 +1,74 @@
+# app/api/v1/rule_conflicts.py
+from __future__ import annotations
+
+from fastapi import APIRouter, Depends
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.responses import FastJSONResponse
+from app.auth.deps import get_optional_user
+from app.db.chunks import chunked
+from app.db.models.prices import PriceLatest
+from app.db.models.stations import UserOwnedSite
+from app.db.models_rules import PricingRule, PricingRuleCondition
+from app.db.session import get_db
+from app.services.rule_conflicts import ConditionRow, find_conflicts
+
+router = APIRouter(prefix="/rules", tags=["rules"])
+
+
+@router.get("/conflicts", response_class=FastJSONResponse)
+async def rule_conflicts(
+    db: AsyncSession = Depends(get_db),
+    user=Depends(get_optional_user),
+):
+    """
+    Conflicts across the caller's enabled rules: DUPLICATE, OVERLAP and
+    NEVER_FIRES, plus NO_PRICE (informational) for conditions reading a pair
+    with no current price. Anonymous callers have no rules.
+
+    There is no CONTRADICTORY kind: the scheduler evaluates and alerts on
+    each condition independently, so conditions of one rule that can't hold
+    together still fire on their own.
+    """
+    if user is None:
+        return FastJSONResponse([])
+
+    res = await db.execute(
+        select(
+            PricingRule.id,
+            PricingRule.name,
+            PricingRuleCondition.id,
+            UserOwnedSite.id,
+            UserOwnedSite.site_id,
+            PricingRule.competitor_site_id,
+            PricingRuleCondition.own_fuel_id,
+            PricingRuleCondition.competitor_fuel_id,
+            PricingRuleCondition.direction,
+            PricingRuleCondition.comparator,
+            PricingRuleCondition.threshold_cents,
+        )
+        .join(PricingRuleCondition, PricingRuleCondition.rule_id == PricingRule.id)
+        .join(UserOwnedSite, UserOwnedSite.id == PricingRule.owned_site_id)
+        .where(PricingRule.user_id == user.id)
+        .where(PricingRule.is_enabled == True)  # noqa: E712
+    )
+    conditions = [
+        ConditionRow(rid, name, cid, osid, int(own), int(comp), int(of), int(cf), d, cmp, int(t))
+        for rid, name, cid, osid, own, comp, of, cf, d, cmp, t in res.all()
+    ]
+    if not conditions:
+        return FastJSONResponse([])
+
+    # which (site, fuel) pairs currently have a usable price
+    site_ids = sorted({c.own_site for c in conditions} | {c.competitor_site for c in conditions})
+    priced = set()
+    for chunk in chunked(site_ids):
+        pr = await db.execute(
+            select(PriceLatest.site_id, PriceLatest.fuel_id)
+            .where(PriceLatest.site_id.in_(chunk))
+            .where(PriceLatest.unavailable == False)  # noqa: E712
+        )
+        priced.update((int(s), int(f)) for s, f in pr.all())
+
+    return FastJSONResponse(find_conflicts(conditions, priced))
@@ -1,31 +1,57 @@
 # app/api/v1/rules.py
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, HTTPException
+import uuid
+from datetime import datetime, timedelta
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from pydantic import BaseModel, Field
-from sqlalchemy import select
+from sqlalchemy import and_, insert, or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
+from app.api.params import decode_cursor, encode_cursor, parse_fields
+from app.api.responses import FastJSONResponse
 from app.auth.deps import get_current_user
+from app.db.chunks import chunked
 from app.db.session import get_db
-from app.db.models_rules import PricingRule, PricingRuleCondition
+from app.db.models_rules import PricingRule, PricingRuleCondition, PricingRuleReadModel
+from app.core.settings import settings
+from app.notifications.alert_scheduler import COOLDOWN_MINUTES, rules_changed
+from app.services.competitive_rank import competitive_ranking
+from app.services.rule_backtest import BacktestCondition, backtest, load_price_series
+from app.services.rule_read_model import refresh_rule_read_models, rule_out
 
 # ✅ these two imports must match your project file names / model names
 # If your class names differ, adjust them here only.
 from app.db.models.stations  import UserOwnedSite  # must have: id, user_id, site_id, nickname, is_primary
-
-try:
-    # common pattern: stations.py contains Site model (site_id, name, ...)
-    from app.db.models.master import Site  # must have: site_id, name
-except Exception:
-    Site = None  # fallback: site names will return None
+from app.db.models.master import Site
 
 router = APIRouter(prefix="/me/rules", tags=["rules"])
 
 ALLOWED_DIR = {"COMPETITOR_MINUS_OWN", "OWN_MINUS_COMPETITOR"}
 ALLOWED_COMP = {"GT", "GTE", "LT", "LTE", "ABS_GT", "ABS_GTE"}
 
+# page size when a cursor is passed without an explicit limit
+RULES_PAGE_SIZE = 100
+
+# rules created by one bulk import / template call
+BULK_MAX_RULES = 1000
+
+# top-level keys of a rule in responses (sparse fieldsets pick from these)
+RULE_FIELDS = (
+    "id",
+    "name",
+    "isEnabled",
+    "ownedSiteId",
+    "competitorSiteId",
+    "ownedSite",
+    "competitorSite",
+    "conditions",
+    "isTriggered",
+    "lastTriggeredAt",
+)
+
 
 # -------------------------
 # Schemas
@@ -47,6 +73,19 @@ class RuleCreateIn(BaseModel):
     conditions: list[ConditionIn]
 
 
+class RuleBulkIn(BaseModel):
+    rules: list[RuleCreateIn] = Field(max_length=BULK_MAX_RULES)
+
+
+class RuleTemplateIn(BaseModel):
+    # one condition set applied to every (owned site x competitor) pair
+    name: str
+    ownedSiteIds: list[str] | None = None  # None: all of the user's owned sites
+    competitorSiteIds: list[int]
+    isEnabled: bool = True
+    conditions: list[ConditionIn]
+
+
 class RuleUpdateIn(BaseModel):
     # full replace OR partial update
     ownedSiteId: str | None = None
@@ -80,67 +119,6 @@ async def _get_owned_site_or_404(db: AsyncSession, *, user_id: str, owned_site_i
     return row
 
 
-async def _get_site_names_map(db: AsyncSession, site_ids: list[int]) -> dict[int, str | None]:
-    if not site_ids:
-        return {}
-    if Site is None:
-        return {sid: None for sid in site_ids}
-
-    q = await db.execute(select(Site.site_id, Site.name).where(Site.site_id.in_(site_ids)))
-    rows = q.all()
-    out: dict[int, str | None] = {sid: None for sid in site_ids}
-    for sid, name in rows:
-        out[int(sid)] = name
-    return out
-
-
-async def _rule_to_out(db: AsyncSession, *, user_id: str, rule: PricingRule) -> dict:
-    """
-    Returns rule with:
-    - owned site: id + real siteId + siteName
-    - competitor: siteId + siteName
-    - conditions (already selectinloaded)
-    """
-    owned = await _get_owned_site_or_404(db, user_id=user_id, owned_site_id=str(rule.owned_site_id))
-    owned_site_id_int = int(owned.site_id)
-    competitor_site_id_int = int(rule.competitor_site_id)
-
-    names = await _get_site_names_map(db, [owned_site_id_int, competitor_site_id_int])
-
-    return {
-        "id": str(rule.id),
-        "name": rule.name,
-        "isEnabled": rule.is_enabled,
-        # keep old fields for backward compatibility
-        "ownedSiteId": str(rule.owned_site_id),
-        "competitorSiteId": competitor_site_id_int,
-        # ✅ new enriched fields
-        "ownedSite": {
-            "ownedSiteId": str(owned.id),
-            "siteId": owned_site_id_int,
-            "siteName": names.get(owned_site_id_int),
-            "nickname": getattr(owned, "nickname", None),
-            "isPrimary": bool(getattr(owned, "is_primary", False)),
-        },
-        "competitorSite": {
-            "siteId": competitor_site_id_int,
-            "siteName": names.get(competitor_site_id_int),
-        },
-        "conditions": [
-            {
-                "id": str(c.id),
-                "ownFuelId": c.own_fuel_id,
-                "competitorFuelId": c.competitor_fuel_id,
-                "direction": c.direction,
-                "comparator": c.comparator,
-                "thresholdCents": c.threshold_cents,
-                "requireBothAvailable": c.require_both_available,
-            }
-            for c in rule.conditions
-        ],
-    }
-
-
 # -------------------------
 # Create
 # -------------------------
@@ -176,17 +154,150 @@ async def create_rule(
         )
 
     db.add(rule)
+    await db.flush()
+    # read model row goes in with the rule
+    out = (await refresh_rule_read_models(db, [rule.id]))[rule.id]
     await db.commit()
+    rules_changed([rule.id])
+    competitive_ranking.invalidate_owned_sites([payload.ownedSiteId])
+    return out
 
-    # reload with conditions safely
-    q = await db.execute(
-        select(PricingRule)
-        .where(PricingRule.id == rule.id, PricingRule.user_id == user.id)
-        .options(selectinload(PricingRule.conditions))
-    )
-    rule = q.scalar_one()
 
-    return await _rule_to_out(db, user_id=user.id, rule=rule)
+# -------------------------
+# Bulk create
+# -------------------------
+async def _create_rules_bulk(db: AsyncSession, *, user_id: str, rows: list[tuple[dict, RuleCreateIn]]) -> dict:
+    """
+    Validates every row up front (ownership and competitor sites in one
+    query each), then inserts the valid rules and their conditions with one
+    executemany per table and commits once. Invalid rows are reported, not
+    created; `ref` identifies a row in the response.
+    """
+    errors: list[dict] = []
+    valid: list[tuple[dict, RuleCreateIn]] = []
+
+    owned_ids = sorted({r.ownedSiteId for _, r in rows})
+    owned: set[str] = set()
+    for chunk in chunked(owned_ids):
+        q = await db.execute(
+            select(UserOwnedSite.id).where(
+                UserOwnedSite.id.in_(chunk),
+                UserOwnedSite.user_id == user_id,
+            )
+        )
+        owned.update(str(x) for x in q.scalars().all())
+
+    comp_ids = sorted({r.competitorSiteId for _, r in rows})
+    known_sites: set[int] = set()
+    for chunk in chunked(comp_ids):
+        q = await db.execute(select(Site.site_id).where(Site.site_id.in_(chunk)))
+        known_sites.update(int(x) for x in q.scalars().all())
+
+    for ref, r in rows:
+        try:
+            _validate_conditions(r.conditions)
+            if r.ownedSiteId not in owned:
+                raise HTTPException(404, detail="Owned site not found")
+            if r.competitorSiteId not in known_sites:
+                raise HTTPException(404, detail="Competitor site not found")
+        except HTTPException as e:
+            errors.append({**ref, "status": e.status_code, "detail": e.detail})
+            continue
+        valid.append((ref, r))
+
+    created: list[dict] = []
+    rule_rows: list[dict] = []
+    cond_rows: list[dict] = []
+    now = datetime.utcnow()
+    for ref, r in valid:
+        rule_id = str(uuid.uuid4())
+        rule_rows.append({
+            "id": rule_id,
+            "user_id": user_id,
+            "owned_site_id": r.ownedSiteId,
+            "competitor_site_id": r.competitorSiteId,
+            "name": r.name,
+            "is_enabled": r.isEnabled,
+            "created_at": now,
+            "updated_at": now,
+        })
+        for c in r.conditions:
+            cond_rows.append({
+                "id": str(uuid.uuid4()),
+                "rule_id": rule_id,
+                "own_fuel_id": c.ownFuelId,
+                "competitor_fuel_id": c.competitorFuelId,
+                "direction": c.direction,
+                "comparator": c.comparator,
+                "threshold_cents": c.thresholdCents,
+                "require_both_available": c.requireBothAvailable,
+                "created_at": now,
+            })
+        created.append({**ref, "id": rule_id})
+
+    if rule_rows:
+        await db.execute(insert(PricingRule), rule_rows)
+        if cond_rows:
+            await db.execute(insert(PricingRuleCondition), cond_rows)
+        await refresh_rule_read_models(db, [x["id"] for x in rule_rows])
+        await db.commit()
+        rules_changed([x["id"] for x in rule_rows])
+        competitive_ranking.invalidate_owned_sites({x["owned_site_id"] for x in rule_rows})
+
+    return {"created": len(created), "failed": len(errors), "rules": created, "errors": errors}
+
+
+@router.post("/bulk")
+async def bulk_create_rules(
+    payload: RuleBulkIn,
+    db: AsyncSession = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    """
+    Create many rules at once; rows with errors are skipped and reported by index.
+    """
+    rows = [({"index": i}, r) for i, r in enumerate(payload.rules)]
+    return await _create_rules_bulk(db, user_id=user.id, rows=rows)
+
+
+@router.post("/template")
+async def apply_rule_template(
+    payload: RuleTemplateIn,
+    db: AsyncSession = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    """
+    One rule per (owned site x competitor) pair, all with the same conditions.
+    """
+    _validate_conditions(payload.conditions)
+
+    owned_ids = payload.ownedSiteIds
+    if owned_ids is None:
+        q = await db.execute(
+            select(UserOwnedSite.id).where(UserOwnedSite.user_id == user.id).order_by(UserOwnedSite.id)
+        )
+        owned_ids = [str(x) for x in q.scalars().all()]
+
+    competitors = list(dict.fromkeys(payload.competitorSiteIds))
+    owned_ids = list(dict.fromkeys(owned_ids))
+    if len(owned_ids) * len(competitors) > BULK_MAX_RULES:
+        raise HTTPException(400, detail=f"Template would create more than {BULK_MAX_RULES} rules")
+
+    rows = [
+        (
+            {"ownedSiteId": osid, "competitorSiteId": comp},
+            RuleCreateIn(
+                ownedSiteId=osid,
+                competitorSiteId=comp,
+                name=payload.name,
+                isEnabled=payload.isEnabled,
+                conditions=payload.conditions,
+            ),
+        )
+        for osid in owned_ids
+        for comp in competitors
+    ]
+    return await _create_rules_bulk(db, user_id=user.id, rows=rows)
 
 
 # -------------------------
@@ -194,25 +305,49 @@ async def create_rule(
 # -------------------------
 @router.get("")
 async def list_rules(
+    response: Response,
     ownedSiteId: str | None = None,
+    # sparse fieldset, e.g. "id,name,isEnabled" for a toggle list
+    fields: str | None = Query(None),
+    # keyset paging on (created_at, id); without limit/cursor every rule is returned
+    limit: int | None = Query(None, ge=1, le=500),
+    cursor: str | None = Query(None),
     db: AsyncSession = Depends(get_db),
     user=Depends(get_current_user),
 ):
-    stmt = (
-        select(PricingRule)
-        .where(PricingRule.user_id == user.id)
-        .options(selectinload(PricingRule.conditions))
-    )
+    wanted = parse_fields(fields, RULE_FIELDS)
+    after = decode_cursor(cursor, 2)
+    if after is not None and limit is None:
+        limit = RULES_PAGE_SIZE
+
+    # served from the read model: one indexed query, no joins
+    M = PricingRuleReadModel
+    stmt = select(M.rule_id, M.created_at, M.doc, M.triggered, M.last_triggered_at).where(M.user_id == user.id)
     if ownedSiteId:
-        stmt = stmt.where(PricingRule.owned_site_id == ownedSiteId)
+        stmt = stmt.where(M.owned_site_id == ownedSiteId)
+    if after is not None:
+        try:
+            after_created = datetime.fromisoformat(str(after[0]))
+        except ValueError:
+            raise HTTPException(400, detail="Invalid cursor")
+        stmt = stmt.where(
+            or_(
+                M.created_at > after_created,
+                and_(M.created_at == after_created, M.rule_id > str(after[1])),
+            )
+        )
+    stmt = stmt.order_by(M.created_at, M.rule_id)
+    if limit is not None:
+        stmt = stmt.limit(limit + 1)
 
-    q = await db.execute(stmt)
-    rules = q.scalars().all()
+    rows = (await db.execute(stmt)).all()
 
-    out = []
-    for r in rules:
-        out.append(await _rule_to_out(db, user_id=user.id, rule=r))
-    return out
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor([last.created_at.isoformat(), str(last.rule_id)])
+
+    return [rule_out(r.doc, r.triggered, r.last_triggered_at, wanted) for r in rows]
 
 
 # -------------------------
@@ -246,6 +381,8 @@ async def update_rule(
     if not rule:
         raise HTTPException(404, detail="Rule not found")
 
+    owned_before = str(rule.owned_site_id)
+
     # validate + apply updates
     if payload.ownedSiteId is not None:
         await _get_owned_site_or_404(db, user_id=user.id, owned_site_id=payload.ownedSiteId)
@@ -280,17 +417,12 @@ async def update_rule(
                 )
             )
 
+    await db.flush()
+    out = (await refresh_rule_read_models(db, [rule_id]))[rule_id]
     await db.commit()
-
-    # reload with conditions safely
-    q2 = await db.execute(
-        select(PricingRule)
-        .where(PricingRule.id == rule_id, PricingRule.user_id == user.id)
-        .options(selectinload(PricingRule.conditions))
-    )
-    rule = q2.scalar_one()
-
-    return await _rule_to_out(db, user_id=user.id, rule=rule)
+    rules_changed([rule_id])
+    competitive_ranking.invalidate_owned_sites({owned_before, str(rule.owned_site_id)})
+    return out
 
 
 # -------------------------
@@ -309,6 +441,59 @@ async def delete_rule(
     if not rule:
         raise HTTPException(404, detail="Rule not found")
 
+    owned_site_id = str(rule.owned_site_id)
     await db.delete(rule)
+    await db.flush()
+    await refresh_rule_read_models(db, [rule_id])
     await db.commit()
+    rules_changed([rule_id])
+    competitive_ranking.invalidate_owned_sites([owned_site_id])
     return {"ok": True, "deletedRuleId": rule_id}
+
+
+# -------------------------
+# Backtest
+# -------------------------
+@router.get("/{rule_id}/backtest", response_class=FastJSONResponse)
+async def backtest_rule(
+    rule_id: str,
+    days: int = Query(30, ge=1),
+    # try a different threshold on every condition without saving it
+    thresholdCents: int | None = Query(None, ge=0),
+    db: AsyncSession = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    """
+    How often and when the rule would have notified over the last `days`
+    of recorded price changes, under the current cooldown.
+    """
+    q = await db.execute(
+        select(PricingRule)
+        .where(PricingRule.id == rule_id, PricingRule.user_id == user.id)
+        .options(selectinload(PricingRule.conditions))
+    )
+    rule = q.scalar_one_or_none()
+    if not rule:
+        raise HTTPException(404, detail="Rule not found")
+    owned = await _get_owned_site_or_404(db, user_id=user.id, owned_site_id=str(rule.owned_site_id))
+
+    days = min(days, settings.PRICE_HISTORY_DAYS)
+    end = datetime.utcnow()
+    start = end - timedelta(days=days)
+
+    conditions = [
+        BacktestCondition(
+            condition_id=str(c.id),
+            own_key=(int(owned.site_id), int(c.own_fuel_id)),
+            comp_key=(int(rule.competitor_site_id), int(c.competitor_fuel_id)),
+            direction=c.direction,
+            comparator=c.comparator,
+            threshold=c.threshold_cents if thresholdCents is None else thresholdCents,
+        )
+        for c in rule.conditions
+    ]
+    keys = {c.own_key for c in conditions} | {c.comp_key for c in conditions}
+    series = await load_price_series(db, keys, start, end)
+
+    out = backtest(conditions, series, start, end, timedelta(minutes=COOLDOWN_MINUTES))
+    return FastJSONResponse({"ruleId": str(rule.id), "days": days, **out})
@@ -0,0 +1,93 @@
+# app/api/v1/snapshots.py
+from __future__ import annotations
+
+import gzip
+import os
+from typing import Iterator
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+
+from app.api.responses import FastJSONResponse
+from app.services.snapshot_service import read_manifest, snapshot_path
+
+router = APIRouter(prefix="/snapshots", tags=["snapshots"])
+
+GUNZIP_CHUNK = 64 * 1024
+
+
+def _accepts_gzip(request: Request) -> bool:
+    """
+    Accept-Encoding lists gzip (or *) with a non-zero q.
+    """
+    qs = {}
+    for part in request.headers.get("accept-encoding", "").split(","):
+        coding, *params = [p.strip() for p in part.split(";")]
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qs[coding.lower()] = q
+    return qs.get("gzip", qs.get("*", 0.0)) > 0
+
+
+def _gunzip(path: str) -> Iterator[bytes]:
+    # sync generator: Starlette iterates it on the threadpool
+    with gzip.open(path, "rb") as f:
+        while chunk := f.read(GUNZIP_CHUNK):
+            yield chunk
+
+
+def _serve(request: Request, file_name: str, version: str, *, immutable: bool) -> Response:
+    gzipped = _accepts_gzip(request)
+    # the decoded body is a different representation, so it gets its own tag
+    etag = f'"{version}"' if gzipped else f'"{version}-identity"'
+    headers = {
+        "ETag": etag,
+        "X-Snapshot-Version": version,
+        "Vary": "Accept-Encoding",
+        "Cache-Control": "public, max-age=31536000, immutable" if immutable else "no-cache",
+    }
+    if gzipped:
+        # body is stored gzip'd; clients decode it transparently
+        headers["Content-Encoding"] = "gzip"
+
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    path = snapshot_path(file_name)
+    if not os.path.exists(path):
+        raise HTTPException(404, detail="Snapshot not found")
+
+    if not gzipped:
+        return StreamingResponse(_gunzip(path), media_type="application/json", headers=headers)
+
+    # FileResponse streams the file as-is (sendfile where the server supports it)
+    return FileResponse(path, media_type="application/json", headers=headers)
+
+
+@router.get("/manifest", response_class=FastJSONResponse)
+async def manifest():
+    m = read_manifest()
+    if not m:
+        raise HTTPException(404, detail="No snapshot published yet")
+    return FastJSONResponse(m, headers={"Cache-Control": "no-cache"})
+
+
+@router.get("/latest")
+async def latest_snapshot(request: Request):
+    m = read_manifest()
+    if not m:
+        raise HTTPException(404, detail="No snapshot published yet")
+    return _serve(request, m["file"], m["version"], immutable=False)
+
+
+@router.get("/{version}")
+async def snapshot_by_version(version: str, request: Request):
+    if not version.isalnum():
+        raise HTTPException(404, detail="Snapshot not found")
+    return _serve(request, f"prices-{version}.json.gz", version, immutable=True)
@@ -27,3 +27,13 @@ async def get_current_user(
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
     return user
+
+
+async def get_optional_user(
+    authorization: str = Header(default=""),
+    db: AsyncSession = Depends(get_db),
+) -> User | None:
+    # anonymous callers get None; a bad token is still rejected
+    if not authorization:
+        return None
+    return await get_current_user(authorization=authorization, db=db)
@@ -12,6 +12,20 @@ class Settings(BaseSettings):
     SYNC_PRICES_SECONDS: int = 120
     SYNC_MASTER_ON_START: bool = True
 
+    # prebuilt sites + latest prices files written after each price sync
+    SNAPSHOT_DIR: str = "./snapshots"
+    SNAPSHOT_KEEP: int = 3
+
+    # price changes older than this are pruned from fpd_price_changes (rule backtests)
+    PRICE_HISTORY_DAYS: int = 180
+
+    # alert evaluation is split into user partitions; with ALERT_EXTERNAL_WORKERS
+    # the API process leaves evaluation/delivery to `python -m app.notifications.worker`
+    ALERT_PARTITIONS: int = 16
+    ALERT_EXTERNAL_WORKERS: bool = False
+    # > 0 holds each alert digest back this long so the next ticks' alerts join it
+    ALERT_DIGEST_WINDOW_SECONDS: int = 0
+
     class Config:
         env_file = ".env"
 
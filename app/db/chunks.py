@@ -0,0 +1,17 @@
+# app/db/chunks.py
+from __future__ import annotations
+
+from typing import Iterator, Sequence, TypeVar
+
+T = TypeVar("T")
+
+# ids per IN (...) list: SQLite's bound-parameter limit is 999 on older builds
+IN_CHUNK = 500
+
+
+def chunked(items: Sequence[T], size: int = IN_CHUNK) -> Iterator[Sequence[T]]:
+    """
+    Consecutive slices of at most `size` items, for IN (...) queries over long id lists.
+    """
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
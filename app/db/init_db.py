@@ -1,4 +1,7 @@
 # app/db/init_db.py
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn
+
 from app.db.base import Base
 from app.db.session import engine
 
@@ -6,6 +9,43 @@ from app.db.session import engine
 from app.db.models import master, prices, stations
 from app.db import models_user, models_rules, models_notifications
 
+
+def _add_missing_columns(sync_conn) -> None:
+    # create_all() never alters existing tables; add columns declared later.
+    # New columns must be nullable or carry a server_default.
+    insp = inspect(sync_conn)
+    for table in Base.metadata.sorted_tables:
+        if not insp.has_table(table.name):
+            continue
+        existing = {c["name"] for c in insp.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = CreateColumn(column).compile(dialect=sync_conn.dialect)
+            sync_conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+
+
+def _dedupe_rule_alert_state(sync_conn) -> None:
+    # older builds could insert duplicate (rule_id, condition_id) rows;
+    # keep the newest one per pair so the unique index can be created
+    if inspect(sync_conn).has_table("rule_alert_state"):
+        sync_conn.execute(text(
+            "DELETE FROM rule_alert_state WHERE rowid NOT IN "
+            "(SELECT MAX(rowid) FROM rule_alert_state GROUP BY rule_id, condition_id)"
+        ))
+
+
+def _create_missing_indexes(sync_conn) -> None:
+    # create_all() only creates indexes together with a new table,
+    # so indexes added to existing tables later are created here.
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
+
+
 async def init_db():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_add_missing_columns)
+        await conn.run_sync(_dedupe_rule_alert_state)
+        await conn.run_sync(_create_missing_indexes)
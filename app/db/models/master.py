@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Integer, String, DateTime, Float, ForeignKey
+from sqlalchemy import Integer, String, DateTime, Float, ForeignKey, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.types import JSON
 from app.db.base import Base
@@ -48,3 +48,10 @@ class Site(Base):
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
 
     brand = relationship("Brand")
+
+    __table_args__ = (
+        # keyset pagination for /catalog/sites/search (ORDER BY name, site_id)
+        Index("ix_fpd_sites_name_site_id", "name", "site_id"),
+        # bounding-box prefilter for /catalog/sites/nearby
+        Index("ix_fpd_sites_lat_lng", "lat", "lng"),
+    )
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Integer, Float, DateTime, Boolean, String, ForeignKey, UniqueConstraint
+from sqlalchemy import Integer, Float, DateTime, Boolean, String, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column
 from app.db.base import Base
 
@@ -23,3 +23,33 @@ class PriceLatest(Base):
     ingested_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
 
     __table_args__ = (UniqueConstraint("site_id", "fuel_id", name="uq_latest_site_fuel"),)
+
+
+class PriceHistory(Base):
+    """
+    Append-only history of (site_id, fuel_id) price changes, one row per
+    change seen by ingestion (including a pair's first price). Used to
+    replay rules over past prices.
+    """
+    __tablename__ = "fpd_price_changes"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    site_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    fuel_id: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    # previous available price (None: first seen, or it was unavailable)
+    old_price_cents: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    price_cents: Mapped[int] = mapped_column(Integer, nullable=False)
+    unavailable: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+
+    transaction_date_utc: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    ingested_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        # time-ordered scan of one series
+        Index("ix_price_changes_site_fuel_tx", "site_id", "fuel_id", "transaction_date_utc"),
+        # retention pruning
+        Index("ix_price_changes_tx", "transaction_date_utc"),
+        # price movers warm-up (by ingestion time)
+        Index("ix_price_changes_ingested", "ingested_at"),
+    )
@@ -1,7 +1,7 @@
 # app/db/models_notifications.py
 import uuid
 from datetime import datetime
-from sqlalchemy import String, DateTime, Boolean, ForeignKey, Text
+from sqlalchemy import String, DateTime, Boolean, ForeignKey, Index, Text
 from sqlalchemy.orm import Mapped, mapped_column
 from app.db.base import Base
 
@@ -30,9 +30,14 @@ class UserDevice(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime, default=now_utc, nullable=False)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=now_utc, onupdate=now_utc, nullable=False)
 
+    __table_args__ = (
+        # delivery fan-out: WHERE user_id IN (...) AND is_enabled
+        Index("ix_user_devices_user_enabled_kind", "user_id", "is_enabled", "kind"),
+    )
+
 
 # app/db/models_notifications.py (same file, add this)
-from sqlalchemy import Integer
+from sqlalchemy import Index, Integer, text
 
 class RuleAlertState(Base):
     __tablename__ = "rule_alert_state"
@@ -43,8 +48,86 @@ class RuleAlertState(Base):
     rule_id: Mapped[str] = mapped_column(String(36), ForeignKey("pricing_rules.id"), index=True, nullable=False)
     condition_id: Mapped[str] = mapped_column(String(36), ForeignKey("pricing_rule_conditions.id"), index=True, nullable=False)
 
+    # latched result of the last evaluation (drives "not triggered -> triggered" notifications)
+    is_currently_triggered: Mapped[bool] = mapped_column(Boolean, default=False, server_default=text("0"), nullable=False)
+
     last_triggered_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
     last_notified_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
 
     # optional: store last diff that triggered
     last_diff_raw: Mapped[int | None] = mapped_column(Integer, nullable=True)
+
+    __table_args__ = (
+        # one state row per condition; target of the scheduler's batched upsert
+        Index("uq_rule_alert_state_rule_condition", "rule_id", "condition_id", unique=True),
+    )
+
+
+from sqlalchemy.types import JSON
+
+class NotificationOutbox(Base):
+    """
+    Push notifications waiting for (or done with) delivery.
+    Written by the alert scheduler in the same transaction as the state change,
+    drained by app.notifications.delivery_worker.
+    """
+    __tablename__ = "notification_outbox"
+
+    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id: Mapped[str] = mapped_column(String(36), ForeignKey("users.id"), index=True, nullable=False)
+
+    title: Mapped[str] = mapped_column(String(200), nullable=False)
+    body: Mapped[str] = mapped_column(Text, nullable=False)
+    data: Mapped[dict | None] = mapped_column(JSON, nullable=True)
+
+    # user's alert partition (app.notifications.partitions); a sharded worker drains only its own
+    partition: Mapped[int | None] = mapped_column(Integer, nullable=True)
+
+    # pending -> sent | skipped (no devices) | failed (gave up after retries)
+    status: Mapped[str] = mapped_column(String(20), default="pending", nullable=False)
+    attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    # also used as a claim lease while a batch is in flight
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime, default=now_utc, nullable=False)
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    # devices (Expo tokens / web push endpoints) that already accepted it; retries skip them
+    delivered_to: Mapped[list | None] = mapped_column(JSON, nullable=True)
+
+    # latency stamps: upstream TransactionDateUtc and ingestion time of the price
+    # change that fired (null for cooldown re-notifies); created_at = evaluated,
+    # sent_at = accepted by the push provider
+    price_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    ingested_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=now_utc, nullable=False)
+    sent_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # delivery worker polls: WHERE status='pending' AND next_attempt_at <= now
+        Index("ix_notification_outbox_status_next", "status", "next_attempt_at"),
+    )
+
+
+class AlertPartitionLease(Base):
+    """
+    Ownership of one alert partition by an evaluator process.
+    epoch increases on every takeover; a worker commits only while the
+    epoch it acquired is still current (fencing).
+    """
+    __tablename__ = "alert_partition_leases"
+
+    partition: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    owner: Mapped[str | None] = mapped_column(String(100), nullable=True)
+    epoch: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    expires_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+
+class AlertWorker(Base):
+    """
+    Heartbeat of a sharded alert worker; fair shares are computed over live workers.
+    metrics is the worker's AlertMetrics.state() as of its last heartbeat.
+    """
+    __tablename__ = "alert_workers"
+
+    worker_id: Mapped[str] = mapped_column(String(100), primary_key=True)
+    heartbeat_at: Mapped[datetime] = mapped_column(DateTime, default=now_utc, nullable=False)
+    metrics: Mapped[dict | None] = mapped_column(JSON, nullable=True)
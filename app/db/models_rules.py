@@ -1,6 +1,7 @@
 import uuid
 from datetime import datetime
-from sqlalchemy import String, DateTime, Boolean, Integer, ForeignKey, Text
+from sqlalchemy import String, DateTime, Boolean, Integer, ForeignKey, Text, Index
+from sqlalchemy.types import JSON
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.base import Base
@@ -25,6 +26,11 @@ class PricingRule(Base):
 
     conditions = relationship("PricingRuleCondition", back_populates="rule", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # keyset pagination for /me/rules (ORDER BY created_at, id per user)
+        Index("ix_pricing_rules_user_created_id", "user_id", "created_at", "id"),
+    )
+
 class PricingRuleCondition(Base):
     __tablename__ = "pricing_rule_conditions"
 
@@ -42,3 +48,43 @@ class PricingRuleCondition(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime, default=now_utc, nullable=False)
 
     rule = relationship("PricingRule", back_populates="conditions")
+
+
+class PricingRuleReadModel(Base):
+    """
+    Denormalised /me/rules row per rule: the rule as served (conditions,
+    owned site, site names) plus its current trigger state.
+    Written with every rule change and alert state transition; rebuilt
+    from the normalised tables by app.services.rule_read_model.
+    """
+    __tablename__ = "pricing_rule_read_models"
+
+    rule_id: Mapped[str] = mapped_column(String(36), primary_key=True)
+    user_id: Mapped[str] = mapped_column(String(36), nullable=False)
+    owned_site_id: Mapped[str] = mapped_column(String(36), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)   # rule's, for paging
+
+    doc: Mapped[dict] = mapped_column(JSON, nullable=False)
+    # condition ids currently triggered
+    triggered: Mapped[list] = mapped_column(JSON, default=list, nullable=False)
+    last_triggered_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=now_utc, onupdate=now_utc, nullable=False)
+
+    __table_args__ = (
+        # keyset pagination, same order as pricing_rules
+        Index("ix_rule_read_models_user_created_id", "user_id", "created_at", "rule_id"),
+    )
+
+
+class PricingRuleChange(Base):
+    """
+    Append-only log of rule ids whose rule, conditions or owned site changed
+    (deletes included), written in the same transaction as the change.
+    Sharded alert workers poll it by id to recompile those rules.
+    """
+    __tablename__ = "pricing_rule_changes"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    rule_id: Mapped[str] = mapped_column(String(36), nullable=False)
+    changed_at: Mapped[datetime] = mapped_column(DateTime, default=now_utc, index=True, nullable=False)
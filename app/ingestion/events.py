@@ -0,0 +1,69 @@
+# app/ingestion/events.py
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Awaitable, Callable, List, Optional
+
+
+@dataclass(frozen=True)
+class PriceChange:
+    """
+    One (site, fuel) whose latest price moved in an ingestion cycle.
+    old_price_cents is None for a row seen for the first time;
+    old_unavailable tells whether that old price was the unavailable marker.
+    """
+    site_id: int
+    fuel_id: int
+    old_price_cents: Optional[int]
+    price_cents: int
+    unavailable: bool
+    transaction_date_utc: datetime
+    ingested_at: datetime
+    old_unavailable: bool = False
+
+
+PriceListener = Callable[[List[PriceChange]], Awaitable[None]]
+
+_price_listeners: List[PriceListener] = []
+
+
+def add_price_listener(fn: PriceListener) -> None:
+    """
+    Register a coroutine called after every committed price sync
+    with that cycle's change set (possibly empty).
+    """
+    if fn not in _price_listeners:
+        _price_listeners.append(fn)
+
+
+async def publish_price_changes(changes: List[PriceChange]) -> None:
+    for fn in list(_price_listeners):
+        try:
+            await fn(changes)
+        except Exception:
+            # a failing consumer must never fail ingestion
+            pass
+
+
+MasterListener = Callable[[List[int]], Awaitable[None]]
+
+_master_listeners: List[MasterListener] = []
+
+
+def add_master_listener(fn: MasterListener) -> None:
+    """
+    Register a coroutine called after every committed master sync with the
+    ids of sites that were added or renamed (possibly empty).
+    """
+    if fn not in _master_listeners:
+        _master_listeners.append(fn)
+
+
+async def publish_master_sync(site_ids: List[int]) -> None:
+    for fn in list(_master_listeners):
+        try:
+            await fn(site_ids)
+        except Exception:
+            # a failing consumer must never fail ingestion
+            pass
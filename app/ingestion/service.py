@@ -1,12 +1,14 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import delete, exists, select
+from sqlalchemy.orm import aliased
 
 from app.core.settings import settings
 from app.fpd.client import FPDClient
 from app.fpd.parsers import unwrap_list, parse_dt
 from app.db.models.master import Brand, FuelType, GeoRegion, Site
-from app.db.models.prices import PriceLatest
+from app.db.models.prices import PriceHistory, PriceLatest
+from app.ingestion.events import PriceChange, publish_master_sync, publish_price_changes
 
 class IngestionService:
     def __init__(self) -> None:
@@ -78,6 +80,7 @@ class IngestionService:
             settings.FPD_GEO_ID,
         )
         sites = unwrap_list(sites_payload, ["S"])
+        renamed: list[int] = []   # added or renamed: documents embedding the name are refreshed
 
         for s in sites:
             site_id = int(s["S"])
@@ -92,6 +95,8 @@ class IngestionService:
             extra = {k: v for k, v in s.items() if k not in known}
 
             obj = await db.get(Site, site_id)
+            if obj is None or obj.name != str(s.get("N") or ""):
+                renamed.append(site_id)
             if obj:
                 obj.name = str(s.get("N") or "")
                 obj.address = str(s.get("A") or "")
@@ -127,11 +132,13 @@ class IngestionService:
                 )
 
         await db.commit()
+        await publish_master_sync(renamed)
         return {"brands": len(brands), "fuels": len(fuels), "regions": len(regions), "sites": len(sites)}
 
     async def sync_prices_latest(self, db: AsyncSession) -> dict:
         """
-        Refresh latest prices snapshot (no history).
+        Refresh latest prices snapshot. Changed prices are also appended
+        to fpd_price_changes (kept PRICE_HISTORY_DAYS) for rule backtests.
         """
         payload = await self.client.get_site_prices(
             settings.FPD_COUNTRY_ID, settings.FPD_GEO_LEVEL, settings.FPD_GEO_ID
@@ -141,6 +148,7 @@ class IngestionService:
         now = datetime.utcnow()
         updated = 0
         skipped_missing_site = 0
+        changes: list[PriceChange] = []
 
         for p in items:
             site_id = int(p["SiteId"])
@@ -169,6 +177,37 @@ class IngestionService:
             )
             existing = q.scalar_one_or_none()
 
+            if (
+                existing is None
+                or existing.price_cents != price_cents
+                or bool(existing.unavailable) != unavailable
+            ):
+                changes.append(
+                    PriceChange(
+                        site_id=site_id,
+                        fuel_id=fuel_id,
+                        old_price_cents=existing.price_cents if existing else None,
+                        price_cents=price_cents,
+                        unavailable=unavailable,
+                        transaction_date_utc=dt,
+                        ingested_at=now,
+                        old_unavailable=bool(existing.unavailable) if existing else False,
+                    )
+                )
+                db.add(
+                    PriceHistory(
+                        site_id=site_id,
+                        fuel_id=fuel_id,
+                        old_price_cents=(
+                            existing.price_cents if existing is not None and not existing.unavailable else None
+                        ),
+                        price_cents=price_cents,
+                        unavailable=unavailable,
+                        transaction_date_utc=dt,
+                        ingested_at=now,
+                    )
+                )
+
             if existing:
                 existing.price_raw = price_raw
                 existing.price_cents = price_cents
@@ -191,5 +230,27 @@ class IngestionService:
                 )
             updated += 1
 
+        # retention: keep the row in effect at the cutoff so a replay from there has a starting price
+        cutoff = now - timedelta(days=settings.PRICE_HISTORY_DAYS)
+        newer = aliased(PriceHistory)
+        await db.execute(
+            delete(PriceHistory)
+            .where(PriceHistory.transaction_date_utc < cutoff)
+            .where(
+                exists()
+                .where(newer.site_id == PriceHistory.site_id, newer.fuel_id == PriceHistory.fuel_id)
+                .where(newer.transaction_date_utc > PriceHistory.transaction_date_utc)
+                .where(newer.transaction_date_utc <= cutoff)
+            )
+        )
         await db.commit()
-        return {"fetched": len(items), "updated": updated, "skipped_missing_site": skipped_missing_site}
+
+        # consumers (snapshots, alerts, ...) only ever see committed data
+        await publish_price_changes(changes)
+
+        return {
+            "fetched": len(items),
+            "updated": updated,
+            "skipped_missing_site": skipped_missing_site,
+            "changed": len(changes),
+        }
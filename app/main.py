@@ -1,10 +1,23 @@
 import asyncio
 from fastapi import FastAPI
+from app.api.responses import SkipCompressedGZipMiddleware
 from app.api.router import api
+from app.core.settings import settings
 from app.db.init_db import init_db
 from app.ingestion.scheduler import start_scheduler
+from app.ingestion.events import add_master_listener, add_price_listener
+from app.services.snapshot_service import on_prices_ingested as write_price_snapshot
 from fastapi.middleware.cors import CORSMiddleware
-from app.notifications.alert_scheduler import start_alert_scheduler
+from app.notifications.alert_scheduler import start_alert_scheduler, on_prices_ingested as queue_alert_evaluation
+from app.notifications.delivery_worker import start_delivery_worker
+from app.notifications.state_cache import flush_alert_state
+from app.services.push_service import expo_client
+from app.services.rule_read_model import ensure_rule_read_models, on_master_synced as refresh_rule_site_names
+from app.services.competitive_rank import (
+    on_master_synced as invalidate_competitive_ranks,
+    on_prices_ingested as update_competitive_ranks,
+)
+from app.services.price_movers import on_prices_ingested as update_price_movers, warm_price_movers
 
 app = FastAPI(title="Fuel App Backend (Ingestion-first)")
 
@@ -17,12 +30,40 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# compress large bodies (map views, catalog lists); small responses go out as-is
+app.add_middleware(SkipCompressedGZipMiddleware, minimum_size=1024)
+
 
 app.include_router(api)
 
 @app.on_event("startup")
 async def on_startup():
     await init_db()
+    # /me/rules read model (built on first start after upgrading)
+    await ensure_rule_read_models()
+    # rules embed site names; master syncs rename sites
+    add_master_listener(refresh_rule_site_names)
+    # nearest-site competitor sets follow the site list
+    add_master_listener(invalidate_competitive_ranks)
+    # react to committed price syncs
+    add_price_listener(write_price_snapshot)
+    add_price_listener(update_competitive_ranks)
+    # movers feed: replay the last day before live changes start arriving
+    await warm_price_movers()
+    add_price_listener(update_price_movers)
     # start ingestion scheduler in background
     asyncio.create_task(start_scheduler())
-    asyncio.create_task(start_alert_scheduler())
+    # alerts run here unless sharded workers (app.notifications.worker) own them
+    if not settings.ALERT_EXTERNAL_WORKERS:
+        add_price_listener(queue_alert_evaluation)
+        asyncio.create_task(start_alert_scheduler())
+        asyncio.create_task(start_delivery_worker())
+        asyncio.create_task(expo_client.run_receipt_poller())
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    if not settings.ALERT_EXTERNAL_WORKERS:
+        # write-behind alert state
+        await flush_alert_state()
+    await expo_client.aclose()
@@ -2,232 +2,353 @@
 from __future__ import annotations
 
 import asyncio
-from datetime import datetime, timedelta, timezone
-from typing import Dict, List, Optional, Tuple
+from dataclasses import replace
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
 
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.settings import settings
+from app.db.chunks import chunked
 from app.db.session import SessionLocal
-from app.db.models_rules import PricingRule, PricingRuleCondition as RuleCondition
-from app.db.models.stations import UserOwnedSite as OwnedSite
-from app.db.models_notifications import UserDevice as NotificationDevice, RuleAlertState
-from app.services.push_service import send_expo_push, send_web_push
-
-
-POLL_SECONDS = 60          # evaluate every 60s (match your front-end POLL_MS)
+from app.db.models.prices import PriceLatest
+from app.db.models_notifications import NotificationOutbox
+from app.ingestion.events import PriceChange
+from app.notifications import delivery_worker
+from app.notifications.digest import build_digest
+from app.notifications.metrics import TickStats, alert_metrics
+from app.notifications.partitions import PartitionLeases, partition_of
+from app.notifications.rule_index import rule_index
+from app.services.rule_read_model import apply_trigger_transitions
+from app.notifications.state_cache import (
+    STATE_FLUSH_SECONDS,
+    AlertState,
+    flush_alert_state,
+    state_cache,
+    write_states,
+)
+
+
+POLL_SECONDS = 60          # max idle wait; work is normally triggered by ingestion / rule changes
 COOLDOWN_MINUTES = 30      # notify again only after cooldown if still triggered
 
+# Work queued for the next tick (filled by ingestion and rule handlers)
+_pending_keys: Set[Tuple[int, int]] = set()
+_pending_rules: Set[str] = set()
+_sweep_partitions: Set[int] = set()   # newly owned partitions awaiting a full sweep
+_wakeup = asyncio.Event()
 
-def _cmp_triggered(diff_raw: int, comparator: str, threshold_raw: int) -> bool:
-    # raw values in your system: 1543 => 154.3c
-    if comparator == "GT":
-        return diff_raw > threshold_raw
-    if comparator == "GTE":
-        return diff_raw >= threshold_raw
-    if comparator == "LT":
-        return diff_raw < threshold_raw
-    if comparator == "LTE":
-        return diff_raw <= threshold_raw
-    if comparator == "ABS_GT":
-        return abs(diff_raw) > threshold_raw
-    if comparator == "ABS_GTE":
-        return abs(diff_raw) >= threshold_raw
-    return False
-
-
-async def _fetch_latest_raw_price(session: AsyncSession, site_id: int, fuel_id: int) -> Optional[int]:
-    """
-    IMPORTANT:
-    You said you already expose GET /v1/prices/latest.
-    Best practice is to call the internal price service function directly,
-    but since that code isn't in the uploaded files, keep a single place
-    to plug it in.
-
-    Replace this implementation with your internal latest-price lookup.
-    """
-    # ---- IMPLEMENT YOUR REAL LOOKUP HERE ----
-    # Example (pseudo):
-    # row = await session.execute(select(Price).where(...).order_by(Price.recorded_at.desc()).limit(1))
-    # return row.scalar_one_or_none().price_cents_raw
-
-    return None  # <-- replace
+# condition id -> when a still-triggered condition is due for a cooldown re-notify
+_rearm_at: Dict[str, datetime] = {}
 
 
-async def _get_user_devices(session: AsyncSession, user_id: str) -> Tuple[List[str], List[dict]]:
+async def _load_latest_raw_prices(
+    session: AsyncSession,
+    keys: Iterable[Tuple[int, int]],
+    stamps: Optional[Dict[Tuple[int, int], Tuple[datetime, datetime]]] = None,
+) -> Dict[Tuple[int, int], int]:
     """
-    Returns (expo_tokens, webpush_subscriptions)
+    Latest RAW price (price_cents, 1543 = 154.3c) for every (site_id, fuel_id) in keys,
+    fetched in one query per chunk of sites. Unavailable / missing prices are absent.
+    If stamps is given it is filled with (transaction_date_utc, ingested_at) per key.
     """
-    res = await session.execute(
-        select(NotificationDevice).where(NotificationDevice.user_id == user_id)
-    )
-    devices = res.scalars().all()
-
-    expo_tokens: List[str] = []
-    webpush_subs: List[dict] = []
-
-    for d in devices:
-        if d.platform == "expo" and d.push_token:
-            expo_tokens.append(d.push_token)
-        elif d.platform == "webpush" and d.web_push_subscription:
-            # stored as JSON string in your model
-            try:
-                import json
-                webpush_subs.append(json.loads(d.web_push_subscription))
-            except Exception:
-                pass
-
-    return expo_tokens, webpush_subs
-
-
-async def _upsert_state(
-    session: AsyncSession,
-    user_id: str,
-    rule_id: str,
-    condition_id: str,
-) -> RuleAlertState:
-    q = await session.execute(
-        select(RuleAlertState).where(
-            RuleAlertState.user_id == user_id,
-            RuleAlertState.rule_id == rule_id,
-            RuleAlertState.condition_id == condition_id,
+    wanted = set(keys)
+    if not wanted:
+        return {}
+
+    site_ids = sorted({sid for sid, _ in wanted})
+    fuel_ids = sorted({fid for _, fid in wanted})
+
+    out: Dict[Tuple[int, int], int] = {}
+    for chunk in chunked(site_ids):
+        res = await session.execute(
+            select(
+                PriceLatest.site_id,
+                PriceLatest.fuel_id,
+                PriceLatest.price_cents,
+                PriceLatest.transaction_date_utc,
+                PriceLatest.ingested_at,
+            )
+            .where(PriceLatest.site_id.in_(chunk))
+            .where(PriceLatest.fuel_id.in_(fuel_ids))
+            .where(PriceLatest.unavailable == False)  # noqa: E712
         )
-    )
-    st = q.scalar_one_or_none()
-    if st:
-        return st
-
-    st = RuleAlertState(
-        user_id=user_id,
-        rule_id=rule_id,
-        condition_id=condition_id,
-        is_currently_triggered=False,
-        last_triggered_at=None,
-        last_notified_at=None,
-    )
-    session.add(st)
-    await session.flush()
-    return st
-
-
-async def evaluate_and_notify_once() -> None:
+        for sid, fid, cents, tx, ingested in res.all():
+            key = (int(sid), int(fid))
+            if key in wanted:
+                out[key] = int(cents)
+                if stamps is not None:
+                    stamps[key] = (tx, ingested)
+    return out
+
+
+async def evaluate_and_notify_once(
+    condition_ids: Optional[Iterable[str]] = None,
+    leases: Optional[PartitionLeases] = None,
+) -> None:
     """
     One scheduler tick:
-    - query enabled rules
+    - take enabled conditions (all, or only condition_ids) from the compiled rule index
+    - with leases, only conditions of users in partitions this process owns
     - compute triggered state per condition
     - spam control:
         send when NOT triggered -> triggered
         OR triggered again after cooldown
     """
-    now = datetime.now(timezone.utc)
+    if condition_ids is not None and not condition_ids:
+        return
+
+    # naive UTC, same as every DateTime column in the DB
+    now = datetime.utcnow()
     cooldown = timedelta(minutes=COOLDOWN_MINUTES)
 
     async with SessionLocal() as session:
-        # Load enabled rules + owned sites in one go
-        rules_res = await session.execute(
-            select(PricingRule).where(PricingRule.is_enabled == True)  # noqa
-        )
-        rules = rules_res.scalars().all()
-        if not rules:
+        await rule_index.ensure(session)
+        rows = rule_index.rows(condition_ids, leases.owned if leases is not None else None)
+        if not rows:
             return
 
-        # Pre-load owned sites referenced by rules
-        owned_site_ids = list({r.owned_site_id for r in rules if r.owned_site_id})
-        owned_map: Dict[str, OwnedSite] = {}
-        if owned_site_ids:
-            owned_res = await session.execute(
-                select(OwnedSite).where(OwnedSite.id.in_(owned_site_ids))
+        # All needed latest prices in one pass
+        stamps: Dict[Tuple[int, int], Tuple[datetime, datetime]] = {}
+        prices = await _load_latest_raw_prices(session, rule_index.price_keys(rows), stamps)
+
+        # Compiled conditions evaluated over the index's arrays (RAW: 1543 = 154.3c)
+        triggered_all = rule_index.evaluate(rows, prices)
+        # copy what the loop needs; row numbers change when the index is rebuilt
+        items = [
+            (
+                rule_index.cond_ids[i], rule_index.rule_ids[i], rule_index.user_ids[i],
+                rule_index.owned_ids[i], rule_index.own_site[i], rule_index.comp_site[i],
+                (rule_index.own_site[i], rule_index.own_fuel[i]),
+                (rule_index.comp_site[i], rule_index.comp_fuel[i]),
             )
-            for os in owned_res.scalars().all():
-                owned_map[os.id] = os
-
-        # Pre-load conditions
-        rule_ids = [r.id for r in rules]
-        cond_res = await session.execute(
-            select(RuleCondition).where(RuleCondition.rule_id.in_(rule_ids))
-        )
-        conditions_by_rule: Dict[str, List[RuleCondition]] = {}
-        for c in cond_res.scalars().all():
-            conditions_by_rule.setdefault(c.rule_id, []).append(c)
-
-        # Iterate rules
-        for rule in rules:
-            owned = owned_map.get(rule.owned_site_id)
-            if not owned:
-                continue
-
-            user_id = owned.user_id  # OwnedSite.user_id exists in your model
-            rule_conditions = conditions_by_rule.get(rule.id, [])
-            if not rule_conditions:
-                continue
-
-            # Evaluate each condition
-            for cond in rule_conditions:
-                # Fetch latest prices RAW (1543 = 154.3c)
-                own_raw = await _fetch_latest_raw_price(session, owned.site_id, cond.own_fuel_id)
-                comp_raw = await _fetch_latest_raw_price(session, rule.competitor_site_id, cond.competitor_fuel_id)
-
-                # If require both available and missing → treat as not triggered
-                if cond.require_both_available and (own_raw is None or comp_raw is None):
-                    triggered = False
-                else:
-                    # If either missing → not triggered
-                    if own_raw is None or comp_raw is None:
-                        triggered = False
-                    else:
-                        diff_raw = (comp_raw - own_raw) if cond.direction == "COMPETITOR_MINUS_OWN" else (own_raw - comp_raw)
-                        triggered = _cmp_triggered(diff_raw, cond.comparator, cond.threshold_cents)
-
-                st = await _upsert_state(session, user_id=user_id, rule_id=rule.id, condition_id=cond.id)
-
-                # Decide notify
-                should_notify = False
-                if triggered and not st.is_currently_triggered:
-                    # transition: not triggered -> triggered
+            for i in rows
+        ]
+        partitions = {rule_index.parts[i] for i in rows}
+
+        # Alert state from the in-memory cache (DB only on a miss); the loop
+        # works on copies so a rolled-back tick leaves the cache untouched
+        cached = await state_cache.get_many(session, [it[0] for it in items])
+        notified: List[AlertState] = []   # committed with the outbox rows
+        deferred: List[AlertState] = []   # written behind
+        alerts_by_user: Dict[str, List[Dict[str, Any]]] = {}
+        # user -> newest (price_at, ingested_at) among price changes that fired
+        fired_by_user: Dict[str, Tuple[datetime, datetime]] = {}
+        # rule -> {condition: triggered} for flipped conditions (rules read model)
+        transitions: Dict[str, Dict[str, bool]] = {}
+        tick = TickStats(at=now, evaluated=len(items))
+
+        for (cond_id, rule_id, user_id, owned_id, own_site, comp_site, own_key, comp_key), triggered in zip(items, triggered_all):
+            prev = cached.get(cond_id)
+            if prev is not None:
+                st = replace(prev)
+            else:
+                st = AlertState(user_id=user_id, rule_id=rule_id, condition_id=cond_id)
+            before = (st.is_currently_triggered, st.last_notified_at)
+
+            # Decide notify
+            should_notify = False
+            if triggered and not st.is_currently_triggered:
+                # transition: not triggered -> triggered
+                should_notify = True
+            elif triggered and st.is_currently_triggered:
+                # still triggered: notify again only after cooldown
+                if st.last_notified_at is None or (now - st.last_notified_at) >= cooldown:
                     should_notify = True
-                elif triggered and st.is_currently_triggered:
-                    # still triggered: notify again only after cooldown
-                    if st.last_notified_at is None or (now - st.last_notified_at) >= cooldown:
-                        should_notify = True
-
-                # Update state
-                if triggered and not st.is_currently_triggered:
-                    st.last_triggered_at = now
-                st.is_currently_triggered = triggered
 
-                if should_notify:
-                    title = "Fuel alert triggered"
-                    body = f"Rule triggered for site {owned.site_id} vs competitor {rule.competitor_site_id}"
-                    data = {
-                        "ruleId": rule.id,
-                        "conditionId": cond.id,
-                        "ownedSiteId": owned.id,
-                        "ownedSite": owned.site_id,
-                        "competitorSite": rule.competitor_site_id,
-                    }
-
-                    expo_tokens, web_subs = await _get_user_devices(session, user_id=user_id)
+            if triggered:
+                tick.triggered += 1
+                if not should_notify:
+                    tick.suppressed += 1
+
+            # Update state
+            if triggered and not st.is_currently_triggered:
+                st.last_triggered_at = now
+                fired = [stamps[k] for k in (own_key, comp_key) if k in stamps]
+                if fired:
+                    newest = max(fired)
+                    if user_id not in fired_by_user or newest > fired_by_user[user_id]:
+                        fired_by_user[user_id] = newest
+            if triggered != st.is_currently_triggered:
+                transitions.setdefault(rule_id, {})[cond_id] = triggered
+            st.is_currently_triggered = triggered
+
+            if should_notify:
+                alerts_by_user.setdefault(user_id, []).append({
+                    "ruleId": rule_id,
+                    "conditionId": cond_id,
+                    "ownedSiteId": owned_id,
+                    "ownedSite": own_site,
+                    "competitorSite": comp_site,
+                })
+                st.last_notified_at = now
+
+            # remember when a still-triggered condition may re-notify
+            if triggered:
+                _rearm_at[cond_id] = (st.last_notified_at or now) + cooldown
+            else:
+                _rearm_at.pop(cond_id, None)
+
+            # brand-new untriggered states aren't worth a row
+            if st.id is None and not triggered:
+                continue
+            if st.id is None or (st.is_currently_triggered, st.last_notified_at) != before:
+                (notified if should_notify else deferred).append(st)
+
+        # one digest per user per tick; delivered by the delivery worker,
+        # committed together with the state below
+        send_after = now + timedelta(seconds=settings.ALERT_DIGEST_WINDOW_SECONDS)
+        outbox: List[NotificationOutbox] = []
+        for user_id, alerts in alerts_by_user.items():
+            title, body, data = build_digest(alerts)
+            price_at, ingested_at = fired_by_user.get(user_id, (None, None))
+            outbox.append(
+                NotificationOutbox(
+                    user_id=user_id, title=title, body=body, data=data,
+                    next_attempt_at=send_after, partition=partition_of(user_id),
+                    price_at=price_at, ingested_at=ingested_at, created_at=now,
+                )
+            )
+        tick.queued = len(outbox)
+
+        # one short write transaction per tick: notified states, outbox and
+        # rules read model commit (or roll back) together; steady-state ticks write nothing
+        await write_states(session, notified)
+        session.add_all(outbox)
+        await apply_trigger_transitions(session, transitions, now)
+
+        # fencing: if a partition changed hands mid-tick its new owner evaluates
+        # it; committing here as well would notify twice
+        if leases is not None and (notified or outbox or transitions):
+            await session.flush()
+            if not await leases.verify(session, partitions):
+                await session.rollback()
+                return
+
+        await session.commit()
+
+    state_cache.apply(notified, persisted=True)
+    state_cache.apply(deferred, persisted=False)
+    alert_metrics.record_tick(tick)
+    if outbox:
+        delivery_worker.wake()
+
+
+# -------------------------
+# Event-driven triggering
+# -------------------------
+async def on_prices_ingested(changes: List[PriceChange]) -> None:
+    """
+    Ingestion listener: queue the (site, fuel) keys whose price moved.
+    """
+    if not changes:
+        return
+    queue_price_keys((c.site_id, c.fuel_id) for c in changes)
 
-                    # Send expo push (iOS/Android)
-                    await send_expo_push(expo_tokens, title=title, body=body, data=data)
 
-                    # Optional web push
-                    if web_subs:
-                        send_web_push(web_subs, title=title, body=body, data=data)
+def queue_price_keys(keys: Iterable[Tuple[int, int]]) -> None:
+    _pending_keys.update(keys)
+    _wakeup.set()
 
-                    st.last_notified_at = now
 
-                await session.commit()
+def partitions_gained(partitions: Set[int]) -> None:
+    """
+    Lease callback: partitions taken over from another worker get a full sweep.
+    """
+    state_cache.forget_partitions(partitions)
+    _sweep_partitions.update(partitions)
+    _wakeup.set()
 
 
-async def start_alert_scheduler() -> None:
+def rules_changed(rule_ids: Iterable[str] = ()) -> None:
     """
-    Runs forever inside your FastAPI lifespan task.
+    Called by rule handlers after commit: the given rules are recompiled
+    into the rule index on the next tick and re-evaluated (no ids: full rebuild).
     """
+    rule_ids = list(rule_ids)
+    if rule_ids:
+        rule_index.invalidate_rules(rule_ids)
+    else:
+        rule_index.invalidate()
+    _pending_rules.update(rule_ids)
+    _wakeup.set()
+
+
+async def _evaluate_pending(leases: Optional[PartitionLeases] = None) -> None:
+    _wakeup.clear()
+    keys = set(_pending_keys)
+    rule_ids = set(_pending_rules)
+    _pending_keys.difference_update(keys)
+    _pending_rules.difference_update(rule_ids)
+
+    now = datetime.utcnow()
+    due = {cid for cid, at in _rearm_at.items() if at <= now}
+
+    if not (keys or rule_ids or due):
+        return  # idle tick: no DB work
+
+    due_at = {cid: _rearm_at[cid] for cid in due}
+    try:
+        condition_ids = set(due)
+        if keys or rule_ids:
+            async with SessionLocal() as session:
+                await rule_index.ensure(session)
+            condition_ids |= rule_index.conditions_for_keys(keys)
+            condition_ids |= rule_index.conditions_for_rules(rule_ids)
+
+        # conditions that vanished (rule deleted / disabled) stop being tracked
+        for cid in due:
+            _rearm_at.pop(cid, None)
+
+        await evaluate_and_notify_once(condition_ids, leases)
+    except Exception:
+        # put the drained work back for the next tick
+        _pending_keys.update(keys)
+        _pending_rules.update(rule_ids)
+        for cid, at in due_at.items():
+            _rearm_at.setdefault(cid, at)
+        raise
+
+
+async def start_alert_scheduler(leases: Optional[PartitionLeases] = None) -> None:
+    """
+    Runs forever inside your FastAPI lifespan task, or in each sharded
+    worker process (app.notifications.worker) with that worker's leases.
+
+    First tick loads all alert states and evaluates everything; after that
+    only conditions touched by ingested price changes, edited rules or an
+    expiring cooldown are evaluated. Non-notifying state changes are flushed
+    every STATE_FLUSH_SECONDS from this loop, so they never race a tick.
+    """
+    loop = asyncio.get_running_loop()
+    full_sweep = True
+    flushed_at = loop.time()
     while True:
         try:
-            await evaluate_and_notify_once()
+            if full_sweep:
+                async with SessionLocal() as session:
+                    await state_cache.preload(session)
+            if full_sweep or _sweep_partitions:
+                _sweep_partitions.clear()
+                await evaluate_and_notify_once(leases=leases)
+                full_sweep = False
+            else:
+                await _evaluate_pending(leases)
         except Exception:
             # keep scheduler alive
             pass
-        await asyncio.sleep(POLL_SECONDS)
+
+        if state_cache.dirty_count and loop.time() - flushed_at >= STATE_FLUSH_SECONDS:
+            try:
+                await flush_alert_state(leases)
+            except Exception:
+                # dirty states stay queued for the next round
+                pass
+            flushed_at = loop.time()
+
+        timeout = STATE_FLUSH_SECONDS if state_cache.dirty_count else POLL_SECONDS
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
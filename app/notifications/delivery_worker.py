@@ -0,0 +1,249 @@
+# app/notifications/delivery_worker.py
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.session import SessionLocal
+from app.db.models_notifications import NotificationOutbox
+from app.notifications.device_directory import device_directory
+from app.notifications.digest import merge_digests
+from app.notifications.metrics import DeliveryStats, alert_metrics
+from app.notifications.partitions import PartitionLeases
+from app.services.push_service import PushResult, send_expo_push, send_web_push
+
+
+DELIVERY_BATCH = 100          # outbox rows claimed per round
+DELIVERY_CONCURRENCY = 10     # messages in flight at once
+DELIVERY_POLL_SECONDS = 30    # idle wait when nobody wakes us
+CLAIM_LEASE_SECONDS = 120     # a crashed batch is retried after this
+CLAIM_SEND_MARGIN_SECONDS = 15  # no send starts this close to the lease running out
+MAX_ATTEMPTS = 6
+BACKOFF_BASE_SECONDS = 15     # 15s, 30s, 60s, ... capped below
+BACKOFF_MAX_SECONDS = 60 * 30
+
+_wakeup = asyncio.Event()
+
+
+def wake() -> None:
+    """
+    Called after new outbox rows are committed.
+    """
+    _wakeup.set()
+
+
+def _backoff(attempts: int) -> timedelta:
+    return timedelta(seconds=min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** max(0, attempts - 1))))
+
+
+async def _claim_batch(
+    session: AsyncSession,
+    now: datetime,
+    partitions: Optional[Set[int]] = None,
+) -> List[NotificationOutbox]:
+    """
+    Claims due rows by pushing next_attempt_at out by the lease, so a
+    second worker (or a restart after a crash) won't pick them up meanwhile.
+    The claim only matches rows still due, so when two workers race for the
+    same rows each keeps only those its own UPDATE took.
+    Sharded workers only claim rows of the partitions they own.
+    """
+    stmt = (
+        select(NotificationOutbox.id)
+        .where(NotificationOutbox.status == "pending")
+        .where(NotificationOutbox.next_attempt_at <= now)
+    )
+    if partitions is not None:
+        stmt = stmt.where(NotificationOutbox.partition.in_(sorted(partitions)))
+    due = (
+        await session.execute(stmt.order_by(NotificationOutbox.next_attempt_at).limit(DELIVERY_BATCH))
+    ).scalars().all()
+    if not due:
+        return []
+
+    res = await session.execute(
+        update(NotificationOutbox)
+        .where(NotificationOutbox.id.in_(list(due)))
+        .where(NotificationOutbox.status == "pending")
+        .where(NotificationOutbox.next_attempt_at <= now)
+        .values(next_attempt_at=now + timedelta(seconds=CLAIM_LEASE_SECONDS))
+        .returning(NotificationOutbox.id)
+        .execution_options(synchronize_session=False)
+    )
+    claimed = list(res.scalars().all())
+    await session.commit()
+    if not claimed:
+        return []
+
+    res = await session.execute(
+        select(NotificationOutbox)
+        .where(NotificationOutbox.id.in_(claimed))
+        .order_by(NotificationOutbox.created_at)
+        .execution_options(populate_existing=True)
+    )
+    return list(res.scalars().all())
+
+
+async def _send(
+    msgs: List[NotificationOutbox],
+    expo_tokens: List[str],
+    web_subs: List[dict],
+) -> PushResult:
+    """
+    Sends the group's push to the given devices. The per-device result lets
+    a retry go only to the devices that failed.
+    """
+    # several queued digests for one user go out as one push
+    if len(msgs) == 1:
+        title, body, data = msgs[0].title, msgs[0].body, msgs[0].data or {}
+    else:
+        title, body, data = merge_digests([m.data for m in msgs])
+
+    result = PushResult()
+
+    # Send expo push (iOS/Android)
+    if expo_tokens:
+        try:
+            result.merge(await send_expo_push(expo_tokens, title=title, body=body, data=data))
+        except Exception as e:
+            result.failed.update((t, f"{type(e).__name__}: {e}") for t in expo_tokens)
+
+    # Optional web push
+    if web_subs:
+        try:
+            result.merge(await send_web_push(web_subs, title=title, body=body, data=data))
+        except Exception as e:
+            result.failed.update((s["endpoint"], f"{type(e).__name__}: {e}") for s in web_subs)
+
+    return result
+
+
+def _mark_failed(msg: NotificationOutbox, err: Exception | str) -> None:
+    msg.attempts += 1
+    msg.last_error = (err if isinstance(err, str) else f"{type(err).__name__}: {err}")[:1000]
+    if msg.attempts >= MAX_ATTEMPTS:
+        msg.status = "failed"
+    else:
+        msg.next_attempt_at = datetime.utcnow() + _backoff(msg.attempts)
+
+
+async def deliver_pending_once(partitions: Optional[Set[int]] = None) -> int:
+    """
+    Drain one batch of due outbox rows. Returns how many rows were handled.
+
+    Rows are grouped per user: devices are looked up once and the user gets
+    a single push for everything queued.
+    """
+    now = datetime.utcnow()
+
+    async with SessionLocal() as session:
+        batch = await _claim_batch(session, now, partitions)
+        if not batch:
+            return 0
+
+        by_user: Dict[str, List[NotificationOutbox]] = {}
+        for msg in batch:
+            by_user.setdefault(msg.user_id, []).append(msg)
+
+        # every user's devices in one lookup (cached between batches)
+        try:
+            devices = await device_directory.for_users(session, by_user.keys())
+        except Exception as e:
+            for msg in batch:
+                _mark_failed(msg, e)
+            await session.commit()
+            return len(batch)
+
+        # one push per user and set of devices already reached: messages
+        # that were partly delivered before only go to the devices they missed
+        groups: Dict[Tuple[str, FrozenSet[str]], List[NotificationOutbox]] = {}
+        for user_id, msgs in by_user.items():
+            if devices[user_id].empty:
+                for msg in msgs:
+                    msg.status = "skipped"
+                continue
+            for msg in msgs:
+                groups.setdefault((user_id, frozenset(msg.delivered_to or ())), []).append(msg)
+        await session.commit()
+
+        lease_ends = now + timedelta(seconds=CLAIM_LEASE_SECONDS - CLAIM_SEND_MARGIN_SECONDS)
+        sem = asyncio.Semaphore(DELIVERY_CONCURRENCY)
+        write_lock = asyncio.Lock()   # the tasks share one session
+        failed: Set[str] = set()
+
+        async def _deliver(user_id: str, done: FrozenSet[str], msgs: List[NotificationOutbox]) -> None:
+            d = devices[user_id]
+            expo_tokens = [t for t in d.expo_tokens if t not in done]
+            web_subs = [s for s in d.webpush_subs if s["endpoint"] not in done]
+
+            result = PushResult()
+            async with sem:
+                if datetime.utcnow() >= lease_ends:
+                    # the claim is about to lapse and another worker may take
+                    # these rows; leave them to whoever claims them next
+                    return
+                if expo_tokens or web_subs:
+                    result = await _send(msgs, expo_tokens, web_subs)
+
+            # each group's outcome is committed as soon as it is known
+            async with write_lock:
+                sent_at = datetime.utcnow()
+                for msg in msgs:
+                    if result.done:
+                        msg.delivered_to = sorted(done | set(result.done))
+                    if result.failed:
+                        _mark_failed(msg, result.error)
+                        failed.add(msg.id)
+                        continue
+                    msg.status = "sent"
+                    msg.sent_at = sent_at
+                    msg.last_error = None
+                    alert_metrics.record_accepted(
+                        outbox_id=msg.id, user_id=msg.user_id,
+                        price_at=msg.price_at, ingested_at=msg.ingested_at,
+                        evaluated_at=msg.created_at, accepted_at=sent_at,
+                    )
+                await session.commit()
+
+        await asyncio.gather(*[_deliver(user_id, done, msgs) for (user_id, done), msgs in groups.items()])
+
+        stats = DeliveryStats(at=now, claimed=len(batch))
+        for msg in batch:
+            if msg.status == "sent":
+                stats.sent += 1
+            elif msg.status == "skipped":
+                stats.skipped += 1
+            elif msg.id in failed:
+                stats.failed += 1  # retry scheduled or gave up
+        alert_metrics.record_delivery(stats)
+        return len(batch)
+
+
+async def start_delivery_worker(leases: Optional[PartitionLeases] = None) -> None:
+    """
+    Runs forever next to the alert scheduler; evaluation never waits on push providers.
+    """
+    while True:
+        # cleared before draining: a wake() during the drain makes the wait below return at once
+        _wakeup.clear()
+        handled = 0
+        try:
+            if leases is None:
+                handled = await deliver_pending_once()
+            elif leases.owned:
+                handled = await deliver_pending_once(leases.owned)
+        except Exception:
+            # keep worker alive
+            pass
+
+        if handled >= DELIVERY_BATCH:
+            continue  # backlog: keep draining
+
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=DELIVERY_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
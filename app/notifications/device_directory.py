@@ -0,0 +1,89 @@
+# app/notifications/device_directory.py
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.chunks import chunked
+from app.db.models_notifications import UserDevice
+
+# entries are dropped on device changes in this process; the TTL bounds
+# staleness from changes made by other processes
+DEVICE_CACHE_SECONDS = 300
+
+
+@dataclass
+class UserDevices:
+    expo_tokens: List[str] = field(default_factory=list)
+    webpush_subs: List[dict] = field(default_factory=list)  # pywebpush subscription_info
+
+    @property
+    def empty(self) -> bool:
+        return not self.expo_tokens and not self.webpush_subs
+
+
+class DeviceDirectory:
+    """
+    user_id -> enabled devices, grouped by provider and ready to send to.
+
+    Users missing from the cache are loaded together in one query, so a
+    delivery batch costs at most one round trip however many users it covers.
+    """
+
+    def __init__(self) -> None:
+        self._by_user: Dict[str, UserDevices] = {}
+        self._loaded_at: Dict[str, float] = {}
+
+    def invalidate(self, user_id: str | None = None) -> None:
+        if user_id is None:
+            self._by_user.clear()
+            self._loaded_at.clear()
+        else:
+            self._by_user.pop(user_id, None)
+            self._loaded_at.pop(user_id, None)
+
+    async def for_users(self, session: AsyncSession, user_ids: Iterable[str]) -> Dict[str, UserDevices]:
+        now = time.monotonic()
+        wanted = set(user_ids)
+        missing = [
+            u for u in wanted
+            if u not in self._by_user or now - self._loaded_at[u] > DEVICE_CACHE_SECONDS
+        ]
+
+        if missing:
+            loaded: Dict[str, UserDevices] = {u: UserDevices() for u in missing}
+            for chunk in chunked(missing):
+                res = await session.execute(
+                    select(
+                        UserDevice.user_id,
+                        UserDevice.kind,
+                        UserDevice.expo_push_token,
+                        UserDevice.webpush_endpoint,
+                        UserDevice.webpush_p256dh,
+                        UserDevice.webpush_auth,
+                    )
+                    .where(UserDevice.user_id.in_(chunk))
+                    .where(UserDevice.is_enabled == True)  # noqa: E712
+                )
+                for user_id, kind, token, endpoint, p256dh, auth in res.all():
+                    devices = loaded[user_id]
+                    if kind == "expo" and token:
+                        devices.expo_tokens.append(token)
+                    elif kind == "webpush" and endpoint and p256dh and auth:
+                        devices.webpush_subs.append(
+                            {"endpoint": endpoint, "keys": {"p256dh": p256dh, "auth": auth}}
+                        )
+
+            for u, devices in loaded.items():
+                self._by_user[u] = devices
+                self._loaded_at[u] = now
+
+        return {u: self._by_user[u] for u in wanted}
+
+
+# process-wide directory used by the delivery worker
+device_directory = DeviceDirectory()
@@ -0,0 +1,80 @@
+# app/notifications/digest.py
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.api.responses import dumps
+
+# Alerts for the same user are folded into one push. Evaluation already folds
+# one tick; settings.ALERT_DIGEST_WINDOW_SECONDS > 0 also holds each digest back
+# that long so alerts from the next ticks (price-cycle bursts) are merged into
+# it by the delivery worker.
+
+# JSON budget for title + body + data: Expo rejects notifications over 4 KiB,
+# and the rest of the message (token, sound, channel, ttl) needs room too
+DIGEST_MAX_BYTES = 3 * 1024
+
+
+def _fit(title: str, body: str, data: Dict[str, Any], alerts: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Longest prefix of alerts that keeps the payload within DIGEST_MAX_BYTES.
+    """
+    size = len(dumps({"title": title, "body": body, "data": {**data, "alerts": []}}))
+    kept = 0
+    for a in alerts:
+        size += len(dumps(a)) + (1 if kept else 0)   # comma between items
+        if size > DIGEST_MAX_BYTES:
+            break
+        kept += 1
+    return alerts[:kept]
+
+
+def build_digest(alerts: List[Dict[str, Any]], total: Optional[int] = None) -> Tuple[str, str, Dict[str, Any]]:
+    """
+    alerts: one dict per triggered condition (ruleId, conditionId, ownedSiteId,
+    ownedSite, competitorSite); total: how many alerts the digest stands for
+    when some of them are no longer listed (default len(alerts)).
+    Returns (title, body, data) for one push.
+
+    Counts cover every alert; data lists as many as fit DIGEST_MAX_BYTES and
+    sets hasMore when some were left out. A single alert keeps the original
+    flat payload so existing clients still find ruleId etc. at the top level.
+    """
+    count = len(alerts) if total is None else max(total, len(alerts))
+
+    if count == 1:
+        a = alerts[0]
+        title = "Fuel alert triggered"
+        body = f"Rule triggered for site {a['ownedSite']} vs competitor {a['competitorSite']}"
+        return title, body, {**a, "type": "alert", "count": 1, "alerts": alerts}
+
+    title = f"{count} fuel alerts triggered"
+    sites = sorted({a["ownedSite"] for a in alerts})
+    competitors = sorted({a["competitorSite"] for a in alerts})
+    if len(sites) == 1 and count == len(alerts):
+        body = f"Rules triggered for site {sites[0]} vs {len(competitors)} competitor(s)"
+    elif len(sites) == 1:
+        body = f"Rules triggered for site {sites[0]}"
+    else:
+        body = f"Rules triggered across {len(sites)} of your sites"
+
+    data: Dict[str, Any] = {"type": "digest", "count": count, "hasMore": False}
+    listed = _fit(title, body, data, alerts)
+    data["hasMore"] = len(listed) < count
+    data["alerts"] = listed
+    return title, body, data
+
+
+def merge_digests(datas: List[Dict[str, Any] | None]) -> Tuple[str, str, Dict[str, Any]]:
+    """
+    Folds several queued digests for one user into one, keeping the newest
+    listed alert per condition. Alerts a digest left out still count.
+    """
+    by_condition: Dict[str, Dict[str, Any]] = {}
+    unlisted = 0
+    for data in datas:
+        listed = (data or {}).get("alerts", [])
+        unlisted += max(0, int((data or {}).get("count", len(listed))) - len(listed))
+        for a in listed:
+            by_condition[a["conditionId"]] = a
+    return build_digest(list(by_condition.values()), total=len(by_condition) + unlisted)
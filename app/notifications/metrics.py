@@ -0,0 +1,221 @@
+# app/notifications/metrics.py
+from __future__ import annotations
+
+import bisect
+import heapq
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# upper bounds in seconds; the last bucket catches everything above
+LATENCY_BUCKETS: Tuple[float, ...] = (0.5, 1, 2, 5, 10, 30, 60, 120, 300, 600, 1800, 3600, 4 * 3600)
+WORST_KEEP = 20
+TICKS_KEEP = 120
+
+# price change -> ingestion -> evaluation (outbox row) -> provider accepted
+STAGES = ("upstreamToIngest", "ingestToEvaluate", "evaluateToAccept", "endToEnd")
+
+
+class LatencyHistogram:
+    """
+    Fixed-bucket histogram plus the slowest samples seen.
+    """
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._worst: List[Tuple[float, int, Dict[str, Any]]] = []  # min-heap of the WORST_KEEP largest
+        self._seq = 0
+
+    def observe(self, seconds: float, context: Optional[Dict[str, Any]] = None) -> None:
+        seconds = max(0.0, seconds)
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.total += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+        self._seq += 1
+        item = (seconds, self._seq, context or {})
+        if len(self._worst) < WORST_KEEP:
+            heapq.heappush(self._worst, item)
+        elif seconds > self._worst[0][0]:
+            heapq.heapreplace(self._worst, item)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Upper bound of the bucket holding the q-quantile (None when empty).
+        """
+        if not self.total:
+            return None
+        rank = q * self.total
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else self.max
+        return self.max
+
+    def state(self) -> Dict[str, Any]:
+        """
+        Raw JSON-able state, for merging histograms of several workers.
+        """
+        return {
+            "counts": list(self.counts),
+            "total": self.total,
+            "sum": self.sum,
+            "max": self.max,
+            "worst": [[s, ctx] for s, _, ctx in self._worst],
+        }
+
+    def merge_state(self, state: Dict[str, Any]) -> None:
+        for i, n in enumerate(state.get("counts", [])[: len(self.counts)]):
+            self.counts[i] += int(n)
+        self.total += int(state.get("total", 0))
+        self.sum += float(state.get("sum", 0.0))
+        self.max = max(self.max, float(state.get("max", 0.0)))
+        for seconds, ctx in state.get("worst", []):
+            self._seq += 1
+            item = (float(seconds), self._seq, ctx)
+            if len(self._worst) < WORST_KEEP:
+                heapq.heappush(self._worst, item)
+            elif item[0] > self._worst[0][0]:
+                heapq.heapreplace(self._worst, item)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.total,
+            "meanSeconds": round(self.sum / self.total, 3) if self.total else None,
+            "p50Seconds": self.quantile(0.5),
+            "p95Seconds": self.quantile(0.95),
+            "p99Seconds": self.quantile(0.99),
+            "maxSeconds": round(self.max, 3),
+            "buckets": [
+                {"le": le, "count": n}
+                for le, n in zip(list(LATENCY_BUCKETS) + ["+Inf"], self.counts)
+            ],
+            "worst": [
+                {"seconds": round(s, 3), **ctx}
+                for s, _, ctx in sorted(self._worst, key=lambda x: -x[0])
+            ],
+        }
+
+
+def _row(stats: Any) -> Dict[str, Any]:
+    d = asdict(stats)
+    d["at"] = stats.at.isoformat()
+    return d
+
+
+@dataclass
+class TickStats:
+    at: datetime
+    evaluated: int = 0
+    triggered: int = 0
+    suppressed: int = 0   # still triggered, inside cooldown
+    queued: int = 0       # outbox rows (digests) written
+
+
+@dataclass
+class DeliveryStats:
+    at: datetime
+    claimed: int = 0
+    sent: int = 0
+    failed: int = 0
+    skipped: int = 0
+
+
+@dataclass
+class AlertMetrics:
+    """
+    Process-local alert pipeline metrics. Each sharded worker keeps its own
+    and publishes state() with its heartbeat; merged() folds them together.
+    """
+    stages: Dict[str, LatencyHistogram] = field(default_factory=lambda: {s: LatencyHistogram() for s in STAGES})
+    ticks: Deque[TickStats] = field(default_factory=lambda: deque(maxlen=TICKS_KEEP))
+    deliveries: Deque[DeliveryStats] = field(default_factory=lambda: deque(maxlen=TICKS_KEEP))
+    totals: Dict[str, int] = field(default_factory=lambda: {
+        "evaluated": 0, "triggered": 0, "suppressed": 0, "queued": 0,
+        "sent": 0, "failed": 0, "skipped": 0,
+    })
+
+    def record_tick(self, tick: TickStats) -> None:
+        self.ticks.append(tick)
+        for k in ("evaluated", "triggered", "suppressed", "queued"):
+            self.totals[k] += getattr(tick, k)
+
+    def record_delivery(self, stats: DeliveryStats) -> None:
+        self.deliveries.append(stats)
+        for k in ("sent", "failed", "skipped"):
+            self.totals[k] += getattr(stats, k)
+
+    def record_accepted(
+        self,
+        *,
+        outbox_id: str,
+        user_id: str,
+        price_at: Optional[datetime],
+        ingested_at: Optional[datetime],
+        evaluated_at: datetime,
+        accepted_at: datetime,
+    ) -> None:
+        """
+        One delivered outbox row. Price stamps are only present for rows
+        caused by a price change (not cooldown re-notifies).
+        """
+        ctx = {"outboxId": outbox_id, "userId": user_id}
+
+        def _obs(stage: str, start: Optional[datetime], end: Optional[datetime]) -> None:
+            if start is not None and end is not None:
+                self.stages[stage].observe((end - start).total_seconds(), ctx)
+
+        _obs("upstreamToIngest", price_at, ingested_at)
+        _obs("ingestToEvaluate", ingested_at, evaluated_at)
+        _obs("evaluateToAccept", evaluated_at, accepted_at)
+        _obs("endToEnd", price_at, accepted_at)
+
+    def state(self) -> Dict[str, Any]:
+        """
+        JSON-able snapshot (stored in the worker's alert_workers row).
+        """
+        return {
+            "stages": {name: h.state() for name, h in self.stages.items()},
+            "totals": dict(self.totals),
+            "ticks": [_row(t) for t in self.ticks],
+            "deliveries": [_row(d) for d in self.deliveries],
+        }
+
+    @classmethod
+    def merged(cls, states: List[Dict[str, Any]]) -> "AlertMetrics":
+        """
+        One view over several workers' state(): histograms and totals add up,
+        ticks / deliveries interleave by time (newest TICKS_KEEP kept).
+        """
+        out = cls()
+        ticks: List[TickStats] = []
+        deliveries: List[DeliveryStats] = []
+        for st in states:
+            for name, h in st.get("stages", {}).items():
+                if name in out.stages:
+                    out.stages[name].merge_state(h)
+            for k, n in st.get("totals", {}).items():
+                out.totals[k] = out.totals.get(k, 0) + int(n)
+            ticks += [TickStats(**{**t, "at": datetime.fromisoformat(t["at"])}) for t in st.get("ticks", [])]
+            deliveries += [DeliveryStats(**{**d, "at": datetime.fromisoformat(d["at"])}) for d in st.get("deliveries", [])]
+        out.ticks.extend(sorted(ticks, key=lambda t: t.at))
+        out.deliveries.extend(sorted(deliveries, key=lambda d: d.at))
+        return out
+
+    def to_dict(self, *, ticks: int = 20) -> Dict[str, Any]:
+        return {
+            "stages": {name: h.to_dict() for name, h in self.stages.items()},
+            "totals": dict(self.totals),
+            "ticks": [_row(t) for t in list(self.ticks)[-ticks:]],
+            "deliveries": [_row(d) for d in list(self.deliveries)[-ticks:]],
+        }
+
+
+# process-wide metrics written by the scheduler and delivery worker
+alert_metrics = AlertMetrics()
@@ -0,0 +1,208 @@
+# app/notifications/partitions.py
+from __future__ import annotations
+
+import asyncio
+import math
+import zlib
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional, Set
+
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.settings import settings
+from app.db.models_notifications import AlertPartitionLease, AlertWorker
+from app.db.session import SessionLocal
+from app.notifications.metrics import alert_metrics
+
+LEASE_SECONDS = 30         # a dead worker's partitions are taken over after this
+RENEW_SECONDS = 10         # well inside the lease so a slow tick doesn't lose it
+
+
+def partition_of(user_id: str, partitions: Optional[int] = None) -> int:
+    """
+    Stable across processes (unlike hash(), which is salted per interpreter).
+    """
+    return zlib.crc32(user_id.encode()) % (partitions or settings.ALERT_PARTITIONS)
+
+
+class PartitionLeases:
+    """
+    This process's share of the alert partitions.
+
+    Every worker heartbeats, renews its own leases, takes free or expired
+    ones up to a fair share (partitions / live workers) and hands back any surplus, so
+    partitions spread out as workers join and are picked up when one dies.
+    """
+
+    def __init__(
+        self,
+        worker_id: str,
+        partitions: Optional[int] = None,
+        on_gained: Optional[Callable[[Set[int]], None]] = None,
+    ) -> None:
+        self.worker_id = worker_id
+        self.partitions = partitions or settings.ALERT_PARTITIONS
+        self.on_gained = on_gained
+        self._epochs: Dict[int, int] = {}  # partition -> epoch we acquired it at
+
+    @property
+    def owned(self) -> Set[int]:
+        return set(self._epochs)
+
+    async def _ensure_rows(self, session: AsyncSession) -> None:
+        stmt = sqlite_insert(AlertPartitionLease).values(
+            [{"partition": p, "epoch": 0} for p in range(self.partitions)]
+        )
+        await session.execute(stmt.on_conflict_do_nothing(index_elements=["partition"]))
+
+    async def renew_once(self, session: AsyncSession) -> Set[int]:
+        """
+        One renew/rebalance round. Returns newly acquired partitions.
+        """
+        now = datetime.utcnow()
+        expires = now + timedelta(seconds=LEASE_SECONDS)
+        await self._ensure_rows(session)
+
+        # the heartbeat also publishes this worker's metrics (/admin/alerts/metrics)
+        metrics = alert_metrics.state()
+        hb = sqlite_insert(AlertWorker).values(worker_id=self.worker_id, heartbeat_at=now, metrics=metrics)
+        await session.execute(
+            hb.on_conflict_do_update(index_elements=["worker_id"], set_={"heartbeat_at": now, "metrics": metrics})
+        )
+        live = set(
+            (
+                await session.execute(
+                    select(AlertWorker.worker_id)
+                    .where(AlertWorker.heartbeat_at > now - timedelta(seconds=LEASE_SECONDS))
+                )
+            ).scalars().all()
+        )
+        # forget workers that have been gone for a while
+        await session.execute(
+            delete(AlertWorker).where(AlertWorker.heartbeat_at < now - timedelta(seconds=LEASE_SECONDS * 10))
+        )
+
+        leases = (
+            await session.execute(
+                select(AlertPartitionLease).where(AlertPartitionLease.partition < self.partitions)
+            )
+        ).scalars().all()
+
+        # keep only leases still held at the epoch we acquired them with
+        mine: Dict[int, int] = {}
+        for lease in leases:
+            if lease.owner == self.worker_id and self._epochs.get(lease.partition) == lease.epoch:
+                mine[lease.partition] = lease.epoch
+
+        share = math.ceil(self.partitions / len(live))
+
+        # hand back surplus so a newly started worker gets its share
+        for p in sorted(mine)[share:]:
+            await session.execute(
+                update(AlertPartitionLease)
+                .where(AlertPartitionLease.partition == p, AlertPartitionLease.owner == self.worker_id)
+                .values(owner=None, expires_at=None)
+            )
+            del mine[p]
+
+        if mine:
+            await session.execute(
+                update(AlertPartitionLease)
+                .where(AlertPartitionLease.partition.in_(list(mine)))
+                .where(AlertPartitionLease.owner == self.worker_id)
+                .values(expires_at=expires)
+            )
+
+        gained: Set[int] = set()
+        free = [
+            l.partition for l in leases
+            if l.partition not in mine and (l.owner is None or l.expires_at is None or l.expires_at <= now)
+        ]
+        for p in free:
+            if len(mine) >= share:
+                break
+            # conditional takeover: only one worker can win a given epoch
+            res = await session.execute(
+                update(AlertPartitionLease)
+                .where(AlertPartitionLease.partition == p)
+                .where(
+                    or_(
+                        AlertPartitionLease.owner.is_(None),
+                        AlertPartitionLease.expires_at.is_(None),
+                        AlertPartitionLease.expires_at <= now,
+                    )
+                )
+                .values(owner=self.worker_id, epoch=AlertPartitionLease.epoch + 1, expires_at=expires)
+            )
+            if res.rowcount == 1:
+                epoch = (
+                    await session.execute(
+                        select(AlertPartitionLease.epoch).where(AlertPartitionLease.partition == p)
+                    )
+                ).scalar_one()
+                mine[p] = epoch
+                gained.add(p)
+
+        await session.commit()
+        self._epochs = mine
+        return gained
+
+    async def verify(self, session: AsyncSession, partitions: Optional[Set[int]] = None) -> bool:
+        """
+        Fencing check, run inside the caller's write transaction right before
+        commit: true only if every given (default: owned) partition is still
+        ours at the epoch we acquired it and the lease hasn't run out.
+        """
+        wanted = set(self._epochs) if partitions is None else set(partitions)
+        if not wanted:
+            return True
+        if not wanted <= set(self._epochs):
+            return False
+
+        now = datetime.utcnow()
+        held = (
+            await session.execute(
+                select(AlertPartitionLease.partition)
+                .where(AlertPartitionLease.owner == self.worker_id)
+                .where(AlertPartitionLease.expires_at > now)
+                .where(
+                    or_(*[
+                        and_(AlertPartitionLease.partition == p, AlertPartitionLease.epoch == self._epochs[p])
+                        for p in wanted
+                    ])
+                )
+            )
+        ).scalars().all()
+        ok = set(held) == wanted
+        if not ok:
+            for p in wanted - set(held):
+                self._epochs.pop(p, None)
+        return ok
+
+    async def release(self) -> None:
+        async with SessionLocal() as session:
+            await session.execute(
+                update(AlertPartitionLease)
+                .where(AlertPartitionLease.owner == self.worker_id)
+                .values(owner=None, expires_at=None)
+            )
+            await session.execute(delete(AlertWorker).where(AlertWorker.worker_id == self.worker_id))
+            await session.commit()
+        self._epochs = {}
+
+    async def run(self) -> None:
+        """
+        Renews forever; newly acquired partitions are reported via on_gained.
+        """
+        while True:
+            try:
+                async with SessionLocal() as session:
+                    gained = await self.renew_once(session)
+                if gained and self.on_gained:
+                    self.on_gained(gained)
+            except Exception:
+                # an unrenewed lease simply expires; keep trying
+                pass
+            await asyncio.sleep(RENEW_SECONDS)
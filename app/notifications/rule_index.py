@@ -0,0 +1,300 @@
+# app/notifications/rule_index.py
+from __future__ import annotations
+
+from array import array
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.chunks import chunked
+from app.db.models_rules import PricingRule, PricingRuleCondition as RuleCondition
+from app.db.models.stations import UserOwnedSite as OwnedSite
+from app.notifications.partitions import partition_of
+
+PriceKey = Tuple[int, int]  # (site_id, fuel_id)
+
+# ----------------------------
+# Compiled condition form
+# ----------------------------
+OP_GT = 0
+OP_GTE = 1
+OP_LT = 2
+OP_LTE = 3
+
+FLAG_ABS = 1       # compare |diff|
+FLAG_INVALID = 2   # unknown comparator: never triggers
+FLAG_DEAD = 4      # row of an edited/deleted rule, dropped on the next compaction
+
+# comparator -> (op, flags)
+_OPS: Dict[str, Tuple[int, int]] = {
+    "GT": (OP_GT, 0),
+    "GTE": (OP_GTE, 0),
+    "LT": (OP_LT, 0),
+    "LTE": (OP_LTE, 0),
+    "ABS_GT": (OP_GT, FLAG_ABS),
+    "ABS_GTE": (OP_GTE, FLAG_ABS),
+}
+
+
+def compile_condition(direction: str, comparator: str, threshold_cents: int) -> Tuple[int, int, int, int]:
+    """
+    (op, sign, threshold, flags) for one condition.
+
+    sign is +1 for COMPETITOR_MINUS_OWN and -1 for OWN_MINUS_COMPETITOR,
+    so diff = sign * (competitor - own).
+    """
+    op, flags = _OPS.get(comparator, (OP_GT, FLAG_INVALID))
+    sign = 1 if direction == "COMPETITOR_MINUS_OWN" else -1
+    return op, sign, int(threshold_cents), flags
+
+
+def evaluate_compiled(
+    own: List[Optional[int]],
+    comp: List[Optional[int]],
+    signs: Iterable[int],
+    ops: Iterable[int],
+    thresholds: Iterable[int],
+    flags: Iterable[int],
+) -> List[bool]:
+    """
+    Triggered flag per compiled condition over parallel arrays.
+    A missing price never triggers.
+    """
+    out: List[bool] = []
+    for o, c, s, op, t, f in zip(own, comp, signs, ops, thresholds, flags):
+        if o is None or c is None or f & (FLAG_INVALID | FLAG_DEAD):
+            out.append(False)
+            continue
+        d = s * (c - o)
+        if f & FLAG_ABS:
+            d = -d if d < 0 else d
+        if op == OP_GT:
+            out.append(d > t)
+        elif op == OP_GTE:
+            out.append(d >= t)
+        elif op == OP_LT:
+            out.append(d < t)
+        else:
+            out.append(d <= t)
+    return out
+
+
+class RuleIndex:
+    """
+    Compiled table of enabled rule conditions, one row per condition in
+    parallel arrays, plus reverse indexes:
+    (site_id, fuel_id) -> condition ids that read that price, rule -> rows.
+
+    invalidate() forces a full rebuild (one query); invalidate_rules() only
+    recompiles the given rules on the next ensure(). Rule handlers call the
+    latter after create/patch/delete.
+    """
+
+    def __init__(self) -> None:
+        self._clear()
+        self._stale = True
+        self._invalidations = 0
+        self._dirty_rules: Set[str] = set()
+
+    def _clear(self) -> None:
+        # row data
+        self.cond_ids: List[str] = []
+        self.rule_ids: List[str] = []
+        self.user_ids: List[str] = []
+        self.owned_ids: List[str] = []
+        self.own_site = array("q")
+        self.own_fuel = array("q")
+        self.comp_site = array("q")
+        self.comp_fuel = array("q")
+        self.ops = array("b")
+        self.signs = array("b")
+        self.thresholds = array("q")
+        self.flags = array("B")
+        self.parts = array("H")   # user partition (app.notifications.partitions)
+
+        self._pos: Dict[str, int] = {}
+        self._rows_by_rule: Dict[str, List[int]] = {}
+        self._by_key: Dict[PriceKey, Set[str]] = {}
+        self._dead = 0
+
+    @property
+    def is_stale(self) -> bool:
+        return self._stale or bool(self._dirty_rules)
+
+    def invalidate(self) -> None:
+        self._stale = True
+        self._invalidations += 1
+
+    def invalidate_rules(self, rule_ids: Iterable[str]) -> None:
+        self._dirty_rules.update(rule_ids)
+
+    async def ensure(self, session: AsyncSession) -> None:
+        if self._stale:
+            await self.rebuild(session)
+        elif self._dirty_rules:
+            dirty = set(self._dirty_rules)
+            self._dirty_rules.difference_update(dirty)
+            await self._recompile_rules(session, dirty)
+
+    async def _load(self, session: AsyncSession, rule_ids: Optional[List[str]] = None) -> List[tuple]:
+        stmt = (
+            select(
+                RuleCondition.id,
+                RuleCondition.rule_id,
+                OwnedSite.user_id,
+                OwnedSite.id,
+                OwnedSite.site_id,
+                RuleCondition.own_fuel_id,
+                PricingRule.competitor_site_id,
+                RuleCondition.competitor_fuel_id,
+                RuleCondition.direction,
+                RuleCondition.comparator,
+                RuleCondition.threshold_cents,
+            )
+            .join(PricingRule, PricingRule.id == RuleCondition.rule_id)
+            .join(OwnedSite, OwnedSite.id == PricingRule.owned_site_id)
+            .where(PricingRule.is_enabled == True)  # noqa: E712
+        )
+        if rule_ids is None:
+            return list((await session.execute(stmt)).all())
+
+        rows: List[tuple] = []
+        for chunk in chunked(rule_ids):
+            res = await session.execute(stmt.where(RuleCondition.rule_id.in_(chunk)))
+            rows.extend(res.all())
+        return rows
+
+    def _append(self, row: tuple) -> None:
+        cid, rid, user_id, owned_id, own_site, own_fuel, comp_site, comp_fuel, direction, comparator, threshold = row
+        self._push(
+            cid, rid, user_id, owned_id, int(own_site), int(own_fuel), int(comp_site), int(comp_fuel),
+            *compile_condition(direction, comparator, threshold),
+            partition_of(user_id),
+        )
+
+    def _push(
+        self, cid: str, rid: str, user_id: str, owned_id: str,
+        own_site: int, own_fuel: int, comp_site: int, comp_fuel: int,
+        op: int, sign: int, threshold: int, flags: int, part: int,
+    ) -> None:
+        i = len(self.cond_ids)
+        self.cond_ids.append(cid)
+        self.rule_ids.append(rid)
+        self.user_ids.append(user_id)
+        self.owned_ids.append(owned_id)
+        self.own_site.append(own_site)
+        self.own_fuel.append(own_fuel)
+        self.comp_site.append(comp_site)
+        self.comp_fuel.append(comp_fuel)
+        self.ops.append(op)
+        self.signs.append(sign)
+        self.thresholds.append(threshold)
+        self.flags.append(flags)
+        self.parts.append(part)
+
+        self._pos[cid] = i
+        self._rows_by_rule.setdefault(rid, []).append(i)
+        self._by_key.setdefault((own_site, own_fuel), set()).add(cid)
+        self._by_key.setdefault((comp_site, comp_fuel), set()).add(cid)
+
+    def _drop_rule(self, rule_id: str) -> None:
+        for i in self._rows_by_rule.pop(rule_id, []):
+            cid = self.cond_ids[i]
+            self._pos.pop(cid, None)
+            for key in ((self.own_site[i], self.own_fuel[i]), (self.comp_site[i], self.comp_fuel[i])):
+                cids = self._by_key.get(key)
+                if cids is not None:
+                    cids.discard(cid)
+                    if not cids:
+                        del self._by_key[key]
+            self.flags[i] |= FLAG_DEAD
+            self._dead += 1
+
+    async def rebuild(self, session: AsyncSession) -> None:
+        seen = self._invalidations
+        dirty = set(self._dirty_rules)
+        rows = await self._load(session)
+
+        # no awaits from here on
+        self._clear()
+        for row in rows:
+            self._append(row)
+        self._dirty_rules.difference_update(dirty)
+        # an invalidate() during the load leaves it stale for the next ensure()
+        self._stale = self._invalidations != seen
+
+    async def _recompile_rules(self, session: AsyncSession, rule_ids: Set[str]) -> None:
+        rows = await self._load(session, sorted(rule_ids))
+        for rid in rule_ids:
+            self._drop_rule(rid)
+        for row in rows:
+            self._append(row)
+
+        # tombstones only cost a skipped row; compact once they dominate
+        if self._dead > max(64, len(self.cond_ids) // 4):
+            self._compact()
+
+    def _compact(self) -> None:
+        old = (
+            self.cond_ids, self.rule_ids, self.user_ids, self.owned_ids,
+            self.own_site, self.own_fuel, self.comp_site, self.comp_fuel,
+            self.ops, self.signs, self.thresholds, self.flags, self.parts,
+        )
+        live = [i for i in range(len(self.cond_ids)) if not self.flags[i] & FLAG_DEAD]
+        self._clear()
+        for i in live:
+            self._push(*(col[i] for col in old))
+
+    # ----------------------------
+    # Lookups
+    # ----------------------------
+    def rows(
+        self,
+        condition_ids: Optional[Iterable[str]] = None,
+        partitions: Optional[Set[int]] = None,
+    ) -> List[int]:
+        """
+        Live row numbers, for all conditions or only the given ones,
+        optionally restricted to users in the given partitions.
+        """
+        if condition_ids is None:
+            rows = [i for i in range(len(self.cond_ids)) if not self.flags[i] & FLAG_DEAD]
+        else:
+            rows = sorted(self._pos[cid] for cid in condition_ids if cid in self._pos)
+        if partitions is not None:
+            rows = [i for i in rows if self.parts[i] in partitions]
+        return rows
+
+    def evaluate(self, rows: List[int], prices: Dict[PriceKey, int]) -> List[bool]:
+        return evaluate_compiled(
+            own=[prices.get((self.own_site[i], self.own_fuel[i])) for i in rows],
+            comp=[prices.get((self.comp_site[i], self.comp_fuel[i])) for i in rows],
+            signs=[self.signs[i] for i in rows],
+            ops=[self.ops[i] for i in rows],
+            thresholds=[self.thresholds[i] for i in rows],
+            flags=[self.flags[i] for i in rows],
+        )
+
+    def price_keys(self, rows: Iterable[int]) -> Set[PriceKey]:
+        keys: Set[PriceKey] = set()
+        for i in rows:
+            keys.add((self.own_site[i], self.own_fuel[i]))
+            keys.add((self.comp_site[i], self.comp_fuel[i]))
+        return keys
+
+    def conditions_for_keys(self, keys: Iterable[PriceKey]) -> Set[str]:
+        out: Set[str] = set()
+        for key in keys:
+            out |= self._by_key.get(key, set())
+        return out
+
+    def conditions_for_rules(self, rule_ids: Iterable[str]) -> Set[str]:
+        out: Set[str] = set()
+        for rid in rule_ids:
+            out.update(self.cond_ids[i] for i in self._rows_by_rule.get(rid, []))
+        return out
+
+
+# process-wide index used by the alert scheduler
+rule_index = RuleIndex()
@@ -0,0 +1,220 @@
+# app/notifications/state_cache.py
+from __future__ import annotations
+
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.chunks import chunked
+from app.db.models_notifications import RuleAlertState
+from app.db.session import SessionLocal
+from app.notifications.partitions import PartitionLeases, partition_of
+
+_WRITE_CHUNK = 100  # 8 params per row
+
+STATE_FLUSH_SECONDS = 15
+
+
+@dataclass
+class AlertState:
+    """
+    In-memory copy of a rule_alert_state row.
+    """
+    user_id: str
+    rule_id: str
+    condition_id: str
+    is_currently_triggered: bool = False
+    last_triggered_at: Optional[datetime] = None
+    last_notified_at: Optional[datetime] = None
+    last_diff_raw: Optional[int] = None
+    id: Optional[str] = None
+
+
+async def load_states(session: AsyncSession, condition_ids: Optional[List[str]] = None) -> Dict[str, AlertState]:
+    """
+    Existing alert states keyed by condition id: all of them, or only
+    condition_ids (one query per chunk).
+    """
+    stmt = select(
+        RuleAlertState.id,
+        RuleAlertState.user_id,
+        RuleAlertState.rule_id,
+        RuleAlertState.condition_id,
+        RuleAlertState.is_currently_triggered,
+        RuleAlertState.last_triggered_at,
+        RuleAlertState.last_notified_at,
+        RuleAlertState.last_diff_raw,
+    )
+    if condition_ids is None:
+        chunks = [stmt]
+    else:
+        chunks = [stmt.where(RuleAlertState.condition_id.in_(ids)) for ids in chunked(condition_ids)]
+
+    out: Dict[str, AlertState] = {}
+    for chunk in chunks:
+        res = await session.execute(chunk)
+        for sid, uid, rid, cid, trig, t_at, n_at, diff in res.all():
+            out[cid] = AlertState(
+                id=sid,
+                user_id=uid,
+                rule_id=rid,
+                condition_id=cid,
+                is_currently_triggered=bool(trig),
+                last_triggered_at=t_at,
+                last_notified_at=n_at,
+                last_diff_raw=diff,
+            )
+    return out
+
+
+async def write_states(session: AsyncSession, states: List[AlertState]) -> None:
+    """
+    Batched upsert on the (rule_id, condition_id) unique index.
+    New states get their id assigned here.
+    """
+    if not states:
+        return
+
+    for st in states:
+        if st.id is None:
+            st.id = str(uuid.uuid4())
+
+    rows = [
+        {
+            "id": st.id,
+            "user_id": st.user_id,
+            "rule_id": st.rule_id,
+            "condition_id": st.condition_id,
+            "is_currently_triggered": st.is_currently_triggered,
+            "last_triggered_at": st.last_triggered_at,
+            "last_notified_at": st.last_notified_at,
+            "last_diff_raw": st.last_diff_raw,
+        }
+        for st in states
+    ]
+
+    for i in range(0, len(rows), _WRITE_CHUNK):
+        stmt = sqlite_insert(RuleAlertState).values(rows[i : i + _WRITE_CHUNK])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[RuleAlertState.rule_id, RuleAlertState.condition_id],
+            set_={
+                "user_id": stmt.excluded.user_id,
+                "is_currently_triggered": stmt.excluded.is_currently_triggered,
+                "last_triggered_at": stmt.excluded.last_triggered_at,
+                "last_notified_at": stmt.excluded.last_notified_at,
+                "last_diff_raw": stmt.excluded.last_diff_raw,
+            },
+        )
+        await session.execute(stmt)
+
+
+class AlertStateCache:
+    """
+    Authoritative alert state for this process, written behind to rule_alert_state.
+
+    The scheduler reads states from here (DB only on a miss) and hands back
+    what changed: states that produced a notification are already committed
+    with their outbox rows, everything else is marked dirty and flushed in
+    batches from the scheduler loop and on shutdown.
+    """
+
+    def __init__(self) -> None:
+        self._states: Dict[str, AlertState] = {}
+        self._absent: Set[str] = set()   # known to have no row yet
+        self._dirty: Set[str] = set()
+        self._preloaded = False
+
+    @property
+    def dirty_count(self) -> int:
+        return len(self._dirty)
+
+    async def preload(self, session: AsyncSession) -> None:
+        loaded = await load_states(session)
+        for cid, st in loaded.items():
+            if cid not in self._dirty:
+                self._states[cid] = st
+        self._preloaded = True
+
+    async def get_many(self, session: AsyncSession, condition_ids: Iterable[str]) -> Dict[str, AlertState]:
+        cids = list(condition_ids)
+        if not self._preloaded:
+            missing = [c for c in cids if c not in self._states and c not in self._absent]
+            if missing:
+                loaded = await load_states(session, missing)
+                self._states.update(loaded)
+                self._absent.update(c for c in missing if c not in loaded)
+        return {c: self._states[c] for c in cids if c in self._states}
+
+    def apply(self, states: Iterable[AlertState], *, persisted: bool) -> None:
+        """
+        Store states after the tick's commit; persisted=False queues them for the next flush.
+        """
+        for st in states:
+            cid = st.condition_id
+            self._states[cid] = st
+            self._absent.discard(cid)
+            if persisted:
+                self._dirty.discard(cid)
+            else:
+                self._dirty.add(cid)
+
+    def forget_partitions(self, partitions: Set[int]) -> None:
+        """
+        Drop states of users in partitions another worker may have updated;
+        they are re-read from the DB on next use.
+        """
+        for cid in [c for c, st in self._states.items() if partition_of(st.user_id) in partitions]:
+            del self._states[cid]
+            self._dirty.discard(cid)
+        self._absent.clear()
+        self._preloaded = False
+
+    async def flush(self, session: AsyncSession, leases: Optional[PartitionLeases] = None) -> int:
+        """
+        Writes dirty states in batches; returns how many were written.
+        """
+        if not self._dirty:
+            return 0
+
+        dirty = [self._states[c] for c in self._dirty if c in self._states]
+        partitions = None
+        if leases is not None:
+            owned = leases.owned
+            dirty = [st for st in dirty if partition_of(st.user_id) in owned]
+            partitions = {partition_of(st.user_id) for st in dirty}
+
+        await write_states(session, dirty)
+        # fencing: a partition that moved belongs to its new owner now
+        if leases is not None and dirty and not await leases.verify(session, partitions):
+            await session.rollback()
+            self.forget_partitions(partitions - leases.owned)
+            return 0
+        await session.commit()
+
+        # a state replaced by a tick while we were writing stays dirty
+        self._dirty.difference_update(st.condition_id for st in dirty if self._states.get(st.condition_id) is st)
+        if leases is not None:
+            # unowned dirty states were someone else's to write
+            owned = leases.owned
+            self._dirty = {
+                c for c in self._dirty
+                if c in self._states and partition_of(self._states[c].user_id) in owned
+            }
+        return len(dirty)
+
+    def clear(self) -> None:
+        self.__init__()
+
+
+# process-wide cache used by the alert scheduler
+state_cache = AlertStateCache()
+
+
+async def flush_alert_state(leases: Optional[PartitionLeases] = None) -> int:
+    async with SessionLocal() as session:
+        return await state_cache.flush(session, leases)
@@ -0,0 +1,149 @@
+# app/notifications/worker.py
+"""
+Sharded alert worker.
+
+    python -m app.notifications.worker --processes 4
+
+Each process leases a share of the alert partitions (app.notifications.partitions),
+evaluates rules and delivers pushes only for users in those partitions, and
+picks up partitions of workers that stop renewing. Run with
+ALERT_EXTERNAL_WORKERS=true so the API process leaves this work to them.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import uuid
+from sqlalchemy import func, select, update
+
+from app.db.init_db import init_db
+from app.db.models.prices import PriceHistory
+from app.db.models_notifications import NotificationOutbox
+from app.db.models_rules import PricingRuleChange
+from app.db.session import SessionLocal, engine
+from app.notifications import alert_scheduler
+from app.notifications.delivery_worker import start_delivery_worker
+from app.notifications.partitions import PartitionLeases, partition_of
+from app.notifications.state_cache import flush_alert_state
+from app.services.push_service import expo_client
+
+CHANGE_POLL_SECONDS = 5        # ingestion / rule edits happen in the API process
+
+
+async def _backfill_outbox_partitions() -> None:
+    # rows queued before partitioning existed
+    async with SessionLocal() as session:
+        res = await session.execute(
+            select(NotificationOutbox.id, NotificationOutbox.user_id)
+            .where(NotificationOutbox.partition.is_(None))
+            .where(NotificationOutbox.status == "pending")
+        )
+        for oid, user_id in res.all():
+            await session.execute(
+                update(NotificationOutbox).where(NotificationOutbox.id == oid).values(partition=partition_of(user_id))
+            )
+        await session.commit()
+
+
+async def _watch_changes() -> None:
+    """
+    Feeds the scheduler from the database instead of in-process events, by
+    id over append-only logs (ids only grow, unlike timestamps):
+    fpd_price_changes for price moves (unavailable flips included) and
+    pricing_rule_changes for rule / owned-site writes (deletes included).
+    """
+    async with SessionLocal() as session:
+        price_mark: int = (await session.execute(select(func.max(PriceHistory.id)))).scalar() or 0
+        rule_mark: int = (await session.execute(select(func.max(PricingRuleChange.id)))).scalar() or 0
+
+    while True:
+        await asyncio.sleep(CHANGE_POLL_SECONDS)
+        try:
+            async with SessionLocal() as session:
+                prices = (
+                    await session.execute(
+                        select(PriceHistory.id, PriceHistory.site_id, PriceHistory.fuel_id)
+                        .where(PriceHistory.id > price_mark)
+                    )
+                ).all()
+                rules = (
+                    await session.execute(
+                        select(PricingRuleChange.id, PricingRuleChange.rule_id)
+                        .where(PricingRuleChange.id > rule_mark)
+                    )
+                ).all()
+
+            if prices:
+                price_mark = max(i for i, _, _ in prices)
+                alert_scheduler.queue_price_keys((int(sid), int(fid)) for _, sid, fid in prices)
+            if rules:
+                rule_mark = max(i for i, _ in rules)
+                alert_scheduler.rules_changed({rid for _, rid in rules})
+        except Exception:
+            # keep watcher alive
+            pass
+
+
+async def _prepare() -> None:
+    # once, before the workers start, so they don't race on schema changes
+    await init_db()
+    await _backfill_outbox_partitions()
+    # connections belong to this event loop; each worker opens its own
+    await engine.dispose()
+
+
+async def run_worker(worker_id: str) -> None:
+    leases = PartitionLeases(worker_id, on_gained=alert_scheduler.partitions_gained)
+    async with SessionLocal() as session:
+        await leases.renew_once(session)
+
+    tasks = [
+        asyncio.create_task(leases.run()),
+        asyncio.create_task(_watch_changes()),
+        asyncio.create_task(alert_scheduler.start_alert_scheduler(leases)),
+        asyncio.create_task(start_delivery_worker(leases)),
+        asyncio.create_task(expo_client.run_receipt_poller()),
+    ]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for t in tasks:
+            t.cancel()
+        await flush_alert_state(leases)
+        # hand partitions over right away instead of waiting for the lease to lapse
+        await leases.release()
+        await expo_client.aclose()
+
+
+def _process_main(worker_id: str) -> None:
+    try:
+        asyncio.run(run_worker(worker_id))
+    except KeyboardInterrupt:
+        pass
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Sharded alert evaluation / delivery worker")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    asyncio.run(_prepare())
+
+    prefix = f"{socket.gethostname()}-{uuid.uuid4().hex[:6]}"
+    if args.processes <= 1:
+        _process_main(f"{prefix}-0")
+        return
+
+    ctx = multiprocessing.get_context("spawn")
+    procs = [ctx.Process(target=_process_main, args=(f"{prefix}-{i}",)) for i in range(args.processes)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+
+
+if __name__ == "__main__":
+    main()
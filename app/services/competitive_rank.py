@@ -0,0 +1,297 @@
+# app/services/competitive_rank.py
+from __future__ import annotations
+
+import asyncio
+import heapq
+import math
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.chunks import chunked
+from app.db.models.master import Site
+from app.db.models.prices import PriceLatest
+from app.db.models.stations import UserOwnedSite
+from app.db.models_rules import PricingRule
+from app.ingestion.events import PriceChange
+
+NEAREST_K = 10   # nearest sites added to every owned site's competitor set
+
+
+def _nearest(coords: Dict[int, Tuple[float, float]], site_id: int, k: int) -> List[int]:
+    """
+    k closest sites by equirectangular distance (fine at suburb scale).
+    """
+    here = coords.get(site_id)
+    if here is None:
+        return []
+    lat0, lng0 = here
+    kx = math.cos(math.radians(lat0))
+    return [
+        sid for _, sid in heapq.nsmallest(
+            k,
+            (
+                ((lat - lat0) ** 2 + ((lng - lng0) * kx) ** 2, sid)
+                for sid, (lat, lng) in coords.items()
+                if sid != site_id
+            ),
+        )
+    ]
+
+
+class CompetitiveRanking:
+    """
+    Precomputed rank of every owned site's price per fuel within its
+    competitor set (the site's rule competitors plus its NEAREST_K nearest sites).
+
+    A reverse index (site -> owned sites whose set includes it) limits an
+    ingested price change to the ranks it can affect; reads are dict lookups.
+    invalidate() rebuilds everything on next ensure(); invalidate_owned_sites()
+    only the competitor sets of the given owned sites.
+
+    Builds load into local state and install it without awaiting, so readers
+    never see a half-built ranking; price changes arriving mid-build are
+    replayed onto what was loaded. Prices are held only for sites some
+    group reads, each loaded in full from the DB first.
+    """
+
+    def __init__(self) -> None:
+        self._stale = True
+        self._invalidations = 0
+        self._dirty: Set[str] = set()
+        self._lock = asyncio.Lock()
+        self._buffer: Optional[List[PriceChange]] = None            # changes seen during a build
+        self._coords: Dict[int, Tuple[float, float]] = {}
+        self._groups: Dict[str, Tuple[int, Tuple[int, ...]]] = {}   # owned id -> (own site, competitors)
+        self._by_site: Dict[int, Set[str]] = {}                     # site -> owned ids reading it
+        self._prices: Dict[int, Dict[int, int]] = {}                # site -> fuel -> RAW price
+        self._ranks: Dict[str, Dict[int, Dict[str, Any]]] = {}      # owned id -> fuel -> rank entry
+
+    def invalidate(self) -> None:
+        self._stale = True
+        self._invalidations += 1
+
+    def invalidate_owned_sites(self, owned_site_ids: Iterable[str]) -> None:
+        self._dirty.update(owned_site_ids)
+
+    # ---------- reads ----------
+    def ranks_for(self, owned_site_id: str) -> List[Dict[str, Any]]:
+        return [self._ranks[owned_site_id][f] for f in sorted(self._ranks.get(owned_site_id, {}))]
+
+    # ---------- maintenance ----------
+    async def ensure(self, session: AsyncSession) -> None:
+        if not (self._stale or self._dirty):
+            return
+        # one build at a time; callers arriving meanwhile wait for it
+        async with self._lock:
+            if self._stale:
+                await self._rebuild(session)
+            elif self._dirty:
+                await self._rebuild_owned(session, sorted(self._dirty))
+
+    async def _rebuild(self, session: AsyncSession) -> None:
+        seen = self._invalidations
+        dirty = set(self._dirty)
+        self._buffer = []
+        try:
+            res = await session.execute(
+                select(Site.site_id, Site.lat, Site.lng).where(Site.lat.is_not(None), Site.lng.is_not(None))
+            )
+            coords = {int(s): (float(lat), float(lng)) for s, lat, lng in res.all()}
+            owned = (await session.execute(select(UserOwnedSite.id, UserOwnedSite.site_id))).all()
+            groups, prices = await self._load_groups(session, {str(oid): int(sid) for oid, sid in owned}, coords, set())
+            buffered = self._buffer
+        finally:
+            self._buffer = None
+
+        # no awaits from here on
+        self._coords = coords
+        self._groups = {}
+        self._by_site = {}
+        self._prices = prices
+        self._ranks = {}
+        self._replay(buffered, prices)
+        self._install(groups)
+        self._dirty.difference_update(dirty)
+        # an invalidate() during the build leaves it stale for the next ensure()
+        self._stale = self._invalidations != seen
+
+    async def _rebuild_owned(self, session: AsyncSession, owned_ids: List[str]) -> None:
+        self._buffer = []
+        try:
+            found: Dict[str, int] = {}
+            for chunk in chunked(owned_ids):
+                res = await session.execute(
+                    select(UserOwnedSite.id, UserOwnedSite.site_id)
+                    .where(UserOwnedSite.id.in_(chunk))
+                )
+                found.update((str(oid), int(sid)) for oid, sid in res.all())
+            groups, prices = await self._load_groups(session, found, self._coords, set(self._prices))
+            buffered = self._buffer
+        finally:
+            self._buffer = None
+
+        # no awaits from here on
+        self._dirty.difference_update(owned_ids)
+        released: Set[int] = set()
+        for oid in owned_ids:
+            released |= self._drop_group(oid)
+        self._replay(buffered, prices)
+        self._prices.update(prices)
+        self._install(groups)
+        for sid in released:
+            if sid not in self._by_site:
+                self._prices.pop(sid, None)
+
+    def _drop_group(self, owned_id: str) -> Set[int]:
+        """
+        Removes one group; returns the sites it read.
+        """
+        group = self._groups.pop(owned_id, None)
+        self._ranks.pop(owned_id, None)
+        if group is None:
+            return set()
+        own, comps = group
+        for sid in (own, *comps):
+            readers = self._by_site.get(sid)
+            if readers is not None:
+                readers.discard(owned_id)
+                if not readers:
+                    del self._by_site[sid]
+        return {own, *comps}
+
+    async def _load_groups(
+        self,
+        session: AsyncSession,
+        owned: Dict[str, int],
+        coords: Dict[int, Tuple[float, float]],
+        known: Set[int],
+    ) -> Tuple[Dict[str, Tuple[int, Tuple[int, ...]]], Dict[int, Dict[int, int]]]:
+        """
+        Competitor sets for `owned`, and the full current prices of the sites
+        they read that are not in `known`. Installs nothing.
+        """
+        groups: Dict[str, Tuple[int, Tuple[int, ...]]] = {}
+        if not owned:
+            return groups, {}
+        ids = sorted(owned)
+        rule_comps: Dict[str, Set[int]] = {}
+        for chunk in chunked(ids):
+            res = await session.execute(
+                select(PricingRule.owned_site_id, PricingRule.competitor_site_id)
+                .where(PricingRule.owned_site_id.in_(chunk))
+                .distinct()
+            )
+            for oid, comp in res.all():
+                rule_comps.setdefault(str(oid), set()).add(int(comp))
+
+        for oid, own in owned.items():
+            comps = (rule_comps.get(oid, set()) | set(_nearest(coords, own, NEAREST_K))) - {own}
+            groups[oid] = (own, tuple(sorted(comps)))
+
+        missing = sorted({sid for own, comps in groups.values() for sid in (own, *comps)} - known)
+        prices: Dict[int, Dict[int, int]] = {s: {} for s in missing}
+        for chunk in chunked(missing):
+            res = await session.execute(
+                select(PriceLatest.site_id, PriceLatest.fuel_id, PriceLatest.price_cents)
+                .where(PriceLatest.site_id.in_(chunk))
+                .where(PriceLatest.unavailable == False)  # noqa: E712
+            )
+            for sid, fid, cents in res.all():
+                prices[int(sid)][int(fid)] = int(cents)
+        return groups, prices
+
+    @staticmethod
+    def _replay(changes: List[PriceChange], prices: Dict[int, Dict[int, int]]) -> None:
+        # published after their commit, so newer than (or equal to) what was loaded
+        for c in changes:
+            fuels = prices.get(c.site_id)
+            if fuels is None:
+                continue
+            if c.unavailable:
+                fuels.pop(c.fuel_id, None)
+            else:
+                fuels[c.fuel_id] = int(c.price_cents)
+
+    def _install(self, groups: Dict[str, Tuple[int, Tuple[int, ...]]]) -> None:
+        """
+        Reverse index entries and ranks for built groups (their prices already loaded).
+        """
+        for oid, (own, comps) in groups.items():
+            self._groups[oid] = (own, comps)
+            for sid in (own, *comps):
+                self._by_site.setdefault(sid, set()).add(oid)
+        now = datetime.utcnow()
+        for oid, (own, _) in groups.items():
+            self._ranks[oid] = {}
+            for fid in list(self._prices.get(own, {})):
+                self._rank(oid, fid, now)
+
+    def _rank(self, owned_id: str, fuel_id: int, now: datetime) -> None:
+        own_site, comps = self._groups[owned_id]
+        ranks = self._ranks.setdefault(owned_id, {})
+        own = self._prices.get(own_site, {}).get(fuel_id)
+        if own is None:
+            ranks.pop(fuel_id, None)
+            return
+        others = [p for p in (self._prices.get(s, {}).get(fuel_id) for s in comps) if p is not None]
+        cheaper = sum(1 for p in others if p < own)
+        dearer = sum(1 for p in others if p > own)
+        ranks[fuel_id] = {
+            "fuelId": fuel_id,
+            "priceCents": own,
+            "rank": cheaper + 1,                 # 1 = cheapest (ties share a rank)
+            "of": len(others) + 1,
+            # share of priced competitors dearer than this site; 100 = cheapest outright
+            "percentile": round(100 * dearer / len(others)) if others else None,
+            "cheapestCents": min(others + [own]),
+            "updatedAt": now.isoformat(),
+        }
+
+    def apply_changes(self, changes: Iterable[PriceChange]) -> int:
+        """
+        Apply ingested price changes; returns how many ranks were recomputed.
+        """
+        changes = list(changes)
+        if self._buffer is not None:
+            self._buffer.extend(changes)   # replayed onto the build's fresh prices
+        if self._stale:
+            return 0   # next ensure() rebuilds from the DB anyway
+        now = datetime.utcnow()
+        touched: Set[Tuple[str, int]] = set()
+        for c in changes:
+            readers = self._by_site.get(c.site_id)
+            fuels = self._prices.get(c.site_id)
+            if not readers or fuels is None:
+                continue
+            if c.unavailable:
+                fuels.pop(c.fuel_id, None)
+            else:
+                fuels[c.fuel_id] = int(c.price_cents)
+            touched.update((oid, c.fuel_id) for oid in readers)
+        for oid, fid in touched:
+            if oid in self._groups:
+                self._rank(oid, fid, now)
+        return len(touched)
+
+
+# process-wide ranking kept current by the ingestion listener below
+competitive_ranking = CompetitiveRanking()
+
+
+async def on_prices_ingested(changes: List[PriceChange]) -> None:
+    """
+    Ingestion listener: move the affected ranks (built on first use).
+    """
+    if changes:
+        competitive_ranking.apply_changes(changes)
+
+
+async def on_master_synced(site_ids: List[int]) -> None:
+    """
+    Master sync listener: sites may have moved, appeared or gone, so the
+    nearest-site sets are rebuilt on next use.
+    """
+    competitive_ranking.invalidate()
@@ -0,0 +1,224 @@
+# app/services/price_movers.py
+from __future__ import annotations
+
+import heapq
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.chunks import chunked
+from app.db.models.master import Site
+from app.db.models.prices import PriceHistory
+from app.db.session import SessionLocal
+from app.ingestion.events import PriceChange
+
+WINDOWS: Dict[str, int] = {"1h": 3600, "24h": 24 * 3600}
+BUCKETS_PER_WINDOW = 60   # expiry granularity: 1 minute for 1h, 24 minutes for 24h
+MAX_MOVERS = 50           # top-k kept per group and direction
+
+PriceKey = Tuple[int, int]            # (site_id, fuel_id)
+GroupKey = Tuple[int, int, int]       # (region level, region id, fuel_id); level 0 = everywhere
+Move = Tuple[int, int, int]           # (site_id, fuel_id, delta)
+
+
+class _Window:
+    """
+    Net price movement per (site, fuel) over one sliding window.
+
+    Moves land in time buckets; whole buckets expire as the window slides
+    and their deltas are taken back out. Groups whose members moved are
+    marked dirty and get their top-k recomputed on the next read.
+    """
+
+    def __init__(self, seconds: int) -> None:
+        self.span = timedelta(seconds=seconds)
+        self.width = timedelta(seconds=seconds / BUCKETS_PER_WINDOW)
+        self.buckets: Deque[Tuple[datetime, List[Move]]] = deque()
+        self.net: Dict[PriceKey, int] = {}
+        self.members: Dict[GroupKey, Set[int]] = {}   # group -> sites with a non-zero net move
+        self.dirty: Set[GroupKey] = set()
+        self.top: Dict[GroupKey, Tuple[List[Tuple[int, int]], List[Tuple[int, int]]]] = {}
+
+    def _bump(self, site_id: int, fuel_id: int, delta: int, groups: Iterable[GroupKey]) -> None:
+        key = (site_id, fuel_id)
+        net = self.net.get(key, 0) + delta
+        if net:
+            self.net[key] = net
+        else:
+            self.net.pop(key, None)
+        for g in groups:
+            if net:
+                self.members.setdefault(g, set()).add(site_id)
+            else:
+                sites = self.members.get(g)
+                if sites is not None:
+                    sites.discard(site_id)
+                    if not sites:
+                        del self.members[g]
+            self.dirty.add(g)
+
+    def add(self, at: datetime, move: Move, groups: List[GroupKey]) -> None:
+        start = datetime.min + ((at - datetime.min) // self.width) * self.width
+        if self.buckets and self.buckets[-1][0] == start:
+            self.buckets[-1][1].append(move)
+        else:
+            self.buckets.append((start, [move]))
+        self._bump(*move, groups)
+
+    def expire(self, now: datetime, groups_of) -> None:
+        cutoff = now - self.span
+        while self.buckets and self.buckets[0][0] + self.width <= cutoff:
+            _, moves = self.buckets.popleft()
+            for site_id, fuel_id, delta in moves:
+                self._bump(site_id, fuel_id, -delta, groups_of(site_id, fuel_id))
+
+    def movers(self, group: GroupKey) -> Tuple[List[Tuple[int, int]], List[Tuple[int, int]]]:
+        """
+        ([(site, net rise)], [(site, net drop)]), largest first.
+        """
+        if group in self.dirty or group not in self.top:
+            self.dirty.discard(group)
+            fuel_id = group[2]
+            moved = [(s, self.net[(s, fuel_id)]) for s in self.members.get(group, ())]
+            rises = heapq.nlargest(MAX_MOVERS, (m for m in moved if m[1] > 0), key=lambda m: m[1])
+            drops = heapq.nsmallest(MAX_MOVERS, (m for m in moved if m[1] < 0), key=lambda m: m[1])
+            self.top[group] = (rises, drops)
+        return self.top[group]
+
+
+class PriceMovers:
+    """
+    Largest net price rises and drops per region and fuel over the last
+    hour / day, fed by ingestion change sets (warmed from price history
+    on startup). Reads touch no DB.
+    """
+
+    def __init__(self) -> None:
+        self._windows = {name: _Window(seconds) for name, seconds in WINDOWS.items()}
+        self._regions: Dict[int, Tuple[int, int, int]] = {}   # site -> (suburb, city, state)
+        self._latest: Dict[PriceKey, Tuple[int, datetime]] = {}
+
+    def _groups(self, site_id: int, fuel_id: int) -> List[GroupKey]:
+        g1, g2, g3 = self._regions.get(site_id, (0, 0, 0))
+        out = [(0, 0, fuel_id)]
+        for level, region in ((1, g1), (2, g2), (3, g3)):
+            if region:
+                out.append((level, region, fuel_id))
+        return out
+
+    async def ensure_regions(self, session: AsyncSession, site_ids: Iterable[int]) -> None:
+        missing = sorted({s for s in site_ids if s not in self._regions})
+        for chunk in chunked(missing):
+            res = await session.execute(
+                select(Site.site_id, Site.g1_suburb_id, Site.g2_city_id, Site.g3_state_id)
+                .where(Site.site_id.in_(chunk))
+            )
+            for sid, g1, g2, g3 in res.all():
+                self._regions[int(sid)] = (int(g1 or 0), int(g2 or 0), int(g3 or 0))
+        for s in missing:
+            # unknown sites only count towards the everywhere group
+            self._regions.setdefault(s, (0, 0, 0))
+
+    def needs_regions(self, changes: Iterable[PriceChange]) -> bool:
+        return any(c.site_id not in self._regions for c in changes)
+
+    def _add(self, site_id: int, fuel_id: int, old: Optional[int], new: int, at: datetime, changed_at: datetime) -> None:
+        self._latest[(site_id, fuel_id)] = (new, changed_at)
+        if old is None or new == old:
+            return
+        groups = self._groups(site_id, fuel_id)
+        for w in self._windows.values():
+            w.add(at, (site_id, fuel_id, new - old), groups)
+
+    def apply_changes(self, changes: Iterable[PriceChange]) -> None:
+        """
+        A move is a change between two available prices; timed by ingestion.
+        """
+        latest = None
+        for c in changes:
+            latest = c.ingested_at if latest is None else max(latest, c.ingested_at)
+            if c.unavailable:
+                continue
+            old = None if c.old_unavailable else c.old_price_cents
+            self._add(c.site_id, c.fuel_id, old, int(c.price_cents), c.ingested_at, c.transaction_date_utc)
+        if latest is not None:
+            # slide the windows here too, so memory stays bounded without reads
+            for w in self._windows.values():
+                w.expire(latest, self._groups)
+
+    async def warm(self, session: AsyncSession, now: Optional[datetime] = None) -> None:
+        """
+        Replay the longest window from fpd_price_changes (after a restart).
+        """
+        now = now or datetime.utcnow()
+        since = now - max(w.span for w in self._windows.values())
+        res = await session.execute(
+            select(
+                PriceHistory.site_id,
+                PriceHistory.fuel_id,
+                PriceHistory.old_price_cents,
+                PriceHistory.price_cents,
+                PriceHistory.ingested_at,
+                PriceHistory.transaction_date_utc,
+            )
+            # timed by ingestion, like apply_changes(): a late report with an
+            # old transaction date still moved the price inside the window
+            .where(PriceHistory.ingested_at >= since)
+            .where(PriceHistory.unavailable == False)  # noqa: E712
+            .order_by(PriceHistory.ingested_at, PriceHistory.id)
+        )
+        rows = res.all()
+        await self.ensure_regions(session, [int(r.site_id) for r in rows])
+        for sid, fid, old, new, at, tx in rows:
+            self._add(int(sid), int(fid), old, int(new), at, tx)
+
+    def movers(
+        self,
+        window: str,
+        fuel_id: int,
+        region_level: int = 0,
+        region_id: int = 0,
+        limit: int = 10,
+        now: Optional[datetime] = None,
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        w = self._windows[window]
+        w.expire(now or datetime.utcnow(), self._groups)
+        rises, drops = w.movers((region_level, region_id if region_level else 0, fuel_id))
+
+        def _rows(items: List[Tuple[int, int]]) -> List[Dict[str, Any]]:
+            out = []
+            for site_id, delta in items[:limit]:
+                price, changed_at = self._latest.get((site_id, fuel_id), (None, None))
+                out.append({
+                    "siteId": site_id,
+                    "changeCents": delta,
+                    "priceCents": price,
+                    "changedAt": changed_at,
+                })
+            return out
+
+        return {"rises": _rows(rises), "drops": _rows(drops)}
+
+
+# process-wide feed kept current by the ingestion listener below
+price_movers = PriceMovers()
+
+
+async def on_prices_ingested(changes: List[PriceChange]) -> None:
+    """
+    Ingestion listener: fold the change set into every window.
+    """
+    if not changes:
+        return
+    if price_movers.needs_regions(changes):
+        async with SessionLocal() as session:
+            await price_movers.ensure_regions(session, [c.site_id for c in changes])
+    price_movers.apply_changes(changes)
+
+
+async def warm_price_movers() -> None:
+    async with SessionLocal() as session:
+        await price_movers.warm(session)
@@ -1,23 +1,69 @@
 # app/services/push_service.py
 from __future__ import annotations
 
+import asyncio
 import json
 import os
-from typing import Any, Dict, List, Optional
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
 
 import httpx
+from sqlalchemy import delete, update
+
+from app.db.session import SessionLocal
+from app.db.models_notifications import UserDevice
+from app.notifications.device_directory import device_directory
 
 try:
-    from pywebpush import webpush  # type: ignore
+    from pywebpush import WebPusher  # type: ignore
+    from py_vapid import Vapid  # type: ignore  (installed with pywebpush)
 except Exception:
-    webpush = None
+    WebPusher = None
+    Vapid = None
 
 EXPO_PUSH_URL = "https://exp.host/--/api/v2/push/send"
+EXPO_RECEIPTS_URL = "https://exp.host/--/api/v2/push/getReceipts"
+
+EXPO_CHUNK_SIZE = 100              # Expo's max messages per send request
+EXPO_RECEIPT_CHUNK_SIZE = 1000     # Expo's max ids per getReceipts request
+EXPO_CONCURRENCY = 6               # send requests in flight at once
+EXPO_RECEIPT_DELAY_SECONDS = 15 * 60   # Expo: receipts are reliable after ~15 minutes
+EXPO_RECEIPT_POLL_SECONDS = 60
 
 VAPID_PUBLIC_KEY = os.getenv("VAPID_PUBLIC_KEY", "")
 VAPID_PRIVATE_KEY = os.getenv("VAPID_PRIVATE_KEY", "")
 VAPID_SUBJECT = os.getenv("VAPID_SUBJECT", "mailto:admin@example.com")
 
+WEBPUSH_WORKERS = int(os.getenv("WEBPUSH_WORKERS", "8"))   # max blocking sends in flight
+WEBPUSH_TIMEOUT_SECONDS = 10
+WEBPUSH_TTL_SECONDS = 60 * 30
+VAPID_JWT_TTL_SECONDS = 12 * 60 * 60   # push services accept up to 24h
+VAPID_JWT_REFRESH_SECONDS = 5 * 60     # re-sign this long before expiry
+
+
+@dataclass
+class PushResult:
+    """
+    Per-device outcome of one send. A device is either done (accepted, or
+    dead and disabled: never send to it again) or failed (worth a retry);
+    devices that weren't attempted are in neither.
+    """
+    done: List[str] = field(default_factory=list)
+    failed: Dict[str, str] = field(default_factory=dict)   # device -> error
+
+    def merge(self, other: "PushResult") -> "PushResult":
+        self.done.extend(other.done)
+        self.failed.update(other.failed)
+        return self
+
+    @property
+    def error(self) -> Optional[str]:
+        return next(iter(self.failed.values()), None)
+
 
 def _is_expo_token(t: str) -> bool:
     return isinstance(t, str) and (t.startswith("ExponentPushToken[") or t.startswith("ExpoPushToken["))
@@ -73,6 +119,165 @@ def _build_expo_message(
     return msg
 
 
+async def disable_expo_tokens(tokens: List[str]) -> None:
+    """
+    Turns off devices whose token Expo reported as DeviceNotRegistered.
+    """
+    if not tokens:
+        return
+    async with SessionLocal() as session:
+        await session.execute(
+            update(UserDevice)
+            .where(UserDevice.expo_push_token.in_(list(tokens)))
+            .values(is_enabled=False)
+        )
+        await session.commit()
+    device_directory.invalidate()
+
+
+class ExpoPushClient:
+    """
+    Long-lived Expo client:
+    - one pooled httpx.AsyncClient for every send
+    - 100-message chunks sent concurrently under a limit
+    - ok tickets are kept and their receipts polled later
+    - DeviceNotRegistered (ticket or receipt) disables the token
+    """
+
+    def __init__(
+        self,
+        *,
+        concurrency: int = EXPO_CONCURRENCY,
+        on_dead_tokens: Callable[[List[str]], Awaitable[None]] = disable_expo_tokens,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ) -> None:
+        self._concurrency = concurrency
+        self._on_dead_tokens = on_dead_tokens
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._sem: Optional[asyncio.Semaphore] = None
+        # receipt id -> (token, monotonic time when it can be checked)
+        self._pending_receipts: Dict[str, Tuple[str, float]] = {}
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=15,
+                transport=self._transport,
+                limits=httpx.Limits(max_connections=self._concurrency, max_keepalive_connections=self._concurrency),
+                headers={"Accept": "application/json", "Accept-Encoding": "gzip, deflate"},
+            )
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self._concurrency)
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _post_chunk(self, chunk: List[Dict[str, Any]]) -> Tuple[PushResult, List[str]]:
+        """
+        Sends one chunk; returns its per-token result and the tokens Expo says are dead.
+        """
+        client = self._http()
+        try:
+            async with self._sem:
+                r = await client.post(EXPO_PUSH_URL, json=chunk)
+            r.raise_for_status()
+            tickets = r.json().get("data", [])
+        except Exception as e:
+            err = f"{type(e).__name__}: {e}"
+            return PushResult(failed={msg["to"]: err for msg in chunk}), []
+
+        result = PushResult()
+        dead: List[str] = []
+        due = time.monotonic() + EXPO_RECEIPT_DELAY_SECONDS
+        for i, msg in enumerate(chunk):
+            t = tickets[i] if i < len(tickets) else {}
+            if t.get("status") == "ok":
+                result.done.append(msg["to"])
+                if t.get("id"):
+                    self._pending_receipts[t["id"]] = (msg["to"], due)
+            elif (t.get("details") or {}).get("error") == "DeviceNotRegistered":
+                # {"status":"error","message":"...","details":{"error":"DeviceNotRegistered"}}
+                result.done.append(msg["to"])
+                dead.append(msg["to"])
+            else:
+                result.failed[msg["to"]] = str(t.get("message") or "no ticket")
+        return result, dead
+
+    async def send(self, messages: List[Dict[str, Any]]) -> PushResult:
+        """
+        Sends every chunk; a failed request or error ticket only fails its
+        own tokens, so a retry doesn't resend what Expo already accepted.
+        """
+        result = PushResult()
+        if not messages:
+            return result
+
+        chunks = [messages[i : i + EXPO_CHUNK_SIZE] for i in range(0, len(messages), EXPO_CHUNK_SIZE)]
+        dead: List[str] = []
+        for chunk_result, chunk_dead in await asyncio.gather(*[self._post_chunk(c) for c in chunks]):
+            result.merge(chunk_result)
+            dead.extend(chunk_dead)
+
+        if dead:
+            try:
+                await self._on_dead_tokens(dead)
+            except Exception:
+                # still reported dead by their next ticket or receipt
+                pass
+        return result
+
+    async def check_receipts_once(self) -> int:
+        """
+        Fetches receipts that are due. Returns how many were resolved.
+        """
+        now = time.monotonic()
+        due_ids = [rid for rid, (_, at) in self._pending_receipts.items() if at <= now]
+        if not due_ids:
+            return 0
+
+        client = self._http()
+        dead: List[str] = []
+        resolved = 0
+        for i in range(0, len(due_ids), EXPO_RECEIPT_CHUNK_SIZE):
+            ids = due_ids[i : i + EXPO_RECEIPT_CHUNK_SIZE]
+            async with self._sem:
+                r = await client.post(EXPO_RECEIPTS_URL, json={"ids": ids})
+            r.raise_for_status()
+            receipts = r.json().get("data", {}) or {}
+
+            for rid in ids:
+                token, _ = self._pending_receipts.pop(rid, (None, 0.0))
+                resolved += 1
+                rec = receipts.get(rid)
+                if rec and rec.get("status") == "error":
+                    if (rec.get("details") or {}).get("error") == "DeviceNotRegistered" and token:
+                        dead.append(token)
+
+        if dead:
+            await self._on_dead_tokens(dead)
+        return resolved
+
+    async def run_receipt_poller(self) -> None:
+        """
+        Background task: resolves receipts as they become due.
+        """
+        while True:
+            try:
+                await self.check_receipts_once()
+            except Exception:
+                # keep poller alive; receipts stay queued for the next round
+                pass
+            await asyncio.sleep(EXPO_RECEIPT_POLL_SECONDS)
+
+
+# process-wide client (connection pool + receipt queue)
+expo_client = ExpoPushClient()
+
+
 async def send_expo_push(
     expo_tokens: List[str],
     title: str,
@@ -86,20 +291,20 @@ async def send_expo_push(
     android_channel_id: str = "alerts",
     ttl_seconds: int = 60 * 30,
     badge: Optional[int] = None,
-) -> None:
+) -> PushResult:
     """
-    Sends push via Expo service.
+    Sends push via Expo service. Returns the per-token result.
 
     IMPORTANT:
     - Expo Go: many things work, but custom sounds/channels can be limited.
     - Standalone builds (EAS): full support for channels + custom sounds (if configured).
     """
     if not expo_tokens:
-        return
+        return PushResult()
 
     expo_tokens = [t for t in expo_tokens if _is_expo_token(t)]
     if not expo_tokens:
-        return
+        return PushResult()
 
     payload_data = data or {}
 
@@ -125,53 +330,127 @@ async def send_expo_push(
             )
         )
 
-    async with httpx.AsyncClient(timeout=15) as client:
-        # Expo recommends chunking
-        for i in range(0, len(messages), 100):
-            chunk = messages[i : i + 100]
-            r = await client.post(EXPO_PUSH_URL, json=chunk)
-            r.raise_for_status()
+    return await expo_client.send(messages)
+
+
+# ----------------------------
+# Web push
+# ----------------------------
+# pywebpush is blocking (HTTPS + ECDH per message); it runs here, off the event loop.
+_webpush_pool = ThreadPoolExecutor(max_workers=WEBPUSH_WORKERS, thread_name_prefix="webpush")
 
-            resp = r.json()
-            tickets = resp.get("data", [])
+_vapid_lock = threading.Lock()
+_vapid_signer = None
+# push-service origin -> (signed VAPID headers, unix time they expire)
+_vapid_headers: Dict[str, Tuple[Dict[str, str], float]] = {}
+
+
+class WebPushGone(Exception):
+    """
+    Push service answered 404/410: the subscription is dead.
+    """
+
+
+def _vapid_headers_for(endpoint: str) -> Dict[str, str]:
+    """
+    VAPID Authorization headers for the endpoint's origin, signed once per
+    origin and reused until shortly before the JWT expires.
+    """
+    u = urlparse(endpoint)
+    origin = f"{u.scheme}://{u.netloc}"
+    now = time.time()
 
-            # If any tickets are errors, log + cleanup token in DB
-            for t in tickets:
-                if t.get("status") == "error":
-                    # TODO: log t and disable token in DB if DeviceNotRegistered
-                    # Example:
-                    # {"status":"error","message":"DeviceNotRegistered","details":{...}}
-                    pass
+    global _vapid_signer
+    with _vapid_lock:
+        cached = _vapid_headers.get(origin)
+        if cached and cached[1] - VAPID_JWT_REFRESH_SECONDS > now:
+            return dict(cached[0])
 
+        if _vapid_signer is None:
+            _vapid_signer = Vapid.from_string(private_key=VAPID_PRIVATE_KEY)
 
-def send_web_push(
+        exp = int(now) + VAPID_JWT_TTL_SECONDS
+        headers = _vapid_signer.sign({"sub": VAPID_SUBJECT, "aud": origin, "exp": exp})
+        _vapid_headers[origin] = (headers, float(exp))
+        return dict(headers)
+
+
+def _send_one_web_push(sub: Dict[str, Any], payload: str) -> None:
+    # runs in _webpush_pool
+    resp = WebPusher(sub).send(
+        payload,
+        headers=_vapid_headers_for(sub["endpoint"]),
+        ttl=WEBPUSH_TTL_SECONDS,
+        content_encoding="aes128gcm",
+        timeout=WEBPUSH_TIMEOUT_SECONDS,
+    )
+    status = getattr(resp, "status_code", 201)
+    if status in (404, 410):
+        raise WebPushGone(sub["endpoint"])
+    if status >= 400:
+        raise RuntimeError(f"web push failed: HTTP {status}")
+
+
+async def prune_webpush_endpoints(endpoints: List[str]) -> None:
+    """
+    Deletes devices whose subscription the push service reported as gone.
+    """
+    if not endpoints:
+        return
+    async with SessionLocal() as session:
+        await session.execute(
+            delete(UserDevice).where(UserDevice.webpush_endpoint.in_(list(endpoints)))
+        )
+        await session.commit()
+    device_directory.invalidate()
+
+
+async def send_web_push(
     subscriptions: List[Dict[str, Any]],
     title: str,
     body: str,
     data: Optional[Dict[str, Any]] = None,
-) -> None:
+) -> PushResult:
     """
     Browser push (Chrome/Edge/Firefox + Safari PWA with iOS 16.4+ limitations).
 
+    Sends run on a bounded thread pool so the event loop never blocks on
+    HTTPS or signing. Dead subscriptions (404/410) are pruned; any other
+    failure is reported per endpoint so the outbox retries just those.
+
     NOTE:
     - Browsers generally ignore custom sounds.
     - OS controls sound.
     """
-    if not subscriptions or webpush is None:
-        return
+    if not subscriptions or WebPusher is None:
+        return PushResult()
     if not (VAPID_PUBLIC_KEY and VAPID_PRIVATE_KEY):
-        return
+        return PushResult()
 
     payload = json.dumps({"title": title, "body": body, "data": data or {}})
 
-    for sub in subscriptions:
+    loop = asyncio.get_running_loop()
+    results = await asyncio.gather(
+        *[loop.run_in_executor(_webpush_pool, _send_one_web_push, sub, payload) for sub in subscriptions],
+        return_exceptions=True,
+    )
+
+    result = PushResult()
+    gone: List[str] = []
+    for sub, r in zip(subscriptions, results):
+        endpoint = sub["endpoint"]
+        if isinstance(r, WebPushGone):
+            gone.append(endpoint)
+            result.done.append(endpoint)
+        elif isinstance(r, BaseException):
+            result.failed[endpoint] = f"{type(r).__name__}: {r}"
+        else:
+            result.done.append(endpoint)
+
+    if gone:
         try:
-            webpush(
-                subscription_info=sub,
-                data=payload,
-                vapid_private_key=VAPID_PRIVATE_KEY,
-                vapid_claims={"sub": VAPID_SUBJECT},
-            )
+            await prune_webpush_endpoints(gone)
         except Exception:
-            # TODO: log + possibly delete invalid subscription from DB
+            # pruned when they answer 404/410 again
             pass
+    return result
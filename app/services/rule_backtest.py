@@ -0,0 +1,205 @@
+# app/services/rule_backtest.py
+from __future__ import annotations
+
+import heapq
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import and_, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.chunks import chunked
+from app.db.models.prices import PriceHistory
+from app.notifications.rule_index import compile_condition, evaluate_compiled
+
+PriceKey = Tuple[int, int]                          # (site_id, fuel_id)
+Point = Tuple[datetime, Optional[int]]              # (changed at, RAW price or None if unavailable)
+
+MAX_EVENTS = 500   # notification events listed in a result
+
+
+@dataclass(frozen=True)
+class BacktestCondition:
+    condition_id: str
+    own_key: PriceKey
+    comp_key: PriceKey
+    direction: str
+    comparator: str
+    threshold: int
+
+
+async def load_price_series(
+    session: AsyncSession,
+    keys: Iterable[PriceKey],
+    start: datetime,
+    end: datetime,
+) -> Dict[PriceKey, List[Point]]:
+    """
+    Time-ordered price points per key between start and end. The price in
+    effect at start (last change before it) is the first point, stamped start.
+    """
+    wanted = set(keys)
+    out: Dict[PriceKey, List[Point]] = {k: [] for k in wanted}
+    if not wanted:
+        return out
+
+    site_ids = sorted({s for s, _ in wanted})
+    fuel_ids = sorted({f for _, f in wanted})
+    H = PriceHistory
+
+    for sites in chunked(site_ids):
+        # price in effect at start
+        before = (
+            select(H.site_id, H.fuel_id, func.max(H.transaction_date_utc).label("tx"))
+            .where(H.site_id.in_(sites), H.fuel_id.in_(fuel_ids), H.transaction_date_utc < start)
+            .group_by(H.site_id, H.fuel_id)
+            .subquery()
+        )
+        res = await session.execute(
+            select(H.site_id, H.fuel_id, H.price_cents, H.unavailable)
+            .join(
+                before,
+                and_(
+                    H.site_id == before.c.site_id,
+                    H.fuel_id == before.c.fuel_id,
+                    H.transaction_date_utc == before.c.tx,
+                ),
+            )
+        )
+        for sid, fid, cents, unavailable in res.all():
+            key = (int(sid), int(fid))
+            if key in wanted:
+                out[key] = [(start, None if unavailable else int(cents))]
+
+        res = await session.execute(
+            select(H.site_id, H.fuel_id, H.price_cents, H.unavailable, H.transaction_date_utc)
+            .where(H.site_id.in_(sites), H.fuel_id.in_(fuel_ids))
+            .where(H.transaction_date_utc >= start, H.transaction_date_utc <= end)
+            .order_by(H.site_id, H.fuel_id, H.transaction_date_utc, H.id)
+        )
+        for sid, fid, cents, unavailable, tx in res.all():
+            key = (int(sid), int(fid))
+            if key in wanted:
+                out[key].append((tx, None if unavailable else int(cents)))
+    return out
+
+
+def _stream(key: PriceKey, points: List[Point]) -> Iterator[Tuple[datetime, PriceKey, Optional[int]]]:
+    for at, price in points:
+        yield at, key, price
+
+
+def backtest(
+    conditions: List[BacktestCondition],
+    series: Dict[PriceKey, List[Point]],
+    start: datetime,
+    end: datetime,
+    cooldown: timedelta,
+) -> Dict[str, Any]:
+    """
+    Replays price changes in time order (one streaming merge of the
+    per-key series) and applies the scheduler's notify semantics per
+    condition: notify on not triggered -> triggered, then again every
+    cooldown while it stays triggered.
+
+    Notification times are price change times; the live scheduler fires
+    at its next tick, normally seconds later.
+    """
+    compiled = [compile_condition(c.direction, c.comparator, c.threshold) for c in conditions]
+    by_key: Dict[PriceKey, List[int]] = {}
+    for i, c in enumerate(conditions):
+        by_key.setdefault(c.own_key, []).append(i)
+        if c.comp_key != c.own_key:
+            by_key.setdefault(c.comp_key, []).append(i)
+
+    prices: Dict[PriceKey, Optional[int]] = {}
+    n = len(conditions)
+    triggered = [False] * n
+    since: List[Optional[datetime]] = [None] * n
+    version = [0] * n          # bumps on every state change; stale re-arms are skipped
+    triggers = [0] * n
+    renotifies = [0] * n
+    triggered_seconds = [0.0] * n
+    rearm: List[Tuple[datetime, int, int]] = []   # (due, condition, version)
+    events: List[Dict[str, Any]] = []
+    total = 0
+
+    def _diff(i: int) -> Optional[int]:
+        c = conditions[i]
+        own, comp = prices.get(c.own_key), prices.get(c.comp_key)
+        if own is None or comp is None:
+            return None
+        return compiled[i][1] * (comp - own)
+
+    def _notify(i: int, at: datetime, kind: str) -> None:
+        nonlocal total
+        total += 1
+        if len(events) < MAX_EVENTS:
+            events.append({
+                "at": at.isoformat(),
+                "conditionId": conditions[i].condition_id,
+                "kind": kind,
+                "diffCents": _diff(i),
+            })
+        heapq.heappush(rearm, (at + cooldown, i, version[i]))
+
+    def _rearm_until(t: datetime, inclusive: bool) -> None:
+        while rearm and (rearm[0][0] <= t if inclusive else rearm[0][0] < t):
+            due, i, ver = heapq.heappop(rearm)
+            if ver != version[i] or not triggered[i]:
+                continue
+            renotifies[i] += 1
+            _notify(i, due, "cooldown")
+
+    changes = 0
+    merged = heapq.merge(*(_stream(k, pts) for k, pts in series.items()), key=lambda e: e[0])
+    for at, key, price in merged:
+        changes += 1
+        _rearm_until(at, inclusive=False)
+        prices[key] = price
+
+        for i in by_key.get(key, ()):
+            c = conditions[i]
+            op, sign, threshold, flags = compiled[i]
+            fired = evaluate_compiled(
+                [prices.get(c.own_key)], [prices.get(c.comp_key)], [sign], [op], [threshold], [flags]
+            )[0]
+            if fired and not triggered[i]:
+                triggered[i] = True
+                since[i] = at
+                version[i] += 1
+                triggers[i] += 1
+                _notify(i, at, "trigger")
+            elif not fired and triggered[i]:
+                triggered[i] = False
+                triggered_seconds[i] += (at - since[i]).total_seconds()
+                since[i] = None
+                version[i] += 1
+
+    _rearm_until(end, inclusive=True)
+    for i in range(n):
+        if triggered[i]:
+            triggered_seconds[i] += (end - since[i]).total_seconds()
+
+    return {
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "cooldownMinutes": int(cooldown.total_seconds() // 60),
+        "priceChanges": changes,
+        "notifications": total,
+        "conditions": [
+            {
+                "conditionId": c.condition_id,
+                "thresholdCents": c.threshold,
+                "notifications": triggers[i] + renotifies[i],
+                "triggers": triggers[i],
+                "cooldownRenotifies": renotifies[i],
+                "triggeredMinutes": round(triggered_seconds[i] / 60, 1),
+                "triggeredAtEnd": triggered[i],
+            }
+            for i, c in enumerate(conditions)
+        ],
+        "events": events,
+        "eventsTruncated": total > len(events),
+    }
@@ -0,0 +1,207 @@
+# app/services/rule_conflicts.py
+from __future__ import annotations
+
+import heapq
+import math
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# A condition fires for a set of price differences. Everything here works on
+# one axis, diff = competitor - own (RAW units, integers), so both directions
+# compare directly. Ranges are closed integer intervals; +-inf for open ends.
+Range = Tuple[float, float]
+
+INF = math.inf
+MAX_RELATED = 10   # related rule ids listed per conflict
+
+
+def condition_ranges(direction: str, comparator: str, threshold: int) -> List[Range]:
+    """
+    Disjoint, sorted ranges of (competitor - own) for which the condition fires.
+    """
+    t = int(threshold)
+    if comparator == "GT":
+        ranges = [(t + 1, INF)]
+    elif comparator == "GTE":
+        ranges = [(t, INF)]
+    elif comparator == "LT":
+        ranges = [(-INF, t - 1)]
+    elif comparator == "LTE":
+        ranges = [(-INF, t)]
+    elif comparator == "ABS_GT":
+        ranges = [(-INF, -t - 1), (t + 1, INF)] if t >= 0 else [(-INF, INF)]
+    elif comparator == "ABS_GTE":
+        ranges = [(-INF, -t), (t, INF)] if t > 0 else [(-INF, INF)]
+    else:
+        return []
+
+    if direction == "OWN_MINUS_COMPETITOR":
+        # own - comp = -(comp - own): mirror onto the common axis
+        ranges = sorted((-hi, -lo) for lo, hi in ranges)
+    return ranges
+
+
+def _fmt(ranges: List[Range]) -> str:
+    def _one(lo: float, hi: float) -> str:
+        if lo == -INF and hi == INF:
+            return "any difference"
+        if lo == -INF:
+            return f"diff <= {int(hi)}"
+        if hi == INF:
+            return f"diff >= {int(lo)}"
+        return f"{int(lo)} <= diff <= {int(hi)}"
+    return " or ".join(_one(lo, hi) for lo, hi in ranges) or "no difference"
+
+
+@dataclass(frozen=True)
+class ConditionRow:
+    rule_id: str
+    rule_name: str
+    condition_id: str
+    owned_site_id: str
+    own_site: int
+    competitor_site: int
+    own_fuel_id: int
+    competitor_fuel_id: int
+    direction: str
+    comparator: str
+    threshold: int
+
+
+def _base(c: ConditionRow) -> dict:
+    return {
+        "ruleId": c.rule_id,
+        "conditionId": c.condition_id,
+        "ownedSiteId": c.owned_site_id,
+        "competitorSiteId": c.competitor_site,
+        "ownFuelId": c.own_fuel_id,
+        "competitorFuelId": c.competitor_fuel_id,
+    }
+
+
+def find_conflicts(
+    conditions: Iterable[ConditionRow],
+    priced: Optional[Set[Tuple[int, int]]] = None,
+) -> List[dict]:
+    """
+    Conflicts among one user's enabled rule conditions.
+
+    Conditions are grouped by key (owned site, competitor site, fuel pair);
+    inside a key a single sweep over sorted range start points flags
+    overlapping conditions, so the cost stays O(n log n) per key instead of
+    comparing all pairs.
+
+    NEVER_FIRES is kept for conditions that cannot fire for any price.
+    priced: (site_id, fuel_id) pairs that currently have a price; a condition
+    reading a missing pair is reported as NO_PRICE, for information only (it
+    fires again once the price is back), and still takes part in the checks
+    against other rules.
+    """
+    out: List[dict] = []
+    by_key: Dict[Tuple[str, int, int, int], List[ConditionRow]] = {}
+
+    for c in conditions:
+        ranges = condition_ranges(c.direction, c.comparator, c.threshold)
+
+        # -------- never fires --------
+        reason = None
+        if not ranges:
+            reason = f"Unknown comparator {c.comparator}"
+        elif c.own_site == c.competitor_site and c.own_fuel_id == c.competitor_fuel_id:
+            if not any(lo <= 0 <= hi for lo, hi in ranges):
+                reason = "Compares a price with itself (difference is always 0), so it never fires"
+        if reason:
+            out.append({**_base(c), "conflictType": "NEVER_FIRES", "message": reason, "relatedRuleIds": []})
+            continue
+
+        # -------- no current price: informational --------
+        if priced is not None:
+            missing = [k for k in ((c.own_site, c.own_fuel_id), (c.competitor_site, c.competitor_fuel_id)) if k not in priced]
+            if missing:
+                out.append({
+                    **_base(c),
+                    "conflictType": "NO_PRICE",
+                    "message": "No current price for " + ", ".join(f"site {s} fuel {f}" for s, f in missing),
+                    "relatedRuleIds": [],
+                })
+
+        by_key.setdefault((c.owned_site_id, c.competitor_site, c.own_fuel_id, c.competitor_fuel_id), []).append(c)
+
+    for rows in by_key.values():
+        out.extend(_conflicts_in_key(rows))
+    return out
+
+
+def _conflicts_in_key(rows: List[ConditionRow]) -> List[dict]:
+    out: List[dict] = []
+    ranges = {c.condition_id: condition_ranges(c.direction, c.comparator, c.threshold) for c in rows}
+
+    # -------- duplicates: identical firing ranges (e.g. GT 4 == GTE 5) --------
+    by_ranges: Dict[Tuple[Range, ...], List[ConditionRow]] = {}
+    for c in rows:
+        by_ranges.setdefault(tuple(ranges[c.condition_id]), []).append(c)
+    duplicate_of: Dict[str, str] = {}
+    for same in by_ranges.values():
+        rule_ids = sorted({c.rule_id for c in same})
+        if len(rule_ids) < 2:
+            continue
+        first = rule_ids[0]
+        for c in same:
+            if c.rule_id == first:
+                continue
+            duplicate_of[c.condition_id] = first
+            out.append({
+                **_base(c),
+                "conflictType": "DUPLICATE",
+                "message": f"Fires for exactly the same prices as rule {first} ({_fmt(ranges[c.condition_id])})",
+                "relatedRuleIds": [first],
+            })
+
+    # -------- overlaps across rules: sweep over range start points --------
+    events: List[Tuple[float, float, ConditionRow]] = []
+    for c in rows:
+        for lo, hi in ranges[c.condition_id]:
+            events.append((lo, hi, c))
+    events.sort(key=lambda e: (e[0], e[1]))
+
+    related: Dict[str, Set[str]] = {}       # condition id -> overlapping rule ids
+    active: List[Tuple[float, int, ConditionRow]] = []  # min-heap by range end
+    seq = 0
+    for lo, hi, c in events:
+        while active and active[0][0] < lo:
+            heapq.heappop(active)
+        # every active range overlaps this one; capping the pairs examined
+        # (skipped ones included) keeps the sweep near-linear when thousands
+        # of ranges are open at once
+        examined = 0
+        for _, _, other in active:
+            if examined >= 2 * MAX_RELATED:
+                break
+            examined += 1
+            if other.rule_id == c.rule_id:
+                continue
+            # duplicates are already reported as such
+            dup_c, dup_o = duplicate_of.get(c.condition_id), duplicate_of.get(other.condition_id)
+            if dup_c == other.rule_id or dup_o == c.rule_id or (dup_c is not None and dup_c == dup_o):
+                continue
+            # pair already recorded through another range / condition
+            if other.rule_id in related.get(c.condition_id, ()) and c.rule_id in related.get(other.condition_id, ()):
+                continue
+            if len(related.setdefault(c.condition_id, set())) < MAX_RELATED:
+                related[c.condition_id].add(other.rule_id)
+            if len(related.setdefault(other.condition_id, set())) < MAX_RELATED:
+                related[other.condition_id].add(c.rule_id)
+        seq += 1
+        heapq.heappush(active, (hi, seq, c))
+
+    for c in rows:
+        rel = related.get(c.condition_id)
+        if rel:
+            out.append({
+                **_base(c),
+                "conflictType": "OVERLAP",
+                "message": f"Fires together with {len(rel)} other rule(s) for some prices ({_fmt(ranges[c.condition_id])})",
+                "relatedRuleIds": sorted(rel),
+            })
+
+    return out
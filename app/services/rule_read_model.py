@@ -0,0 +1,358 @@
+# app/services/rule_read_model.py
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.db.chunks import chunked
+from app.db.models.stations import UserOwnedSite
+from app.db.models_notifications import RuleAlertState
+from app.db.models_rules import PricingRule, PricingRuleChange, PricingRuleReadModel as ReadModel
+from app.db.session import SessionLocal
+
+try:
+    from app.db.models.master import Site
+except Exception:
+    Site = None  # fallback: site names will return None
+
+# pricing_rule_changes rows older than this are pruned; a worker that was
+# away longer rebuilds its whole rule index on start anyway
+RULE_CHANGES_KEEP = timedelta(days=1)
+
+
+# -------------------------
+# Building documents
+# -------------------------
+async def _owned_sites_map(session: AsyncSession, owned_site_ids: Iterable[str]) -> Dict[str, UserOwnedSite]:
+    ids = sorted(set(owned_site_ids))
+    out: Dict[str, UserOwnedSite] = {}
+    for chunk in chunked(ids):
+        q = await session.execute(select(UserOwnedSite).where(UserOwnedSite.id.in_(chunk)))
+        out.update((str(o.id), o) for o in q.scalars().all())
+    return out
+
+
+async def _site_names_map(session: AsyncSession, site_ids: Iterable[int]) -> Dict[int, Optional[str]]:
+    ids = sorted(set(site_ids))
+    out: Dict[int, Optional[str]] = {sid: None for sid in ids}
+    if Site is None:
+        return out
+    for chunk in chunked(ids):
+        q = await session.execute(select(Site.site_id, Site.name).where(Site.site_id.in_(chunk)))
+        for sid, name in q.all():
+            out[int(sid)] = name
+    return out
+
+
+def _rule_doc(rule: PricingRule, owned: Optional[UserOwnedSite], names: Dict[int, Optional[str]]) -> Dict[str, Any]:
+    """
+    The rule as /me/rules serves it, minus trigger state.
+    """
+    competitor_site_id_int = int(rule.competitor_site_id)
+    doc: Dict[str, Any] = {
+        "id": str(rule.id),
+        "name": rule.name,
+        "isEnabled": rule.is_enabled,
+        # keep old fields for backward compatibility
+        "ownedSiteId": str(rule.owned_site_id),
+        "competitorSiteId": competitor_site_id_int,
+    }
+    if owned is not None:
+        owned_site_id_int = int(owned.site_id)
+        doc["ownedSite"] = {
+            "ownedSiteId": str(owned.id),
+            "siteId": owned_site_id_int,
+            "siteName": names.get(owned_site_id_int),
+            "nickname": getattr(owned, "nickname", None),
+            "isPrimary": bool(getattr(owned, "is_primary", False)),
+        }
+    doc["competitorSite"] = {
+        "siteId": competitor_site_id_int,
+        "siteName": names.get(competitor_site_id_int),
+    }
+    doc["conditions"] = [
+        {
+            "id": str(c.id),
+            "ownFuelId": c.own_fuel_id,
+            "competitorFuelId": c.competitor_fuel_id,
+            "direction": c.direction,
+            "comparator": c.comparator,
+            "thresholdCents": c.threshold_cents,
+            "requireBothAvailable": c.require_both_available,
+        }
+        for c in rule.conditions
+    ]
+    return doc
+
+
+def rule_out(
+    doc: Dict[str, Any],
+    triggered: Iterable[str],
+    last_triggered_at: Optional[datetime],
+    fields: Optional[set[str]] = None,
+) -> Dict[str, Any]:
+    """
+    Stored document + trigger state, limited to `fields` (None: all).
+    """
+    trig = set(triggered or ())
+    out = dict(doc)
+    if "conditions" in out:
+        out["conditions"] = [{**c, "isTriggered": c["id"] in trig} for c in out["conditions"]]
+    out["isTriggered"] = bool(trig)
+    out["lastTriggeredAt"] = last_triggered_at.isoformat() if last_triggered_at else None
+    if fields is not None:
+        out = {k: v for k, v in out.items() if k in fields}
+    return out
+
+
+# -------------------------
+# Maintenance
+# -------------------------
+async def _alert_states(session: AsyncSession, rule_ids: List[str]) -> Dict[str, tuple]:
+    """
+    rule id -> (triggered condition ids, last triggered at) from rule_alert_state.
+    """
+    out: Dict[str, tuple] = {}
+    res = await session.execute(
+        select(
+            RuleAlertState.rule_id,
+            RuleAlertState.condition_id,
+            RuleAlertState.is_currently_triggered,
+            RuleAlertState.last_triggered_at,
+        ).where(RuleAlertState.rule_id.in_(rule_ids))
+    )
+    for rid, cid, trig, at in res.all():
+        cids, last = out.get(rid, ([], None))
+        if trig:
+            cids.append(cid)
+        if at is not None and (last is None or at > last):
+            last = at
+        out[rid] = (cids, last)
+    return out
+
+
+async def record_rule_changes(session: AsyncSession, rule_ids: Iterable[str]) -> None:
+    """
+    Appends rule_ids to pricing_rule_changes in the caller's transaction,
+    so alert workers in other processes pick the change (or delete) up.
+    """
+    ids = sorted(set(rule_ids))
+    if not ids:
+        return
+    now = datetime.utcnow()
+    await session.execute(insert(PricingRuleChange), [{"rule_id": rid, "changed_at": now} for rid in ids])
+    await session.execute(delete(PricingRuleChange).where(PricingRuleChange.changed_at < now - RULE_CHANGES_KEEP))
+
+
+async def refresh_rule_read_models(
+    session: AsyncSession,
+    rule_ids: Iterable[str],
+    *,
+    record_changes: bool = True,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Rewrites the read model rows of rule_ids from the normalised tables
+    (deleted rules lose their row). Runs in the caller's transaction; the
+    caller commits. Returns the served form of every rule still present.
+
+    Every rule write goes through here, so the ids are also recorded in
+    pricing_rule_changes (record_changes=False when only the document
+    changed, e.g. a site name).
+
+    Trigger state is kept from the existing row (the scheduler keeps it
+    current); a rule without a row takes it from rule_alert_state.
+    """
+    ids = sorted(set(rule_ids))
+    served: Dict[str, Dict[str, Any]] = {}
+    if record_changes:
+        await record_rule_changes(session, ids)
+
+    for chunk in chunked(ids):
+        rules = (
+            await session.execute(
+                select(PricingRule)
+                .where(PricingRule.id.in_(chunk))
+                .options(selectinload(PricingRule.conditions))
+            )
+        ).scalars().all()
+
+        gone = set(chunk) - {str(r.id) for r in rules}
+        if gone:
+            await session.execute(delete(ReadModel).where(ReadModel.rule_id.in_(gone)))
+        if not rules:
+            continue
+
+        owned = await _owned_sites_map(session, [str(r.owned_site_id) for r in rules])
+        names = await _site_names_map(
+            session,
+            [int(o.site_id) for o in owned.values()] + [int(r.competitor_site_id) for r in rules],
+        )
+
+        res = await session.execute(
+            select(ReadModel.rule_id, ReadModel.triggered, ReadModel.last_triggered_at)
+            .where(ReadModel.rule_id.in_(chunk))
+        )
+        state = {rid: (trig or [], at) for rid, trig, at in res.all()}
+        missing = [str(r.id) for r in rules if str(r.id) not in state]
+        if missing:
+            state.update(await _alert_states(session, missing))
+
+        now = datetime.utcnow()
+        rows = []
+        for r in rules:
+            rid = str(r.id)
+            doc = _rule_doc(r, owned.get(str(r.owned_site_id)), names)
+            cond_ids = {str(c.id) for c in r.conditions}
+            trig, last = state.get(rid, ([], None))
+            # replaced conditions start untriggered
+            trig = [c for c in trig if c in cond_ids]
+            rows.append({
+                "rule_id": rid,
+                "user_id": str(r.user_id),
+                "owned_site_id": str(r.owned_site_id),
+                "created_at": r.created_at,
+                "doc": doc,
+                "triggered": trig,
+                "last_triggered_at": last,
+                "updated_at": now,
+            })
+            served[rid] = rule_out(doc, trig, last)
+
+        stmt = sqlite_insert(ReadModel).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ReadModel.rule_id],
+            set_={
+                k: getattr(stmt.excluded, k)
+                for k in ("user_id", "owned_site_id", "created_at", "doc", "triggered", "last_triggered_at", "updated_at")
+            },
+        )
+        await session.execute(stmt)
+
+    return served
+
+
+async def refresh_user_rules(
+    session: AsyncSession,
+    user_id: str,
+    owned_site_id: Optional[str] = None,
+) -> List[str]:
+    """
+    Refresh every rule of a user (or of one owned site) after an owned site
+    changed. Returns the rule ids touched.
+    """
+    stmt = select(PricingRule.id).where(PricingRule.user_id == user_id)
+    if owned_site_id is not None:
+        stmt = stmt.where(PricingRule.owned_site_id == owned_site_id)
+    rule_ids = (await session.execute(stmt)).scalars().all()
+    # rows of rules whose owned site was deleted along with them
+    stale = select(ReadModel.rule_id).where(ReadModel.user_id == user_id)
+    if owned_site_id is not None:
+        stale = stale.where(ReadModel.owned_site_id == owned_site_id)
+    rule_ids = set(rule_ids) | set((await session.execute(stale)).scalars().all())
+    await refresh_rule_read_models(session, rule_ids)
+    return sorted(rule_ids)
+
+
+async def rebuild_rule_read_models(session: AsyncSession, user_id: Optional[str] = None) -> int:
+    """
+    Drops and rebuilds the read model (everyone's, or one user's) from
+    pricing_rules + rule_alert_state. Commits; returns rules written.
+    """
+    wipe = delete(ReadModel)
+    rules = select(PricingRule.id).order_by(PricingRule.id)
+    if user_id is not None:
+        wipe = wipe.where(ReadModel.user_id == user_id)
+        rules = rules.where(PricingRule.user_id == user_id)
+
+    await session.execute(wipe)
+    rule_ids = (await session.execute(rules)).scalars().all()
+    written = 0
+    for chunk in chunked(rule_ids):
+        written += len(await refresh_rule_read_models(session, chunk, record_changes=False))
+    await session.commit()
+    return written
+
+
+async def ensure_rule_read_models() -> None:
+    """
+    Startup: build the read model if its rule ids differ from pricing_rules
+    (first run on an older DB, or rows missed while it was out of sync).
+    """
+    async with SessionLocal() as session:
+        missing = (
+            await session.execute(
+                select(PricingRule.id)
+                .outerjoin(ReadModel, ReadModel.rule_id == PricingRule.id)
+                .where(ReadModel.rule_id.is_(None))
+                .limit(1)
+            )
+        ).first()
+        orphaned = (
+            await session.execute(
+                select(ReadModel.rule_id)
+                .outerjoin(PricingRule, PricingRule.id == ReadModel.rule_id)
+                .where(PricingRule.id.is_(None))
+                .limit(1)
+            )
+        ).first()
+        if missing is not None or orphaned is not None:
+            await rebuild_rule_read_models(session)
+
+
+async def on_master_synced(site_ids: List[int]) -> None:
+    """
+    Master sync listener: rules embed site names, so rewrite the documents
+    of rules whose owned or competitor site was added or renamed.
+    """
+    if not site_ids:
+        return
+    async with SessionLocal() as session:
+        rule_ids: set[str] = set()
+        for chunk in chunked(sorted(set(site_ids))):
+            res = await session.execute(
+                select(PricingRule.id)
+                .join(UserOwnedSite, UserOwnedSite.id == PricingRule.owned_site_id)
+                .where(PricingRule.competitor_site_id.in_(chunk) | UserOwnedSite.site_id.in_(chunk))
+            )
+            rule_ids.update(res.scalars().all())
+        if not rule_ids:
+            return
+        for chunk in chunked(sorted(rule_ids)):
+            await refresh_rule_read_models(session, chunk, record_changes=False)
+        await session.commit()
+
+
+async def apply_trigger_transitions(
+    session: AsyncSession,
+    transitions: Dict[str, Dict[str, bool]],
+    now: datetime,
+) -> None:
+    """
+    Alert scheduler hook, inside its tick transaction:
+    rule id -> {condition id: now triggered?} for conditions whose state flipped.
+    """
+    if not transitions:
+        return
+    ids = sorted(transitions)
+    params = []
+    for chunk in chunked(ids):
+        res = await session.execute(
+            select(ReadModel.rule_id, ReadModel.triggered, ReadModel.last_triggered_at)
+            .where(ReadModel.rule_id.in_(chunk))
+        )
+        for rid, trig, last in res.all():
+            cur = set(trig or ())
+            for cid, on in transitions[rid].items():
+                if on:
+                    cur.add(cid)
+                    last = now
+                else:
+                    cur.discard(cid)
+            params.append({"rule_id": rid, "triggered": sorted(cur), "last_triggered_at": last})
+    if params:
+        await session.execute(update(ReadModel), params)
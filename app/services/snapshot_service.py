@@ -0,0 +1,136 @@
+# app/services/snapshot_service.py
+from __future__ import annotations
+
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import select
+
+from app.api.responses import dumps
+from app.core.settings import settings
+from app.db.models.master import Site
+from app.db.models.prices import PriceLatest
+from app.db.session import SessionLocal
+from app.ingestion.events import PriceChange
+
+MANIFEST_NAME = "manifest.json"
+
+SITE_KEYS = ("siteId", "name", "brandId", "address", "postcode", "lat", "lng")
+PRICE_KEYS = ("siteId", "fuelId", "priceCents", "unavailable", "recordedAt")
+
+
+def _snapshot_dir() -> str:
+    return settings.SNAPSHOT_DIR
+
+
+def snapshot_path(file_name: str) -> str:
+    return os.path.join(_snapshot_dir(), os.path.basename(file_name))
+
+
+def _columns(keys, rows) -> Dict[str, list]:
+    cols = list(zip(*rows)) if rows else [() for _ in keys]
+    return {k: list(c) for k, c in zip(keys, cols)}
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def read_manifest() -> Optional[Dict[str, Any]]:
+    try:
+        with open(snapshot_path(MANIFEST_NAME), "rb") as f:
+            return json.loads(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def _prune(keep_file: str) -> None:
+    # keep the newest SNAPSHOT_KEEP files so clients mid-download of an older version still finish
+    d = _snapshot_dir()
+    files = [
+        os.path.join(d, n)
+        for n in os.listdir(d)
+        if n.startswith("prices-") and n.endswith(".json.gz")
+    ]
+    files.sort(key=os.path.getmtime, reverse=True)
+    for path in files[max(1, settings.SNAPSHOT_KEEP):]:
+        if os.path.basename(path) != keep_file:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+async def write_snapshot() -> Dict[str, Any]:
+    """
+    Build the sites + latest prices artifact and publish it.
+
+    Files are content-addressed (prices-<sha256>.json.gz) and never modified
+    after being written; manifest.json points at the current one.
+    """
+    async with SessionLocal() as session:
+        site_rows = (
+            await session.execute(
+                select(Site.site_id, Site.name, Site.brand_id, Site.address, Site.postcode, Site.lat, Site.lng)
+                .order_by(Site.site_id)
+            )
+        ).all()
+        price_rows = (
+            await session.execute(
+                select(
+                    PriceLatest.site_id,
+                    PriceLatest.fuel_id,
+                    PriceLatest.price_cents,
+                    PriceLatest.unavailable,
+                    PriceLatest.transaction_date_utc,
+                ).order_by(PriceLatest.site_id, PriceLatest.fuel_id)
+            )
+        ).all()
+
+    prices = [
+        (sid, fid, cents, bool(unavail), tx.isoformat() if tx else None)
+        for sid, fid, cents, unavail, tx in price_rows
+    ]
+    body = dumps({
+        "format": "columnar",
+        "sites": _columns(SITE_KEYS, site_rows),
+        "prices": _columns(PRICE_KEYS, prices),
+    })
+
+    version = hashlib.sha256(body).hexdigest()
+    file_name = f"prices-{version[:32]}.json.gz"
+    os.makedirs(_snapshot_dir(), exist_ok=True)
+    path = snapshot_path(file_name)
+
+    if not os.path.exists(path):
+        compressed = await asyncio.to_thread(gzip.compress, body, 6)
+        await asyncio.to_thread(_write_atomic, path, compressed)
+
+    manifest = {
+        "version": version[:32],
+        "file": file_name,
+        "bytes": os.path.getsize(path),
+        "rawBytes": len(body),
+        "sites": len(site_rows),
+        "prices": len(prices),
+        "generatedAt": datetime.now(timezone.utc).isoformat(),
+    }
+    await asyncio.to_thread(_write_atomic, snapshot_path(MANIFEST_NAME), dumps(manifest))
+    await asyncio.to_thread(_prune, file_name)
+    return manifest
+
+
+async def on_prices_ingested(changes: List[PriceChange]) -> None:
+    """
+    Ingestion listener: rebuild only when prices moved (or nothing is published yet).
+    """
+    if changes or read_manifest() is None:
+        await write_snapshot()
@@ -0,0 +1,625 @@
+# tests/test_alerts.py
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+import pytest
+
+from app.db.models.master import Site
+from app.db.models.prices import PriceLatest
+from app.db.models.stations import UserOwnedSite
+from app.db.models_notifications import RuleAlertState, UserDevice
+from app.db.models_rules import PricingRule, PricingRuleCondition
+from app.db.models_user import User
+from app.notifications import alert_scheduler, delivery_worker, state_cache
+from app.services.push_service import PushResult
+
+
+OWN_SITE = 61401007
+COMP_SITE = 61401008
+
+
+@pytest.fixture()
+def alert_env(db_session, monkeypatch):
+    """
+    Scheduler opens its own sessions; point them at the test session and
+    record pushes instead of calling Expo.
+    """
+    sent = []
+
+    @asynccontextmanager
+    async def _session():
+        yield db_session
+
+    async def _fake_expo(tokens, title, body, data=None, **kw):
+        sent.append(data)
+        return PushResult(done=list(tokens))
+
+    monkeypatch.setattr(alert_scheduler, "SessionLocal", _session)
+    monkeypatch.setattr(delivery_worker, "SessionLocal", _session)
+    monkeypatch.setattr(state_cache, "SessionLocal", _session)
+    monkeypatch.setattr(delivery_worker, "send_expo_push", _fake_expo)
+
+    # module-level scheduler state must not leak between tests
+    alert_scheduler._pending_keys.clear()
+    alert_scheduler._pending_rules.clear()
+    alert_scheduler._rearm_at.clear()
+    alert_scheduler.rule_index.invalidate()
+    delivery_worker.device_directory.invalidate()
+    alert_scheduler.state_cache.clear()
+    return sent
+
+
+async def _seed_rule(client, db_session, *, own_price: float, comp_price: float, direction="OWN_MINUS_COMPETITOR", comparator="GT", threshold=5):
+    await client.post("/v1/admin/sync/master")
+
+    user = User(email=f"alert_{uuid.uuid4().hex[:8]}@test.com", password_hash="x")
+    db_session.add(user)
+    db_session.add(
+        Site(site_id=COMP_SITE, name="Competitor", address="Other St", brand_id=113, postcode="4209", lat=-27.87, lng=153.32)
+    )
+    await db_session.flush()
+
+    owned = UserOwnedSite(user_id=user.id, site_id=OWN_SITE)
+    db_session.add(owned)
+    db_session.add(UserDevice(user_id=user.id, kind="expo", expo_push_token=f"ExponentPushToken[{user.id}]"))
+    await db_session.flush()
+
+    now = datetime.utcnow()
+    for sid, price in ((OWN_SITE, own_price), (COMP_SITE, comp_price)):
+        db_session.add(
+            PriceLatest(
+                site_id=sid, fuel_id=2, price_raw=price, price_cents=int(round(price)),
+                unavailable=False, transaction_date_utc=now, ingested_at=now,
+            )
+        )
+
+    rule = PricingRule(user_id=user.id, owned_site_id=owned.id, competitor_site_id=COMP_SITE, name="Undercut")
+    rule.conditions.append(
+        PricingRuleCondition(
+            own_fuel_id=2, competitor_fuel_id=2, direction=direction,
+            comparator=comparator, threshold_cents=threshold,
+        )
+    )
+    db_session.add(rule)
+    await db_session.commit()
+    return rule
+
+
+async def _tick(condition_ids=None):
+    await alert_scheduler.evaluate_and_notify_once(condition_ids)
+    await delivery_worker.deliver_pending_once()
+
+
+def test_compiled_conditions_evaluate():
+    from app.notifications.rule_index import compile_condition, evaluate_compiled
+
+    compiled = [
+        compile_condition("COMPETITOR_MINUS_OWN", "LT", -5),
+        compile_condition("COMPETITOR_MINUS_OWN", "LT", -5),
+        compile_condition("COMPETITOR_MINUS_OWN", "LT", -5),
+        compile_condition("OWN_MINUS_COMPETITOR", "GTE", 10),
+        compile_condition("COMPETITOR_MINUS_OWN", "ABS_GT", 20),
+        compile_condition("COMPETITOR_MINUS_OWN", "BOGUS", 0),
+    ]
+    ops, signs, thresholds, flags = zip(*compiled)
+    out = evaluate_compiled(
+        own=[2000, 2000, None, 2000, 2000, 2000],
+        comp=[1990, 2010, 1990, 1990, 2030, 2100],
+        signs=signs, ops=ops, thresholds=thresholds, flags=flags,
+    )
+    assert out == [True, False, False, True, True, False]
+
+
+@pytest.mark.anyio
+async def test_scheduler_notifies_once_until_cleared(client, db_session, alert_env):
+    # competitor 3.0c cheaper -> OWN_MINUS_COMPETITOR = 30 > 5
+    rule = await _seed_rule(client, db_session, own_price=2119.0, comp_price=2089.0)
+
+    await alert_scheduler.evaluate_and_notify_once()
+    # evaluation only queues; nothing is sent until the delivery worker runs
+    assert alert_env == []
+    await delivery_worker.deliver_pending_once()
+    assert [d["ruleId"] for d in alert_env] == [rule.id]
+
+    # still triggered, inside cooldown -> no second push
+    await _tick()
+    assert len(alert_env) == 1
+
+    st = (await db_session.execute(
+        RuleAlertState.__table__.select().where(RuleAlertState.rule_id == rule.id)
+    )).one()
+    assert st.is_currently_triggered
+
+
+@pytest.mark.anyio
+async def test_ingested_change_triggers_only_dependent_conditions(client, db_session, alert_env):
+    from app.ingestion.events import PriceChange
+
+    rule = await _seed_rule(client, db_session, own_price=2119.0, comp_price=2089.0)
+
+    # nothing queued -> idle tick
+    await alert_scheduler._evaluate_pending()
+    assert alert_env == []
+
+    # unrelated price moved -> nothing to evaluate
+    now = datetime.utcnow()
+    await alert_scheduler.on_prices_ingested([PriceChange(999, 2, 2000, 1990, False, now, now)])
+    await alert_scheduler._evaluate_pending()
+    assert alert_env == []
+
+    # competitor price moved -> its conditions are evaluated right away
+    await alert_scheduler.on_prices_ingested([PriceChange(COMP_SITE, 2, 2109, 2089, False, now, now)])
+    await alert_scheduler._evaluate_pending()
+    await delivery_worker.deliver_pending_once()
+    assert [d["ruleId"] for d in alert_env] == [rule.id]
+
+
+@pytest.mark.anyio
+async def test_failed_tick_requeues_pending_work(client, db_session, alert_env, monkeypatch):
+    from app.ingestion.events import PriceChange
+
+    rule = await _seed_rule(client, db_session, own_price=2119.0, comp_price=2089.0)
+    now = datetime.utcnow()
+    await alert_scheduler.on_prices_ingested([PriceChange(COMP_SITE, 2, 2109, 2089, False, now, now)])
+    alert_scheduler.rules_changed([rule.id])
+
+    evaluate = alert_scheduler.evaluate_and_notify_once
+
+    async def _broken(*a, **kw):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(alert_scheduler, "evaluate_and_notify_once", _broken)
+    with pytest.raises(RuntimeError):
+        await alert_scheduler._evaluate_pending()
+    assert alert_scheduler._pending_keys == {(COMP_SITE, 2)}
+    assert alert_scheduler._pending_rules == {rule.id}
+
+    # the next tick picks the same work up
+    monkeypatch.setattr(alert_scheduler, "evaluate_and_notify_once", evaluate)
+    await alert_scheduler._evaluate_pending()
+    await delivery_worker.deliver_pending_once()
+    assert [d["ruleId"] for d in alert_env] == [rule.id]
+    assert not alert_scheduler._pending_keys and not alert_scheduler._pending_rules
+
+
+@pytest.mark.anyio
+async def test_failed_delivery_is_retried_with_backoff(client, db_session, alert_env, monkeypatch):
+    from app.db.models_notifications import NotificationOutbox
+
+    await _seed_rule(client, db_session, own_price=2119.0, comp_price=2089.0)
+
+    async def _down(*a, **kw):
+        raise RuntimeError("expo down")
+
+    monkeypatch.setattr(delivery_worker, "send_expo_push", _down)
+    await _tick()
+
+    row = (await db_session.execute(NotificationOutbox.__table__.select())).one()
+    assert row.status == "pending"
+    assert row.attempts == 1
+    assert "expo down" in row.last_error
+    assert row.next_attempt_at > datetime.utcnow()
+
+    # not due yet -> nothing claimed
+    assert await delivery_worker.deliver_pending_once() == 0
+
+
+@pytest.mark.anyio
+async def test_retry_only_resends_to_channels_that_failed(client, db_session, alert_env, monkeypatch):
+    from app.db.models_notifications import NotificationOutbox
+
+    rule = await _seed_rule(client, db_session, own_price=2119.0, comp_price=2089.0)
+    db_session.add(UserDevice(
+        user_id=rule.user_id, kind="webpush",
+        webpush_endpoint="https://push.example/1", webpush_p256dh="k", webpush_auth="s",
+    ))
+    await db_session.commit()
+
+    web_calls = []
+
+    async def _web(subs, title, body, data=None):
+        web_calls.append([s["endpoint"] for s in subs])
+        if len(web_calls) == 1:
+            return PushResult(failed={s["endpoint"]: "HTTP 503" for s in subs})
+        return PushResult(done=[s["endpoint"] for s in subs])
+
+    monkeypatch.setattr(delivery_worker, "send_web_push", _web)
+    await _tick()
+    assert len(alert_env) == 1 and len(web_calls) == 1
+
+    row = (await db_session.execute(NotificationOutbox.__table__.select())).one()
+    assert row.status == "pending" and row.attempts == 1
+    assert row.delivered_to == [f"ExponentPushToken[{rule.user_id}]"]
+
+    await db_session.execute(NotificationOutbox.__table__.update().values(next_attempt_at=datetime(2000, 1, 1)))
+    await db_session.commit()
+    assert await delivery_worker.deliver_pending_once() == 1
+
+    # Expo already accepted it; only web push is tried again
+    assert len(alert_env) == 1
+    assert web_calls == [["https://push.example/1"], ["https://push.example/1"]]
+    row = (await db_session.execute(NotificationOutbox.__table__.select())).one()
+    assert row.status == "sent"
+
+
+@pytest.mark.anyio
+async def test_claim_only_takes_rows_still_due(client, db_session, alert_env):
+    from datetime import timedelta
+
+    from app.db.models_notifications import NotificationOutbox
+
+    await _seed_rule(client, db_session, own_price=2119.0, comp_price=2089.0)
+    await alert_scheduler.evaluate_and_notify_once()
+    now = datetime.utcnow()
+
+    class _Racing:
+        """
+        Another worker claims the row between our SELECT and our UPDATE.
+        """
+
+        raced = False
+
+        async def execute(self, stmt, *a, **kw):
+            if not self.raced and getattr(stmt, "is_update", False):
+                self.raced = True
+                await db_session.execute(
+                    NotificationOutbox.__table__.update().values(next_attempt_at=now + timedelta(minutes=2))
+                )
+            return await db_session.execute(stmt, *a, **kw)
+
+        async def commit(self):
+            await db_session.commit()
+
+    assert await delivery_worker._claim_batch(_Racing(), now) == []
+    assert len(await delivery_worker._claim_batch(db_session, now + timedelta(minutes=3))) == 1
+
+
+@pytest.mark.anyio
+async def test_triggered_conditions_coalesce_into_one_push_per_user(client, db_session, alert_env):
+    from app.db.models_notifications import NotificationOutbox
+
+    rule = await _seed_rule(client, db_session, own_price=2119.0, comp_price=2089.0)
+
+    # second condition on another fuel of the same rule, also triggered
+    now = datetime.utcnow()
+    for sid, price in ((OWN_SITE, 2219.0), (COMP_SITE, 2189.0)):
+        db_session.add(
+            PriceLatest(
+                site_id=sid, fuel_id=5, price_raw=price, price_cents=int(round(price)),
+                unavailable=False, transaction_date_utc=now, ingested_at=now,
+            )
+        )
+    db_session.add(
+        PricingRuleCondition(
+            rule_id=rule.id, own_fuel_id=5, competitor_fuel_id=5,
+            direction="OWN_MINUS_COMPETITOR", comparator="GT", threshold_cents=5,
+        )
+    )
+    await db_session.commit()
+
+    await alert_scheduler.evaluate_and_notify_once()
+    rows = (await db_session.execute(NotificationOutbox.__table__.select())).all()
+    assert len(rows) == 1
+
+    # a digest queued by an earlier tick for the same user is folded in too
+    db_session.add(NotificationOutbox(
+        user_id=rows[0].user_id, title="t", body="b",
+        data={"alerts": [{"ruleId": "r-old", "conditionId": "c-old", "ownedSiteId": "o", "ownedSite": OWN_SITE, "competitorSite": 1}]},
+    ))
+    await db_session.commit()
+
+    assert await delivery_worker.deliver_pending_once() == 2
+    assert len(alert_env) == 1
+    assert alert_env[0]["type"] == "digest"
+    assert alert_env[0]["count"] == 3
+    assert {a["ruleId"] for a in alert_env[0]["alerts"]} == {rule.id, "r-old"}
+
+
+@pytest.mark.anyio
+async def test_device_directory_groups_enabled_devices(db_session):
+    from app.notifications.device_directory import DeviceDirectory
+
+    user = User(email=f"dev_{uuid.uuid4().hex[:8]}@test.com", password_hash="x")
+    db_session.add(user)
+    await db_session.flush()
+    db_session.add_all([
+        UserDevice(user_id=user.id, kind="expo", expo_push_token="ExponentPushToken[a]"),
+        UserDevice(user_id=user.id, kind="expo", expo_push_token="ExponentPushToken[off]", is_enabled=False),
+        UserDevice(user_id=user.id, kind="webpush", webpush_endpoint="https://push.example/1", webpush_p256dh="k", webpush_auth="s"),
+    ])
+    await db_session.commit()
+
+    directory = DeviceDirectory()
+    devices = await directory.for_users(db_session, [user.id, "nobody"])
+    assert devices[user.id].expo_tokens == ["ExponentPushToken[a]"]
+    assert devices[user.id].webpush_subs == [
+        {"endpoint": "https://push.example/1", "keys": {"p256dh": "k", "auth": "s"}}
+    ]
+    assert devices["nobody"].empty
+
+    # served from cache until invalidated
+    db_session.add(UserDevice(user_id=user.id, kind="expo", expo_push_token="ExponentPushToken[b]"))
+    await db_session.commit()
+    assert len((await directory.for_users(db_session, [user.id]))[user.id].expo_tokens) == 1
+    directory.invalidate(user.id)
+    assert len((await directory.for_users(db_session, [user.id]))[user.id].expo_tokens) == 2
+
+
+@pytest.mark.anyio
+async def test_rule_index_recompiles_only_changed_rules(client, db_session, alert_env):
+    from app.notifications.rule_index import RuleIndex
+
+    rule = await _seed_rule(client, db_session, own_price=2119.0, comp_price=2089.0)
+    index = RuleIndex()
+    await index.ensure(db_session)
+    prices = {(OWN_SITE, 2): 2119, (COMP_SITE, 2): 2089}
+    assert index.evaluate(index.rows(), prices) == [True]
+
+    cond = rule.conditions[0]
+    cond.threshold_cents = 100
+    await db_session.commit()
+
+    index.invalidate_rules([rule.id])
+    await index.ensure(db_session)
+    rows = index.rows()
+    assert len(rows) == 1 and index.cond_ids[rows[0]] == cond.id
+    assert index.evaluate(rows, prices) == [False]
+    assert index.conditions_for_keys([(COMP_SITE, 2)]) == {cond.id}
+
+
+@pytest.mark.anyio
+async def test_rule_index_rebuild_keeps_invalidations_from_during_load(client, db_session, alert_env):
+    from app.notifications.rule_index import RuleIndex
+
+    rule = await _seed_rule(client, db_session, own_price=2119.0, comp_price=2089.0)
+    index = RuleIndex()
+    load = index._load
+
+    async def _load_then_invalidate(session, rule_ids=None):
+        rows = await load(session, rule_ids)
+        # a rule handler and a master sync land while the query is in flight
+        index.invalidate_rules([rule.id])
+        index.invalidate()
+        return rows
+
+    index._load = _load_then_invalidate
+    await index.ensure(db_session)
+    assert index.is_stale and rule.id in index._dirty_rules
+
+    index._load = load
+    await index.ensure(db_session)
+    assert not index.is_stale
+
+
+@pytest.mark.anyio
+async def test_worker_watches_change_logs(client, db_session, alert_env, monkeypatch):
+    import asyncio
+
+    from app.db.models.prices import PriceHistory
+    from app.notifications import worker
+    from app.services.rule_read_model import refresh_rule_read_models
+
+    rule = await _seed_rule(client, db_session, own_price=2119.0, comp_price=2089.0)
+    keys, rules = [], []
+
+    @asynccontextmanager
+    async def _session():
+        yield db_session
+
+    monkeypatch.setattr(worker, "SessionLocal", _session)
+    monkeypatch.setattr(worker, "CHANGE_POLL_SECONDS", 0.01)
+    monkeypatch.setattr(alert_scheduler, "queue_price_keys", lambda k: keys.extend(k))
+    monkeypatch.setattr(alert_scheduler, "rules_changed", lambda ids: rules.extend(ids))
+
+    watcher = asyncio.create_task(worker._watch_changes())
+    try:
+        await asyncio.sleep(0.05)
+        assert keys == [] and rules == []
+
+        # flipped to unavailable with an unchanged (older) transaction date
+        db_session.add(
+            PriceHistory(
+                site_id=COMP_SITE, fuel_id=2, price_cents=9999, unavailable=True,
+                transaction_date_utc=datetime(2020, 1, 1),
+            )
+        )
+        # a delete leaves no rule row behind, only the change log entry
+        await db_session.delete(rule)
+        await refresh_rule_read_models(db_session, [rule.id])
+        await db_session.commit()
+
+        for _ in range(100):
+            if keys and rules:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        watcher.cancel()
+
+    assert keys == [(COMP_SITE, 2)]
+    assert rules == [rule.id]
+
+
+@pytest.mark.anyio
+async def test_alert_latency_metrics(client, db_session, alert_env, monkeypatch):
+    from app.notifications import metrics
+
+    fresh = metrics.AlertMetrics()
+    monkeypatch.setattr(alert_scheduler, "alert_metrics", fresh)
+    monkeypatch.setattr(delivery_worker, "alert_metrics", fresh)
+    monkeypatch.setattr("app.api.v1.alert_metrics.alert_metrics", fresh)
+
+    await _seed_rule(client, db_session, own_price=2119.0, comp_price=2089.0)
+    await _tick()
+    # second tick: still triggered, inside cooldown
+    await _tick()
+
+    r = await client.get("/v1/admin/alerts/metrics")
+    assert r.status_code == 200
+    body = r.json()
+    assert [(t["evaluated"], t["triggered"], t["suppressed"], t["queued"]) for t in body["ticks"]] == [
+        (1, 1, 0, 1),
+        (1, 1, 1, 0),
+    ]
+    assert body["totals"]["sent"] == 1
+    for stage in metrics.STAGES:
+        assert body["stages"][stage]["count"] == 1
+    assert body["stages"]["endToEnd"]["worst"][0]["outboxId"]
+
+
+@pytest.mark.anyio
+async def test_alert_metrics_merge_external_workers(client, db_session, monkeypatch):
+    from app.core.settings import settings
+    from app.notifications import metrics, partitions
+
+    monkeypatch.setattr(settings, "ALERT_EXTERNAL_WORKERS", True)
+    for i, seconds in enumerate((1.0, 7.0)):
+        worker = metrics.AlertMetrics()
+        worker.record_tick(metrics.TickStats(at=datetime.utcnow(), evaluated=10, triggered=i + 1))
+        worker.stages["endToEnd"].observe(seconds, {"outboxId": f"o{i}"})
+        monkeypatch.setattr(partitions, "alert_metrics", worker)
+        await partitions.PartitionLeases(f"worker-{i}", partitions=2).renew_once(db_session)
+
+    body = (await client.get("/v1/admin/alerts/metrics")).json()
+    assert body["workers"] == ["worker-0", "worker-1"]
+    assert body["totals"]["evaluated"] == 20
+    assert [t["triggered"] for t in body["ticks"]] == [1, 2]
+    assert body["stages"]["endToEnd"]["count"] == 2
+    assert [w["outboxId"] for w in body["stages"]["endToEnd"]["worst"]] == ["o1", "o0"]
+
+
+@pytest.mark.anyio
+async def test_alert_state_is_written_behind(client, db_session, alert_env, monkeypatch):
+    rule = await _seed_rule(client, db_session, own_price=2119.0, comp_price=2089.0)
+
+    async def _state():
+        return (await db_session.execute(
+            RuleAlertState.__table__.select().where(RuleAlertState.rule_id == rule.id)
+        )).one()
+
+    # notifying transition is committed with its outbox row
+    await _tick()
+    assert (await _state()).is_currently_triggered
+
+    # steady state: no writes at all
+    writes = []
+    real_write = state_cache.write_states
+
+    async def _counting_write(session, states):
+        writes.append(len(states))
+        await real_write(session, states)
+
+    monkeypatch.setattr(alert_scheduler, "write_states", _counting_write)
+    await alert_scheduler.evaluate_and_notify_once()
+    assert writes == [0]
+
+    # clearing is kept in memory until the flush
+    await db_session.execute(
+        PriceLatest.__table__.update().where(PriceLatest.site_id == COMP_SITE).values(price_cents=2119)
+    )
+    await db_session.commit()
+    await alert_scheduler.evaluate_and_notify_once()
+    assert (await _state()).is_currently_triggered
+    assert alert_scheduler.state_cache.dirty_count == 1
+
+    assert await state_cache.flush_alert_state() == 1
+    assert not (await _state()).is_currently_triggered
+    assert alert_scheduler.state_cache.dirty_count == 0
+
+
+@pytest.mark.anyio
+async def test_trigger_transitions_update_rules_read_model(client, db_session, alert_env):
+    from app.db.models_rules import PricingRuleReadModel
+    from app.services.rule_read_model import refresh_rule_read_models
+
+    rule = await _seed_rule(client, db_session, own_price=2119.0, comp_price=2089.0)
+    await refresh_rule_read_models(db_session, [rule.id])
+    await db_session.commit()
+
+    await alert_scheduler.evaluate_and_notify_once()
+    row = await db_session.get(PricingRuleReadModel, rule.id)
+    await db_session.refresh(row)
+    assert row.triggered == [rule.conditions[0].id]
+    assert row.last_triggered_at is not None
+
+
+def test_digest_counts_every_alert_and_fits_push_payload_limit():
+    from app.api.responses import dumps
+    from app.notifications.digest import DIGEST_MAX_BYTES, build_digest, merge_digests
+
+    alerts = [
+        {
+            "ruleId": str(uuid.uuid4()), "conditionId": str(uuid.uuid4()), "ownedSiteId": str(uuid.uuid4()),
+            "ownedSite": OWN_SITE, "competitorSite": 61400000 + i,
+        }
+        for i in range(200)
+    ]
+    title, body, data = build_digest(alerts)
+    assert title == "200 fuel alerts triggered"
+    assert data["count"] == 200 and data["hasMore"] is True
+    assert 0 < len(data["alerts"]) < 200
+    assert len(dumps({"title": title, "body": body, "data": data})) <= DIGEST_MAX_BYTES
+
+    # unlisted alerts of queued digests still count once merged
+    title, _, merged = merge_digests([data, build_digest(alerts[:2])[2]])
+    assert merged["count"] == 200
+    assert title == "200 fuel alerts triggered"
+
+    _, _, small = build_digest(alerts[:3])
+    assert small["count"] == 3 and small["hasMore"] is False and len(small["alerts"]) == 3
+
+
+def test_init_db_keeps_newest_duplicate_alert_state(tmp_path):
+    from sqlalchemy import create_engine, text
+
+    from app.db.base import Base
+    from app.db.init_db import _create_missing_indexes, _dedupe_rule_alert_state
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        # a database from before the unique index, with a duplicated pair
+        Base.metadata.create_all(conn)
+        conn.execute(text("DROP INDEX uq_rule_alert_state_rule_condition"))
+        for sid, triggered in (("s-old", 0), ("s-new", 1)):
+            conn.execute(text(
+                "INSERT INTO rule_alert_state (id, user_id, rule_id, condition_id, is_currently_triggered) "
+                "VALUES (:id, 'u', 'r', 'c', :t)"
+            ), {"id": sid, "t": triggered})
+
+        _dedupe_rule_alert_state(conn)
+        _create_missing_indexes(conn)
+
+        rows = conn.execute(text("SELECT id, is_currently_triggered FROM rule_alert_state")).all()
+    engine.dispose()
+    assert rows == [("s-new", 1)]
+
+
+@pytest.mark.anyio
+async def test_delivery_worker_wakeups(monkeypatch):
+    import asyncio
+
+    monkeypatch.setattr(delivery_worker, "DELIVERY_POLL_SECONDS", 60)
+
+    async def _rounds(wake_in_first_round: bool) -> int:
+        rounds = []
+
+        async def _deliver(partitions=None):
+            rounds.append(partitions)
+            if wake_in_first_round and len(rounds) == 1:
+                # outbox rows committed while this round is still sending
+                delivery_worker.wake()
+            return 0
+
+        monkeypatch.setattr(delivery_worker, "deliver_pending_once", _deliver)
+        task = asyncio.create_task(delivery_worker.start_delivery_worker())
+        try:
+            await asyncio.sleep(0.05)
+        finally:
+            task.cancel()
+        return len(rounds)
+
+    # a wake() from before a drain is covered by it: no extra round
+    delivery_worker.wake()
+    assert await _rounds(False) == 1
+    # one during the drain gets a round of its own
+    assert await _rounds(True) == 2
@@ -15,3 +15,77 @@ async def test_catalog_endpoints(client):
     r = await client.get("/v1/catalog/sites/search", params={"q": "7"})
     assert r.status_code == 200, r.text
     assert isinstance(r.json(), list)
+
+
+@pytest.mark.anyio
+async def test_nearby_columnar_format(client):
+    await client.post("/v1/admin/sync/master")
+    await client.post("/v1/admin/sync/prices")
+
+    params = {"lat": -27.8687, "lng": 153.3142, "radius_km": 5, "include_prices": True}
+
+    r = await client.get("/v1/catalog/sites/nearby", params=params)
+    assert r.status_code == 200, r.text
+    rows = r.json()
+    assert rows["count"] == 1
+    assert rows["sites"][0]["siteId"] == 61401007
+
+    r = await client.get("/v1/catalog/sites/nearby", params={**params, "format": "columnar"})
+    assert r.status_code == 200, r.text
+    cols = r.json()
+    assert cols["format"] == "columnar"
+    assert cols["sites"]["siteId"] == [61401007]
+    assert cols["sites"]["prices"][0][0]["priceCents"] == 2119
+
+    r = await client.get("/v1/catalog/sites/nearby", params={**params, "format": "xml"})
+    assert r.status_code == 422
+
+
+@pytest.mark.anyio
+async def test_search_sparse_fields(client):
+    await client.post("/v1/admin/sync/master")
+
+    r = await client.get("/v1/catalog/sites/search", params={"q": "7", "fields": "SiteId,Name"})
+    assert r.status_code == 200, r.text
+    assert r.json() == [{"SiteId": 61401007, "Name": "7-Eleven Coomera"}]
+
+    r = await client.get("/v1/catalog/sites/search", params={"fields": "SiteId,Nope"})
+    assert r.status_code == 400, r.text
+
+
+@pytest.mark.anyio
+async def test_search_keyset_cursor(client, db_session):
+    from app.db.models.master import Site
+
+    await client.post("/v1/admin/sync/master")
+    for i in range(3):
+        db_session.add(
+            Site(site_id=900 + i, name="Zeta Fuel", address="Main St", brand_id=113, postcode="4000", lat=-27.86, lng=153.31)
+        )
+    await db_session.commit()
+
+    seen = []
+    cursor = None
+    for _ in range(5):
+        params = {"q": "Zeta", "limit": 2, "fields": "SiteId"}
+        if cursor:
+            params["cursor"] = cursor
+        r = await client.get("/v1/catalog/sites/search", params=params)
+        assert r.status_code == 200, r.text
+        seen += [x["SiteId"] for x in r.json()]
+        cursor = r.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+
+    assert seen == [900, 901, 902]
+
+    r = await client.get("/v1/catalog/sites/search", params={"cursor": "not-a-cursor"})
+    assert r.status_code == 400
+
+    params = {"lat": -27.8687, "lng": 153.3142, "radius_km": 5, "limit": 2, "fields": "siteId,distanceKm"}
+    r1 = await client.get("/v1/catalog/sites/nearby", params=params)
+    page1 = r1.json()
+    r2 = await client.get("/v1/catalog/sites/nearby", params={**params, "cursor": page1["nextCursor"]})
+    page2 = r2.json()
+    assert [s["siteId"] for s in page1["sites"] + page2["sites"]] == [61401007, 900, 901, 902]
+    assert page2["nextCursor"] is None
@@ -0,0 +1,108 @@
+# tests/test_competitive_rank.py
+from datetime import datetime
+
+import pytest
+
+from app.db.models.master import Site
+from app.db.models.prices import PriceLatest
+from app.ingestion.events import PriceChange
+from app.services.competitive_rank import NEAREST_K, competitive_ranking
+
+
+OWN_SITE = 61401007   # synced by /admin/sync/master at -27.868671, 153.314236
+
+
+@pytest.mark.anyio
+async def test_ranking_is_precomputed_and_follows_price_changes(client, db_session):
+    from test_rules import _auth_headers, _insert_owned_site, _me, _register_and_login
+
+    competitive_ranking.invalidate()
+    token = await _register_and_login(client)
+    me = await _me(client, token)
+    await client.post("/v1/admin/sync/master")
+    await client.post("/v1/admin/sync/prices")   # own: 2119
+
+    now = datetime.utcnow()
+    # nearby sites; the far one only counts once a rule names it
+    nearby = [(61402000 + i, 2000 + 50 * i) for i in range(NEAREST_K + 2)]   # 2000, 2050, 2100, 2150, ...
+    for i, (sid, price) in enumerate(nearby):
+        db_session.add(Site(site_id=sid, name=f"Near {i}", address="x", brand_id=113, postcode="4209",
+                            lat=-27.868671 + 0.001 * (i + 1), lng=153.314236))
+        db_session.add(PriceLatest(site_id=sid, fuel_id=2, price_raw=price, price_cents=price,
+                                   unavailable=False, transaction_date_utc=now, ingested_at=now))
+    db_session.add(Site(site_id=61409999, name="Far", address="x", brand_id=113, postcode="4000", lat=-20.0, lng=140.0))
+    db_session.add(PriceLatest(site_id=61409999, fuel_id=2, price_raw=1900, price_cents=1900,
+                               unavailable=False, transaction_date_utc=now, ingested_at=now))
+    await db_session.commit()
+    owned_site_id = await _insert_owned_site(db_session, user_id=me["id"], site_id=OWN_SITE)
+
+    r = await client.get(f"/v1/me/owned-sites/{owned_site_id}/ranking", headers=_auth_headers(token))
+    assert r.status_code == 200, r.text
+    (ulp,) = r.json()["fuels"]
+    # nearest 10 are 2000..2450; 2000, 2050 and 2100 are cheaper than 2119
+    assert (ulp["rank"], ulp["of"], ulp["percentile"], ulp["cheapestCents"]) == (4, NEAREST_K + 1, 70, 2000)
+
+    # a rule competitor joins the set
+    r = await client.post("/v1/me/rules", headers=_auth_headers(token), json={
+        "ownedSiteId": owned_site_id, "competitorSiteId": 61409999, "name": "far",
+        "conditions": [{"ownFuelId": 2, "competitorFuelId": 2, "direction": "COMPETITOR_MINUS_OWN",
+                        "comparator": "LT", "thresholdCents": 5}],
+    })
+    assert r.status_code == 200, r.text
+    r = await client.get(f"/v1/me/owned-sites/{owned_site_id}/ranking", headers=_auth_headers(token))
+    assert r.json()["fuels"][0]["rank"] == 5
+
+    # ingestion moves only the ranks reading the changed site
+    assert competitive_ranking.apply_changes([PriceChange(OWN_SITE, 2, 2119, 1899, False, now, now)]) == 1
+    assert competitive_ranking.apply_changes([PriceChange(99999999, 2, None, 1000, False, now, now)]) == 0
+    (ulp,) = competitive_ranking.ranks_for(owned_site_id)
+    assert (ulp["rank"], ulp["percentile"], ulp["priceCents"]) == (1, 100, 1899)
+
+    r = await client.get("/v1/me/dashboard", headers=_auth_headers(token))
+    assert r.json()["ownedSites"][0]["ranking"][0]["rank"] == 1
+
+
+@pytest.mark.anyio
+async def test_ranking_builds_once_and_keeps_changes_seen_meanwhile(client, db_session, monkeypatch):
+    import asyncio
+
+    from test_rules import _insert_owned_site, _me, _register_and_login
+
+    from app.ingestion import events
+    from app.services.competitive_rank import CompetitiveRanking, on_master_synced
+
+    token = await _register_and_login(client)
+    me = await _me(client, token)
+    await client.post("/v1/admin/sync/master")
+    await client.post("/v1/admin/sync/prices")   # own: 2119
+    now = datetime.utcnow()
+    db_session.add(Site(site_id=61403000, name="Near", address="x", brand_id=113, postcode="4209",
+                        lat=-27.8687, lng=153.3143))
+    db_session.add(PriceLatest(site_id=61403000, fuel_id=2, price_raw=2000, price_cents=2000,
+                               unavailable=False, transaction_date_utc=now, ingested_at=now))
+    await db_session.commit()
+    owned_site_id = await _insert_owned_site(db_session, user_id=me["id"], site_id=OWN_SITE)
+
+    ranking = CompetitiveRanking()
+    first = asyncio.create_task(ranking.ensure(db_session))
+    await asyncio.sleep(0)   # first build is waiting on the DB
+    # a price change published mid-build, and a reader arriving meanwhile
+    ranking.apply_changes([PriceChange(OWN_SITE, 2, 2119, 1899, False, now, now)])
+    await ranking.ensure(db_session)
+    (ulp,) = ranking.ranks_for(owned_site_id)
+    assert (ulp["rank"], ulp["of"], ulp["priceCents"]) == (1, 2, 1899)
+    await first
+
+    # master sync: the new nearby site joins the set once the ranking rebuilds
+    monkeypatch.setattr(events, "_master_listeners", [on_master_synced])
+    monkeypatch.setattr("app.services.competitive_rank.competitive_ranking", ranking)
+    db_session.add(Site(site_id=61403001, name="Newer", address="x", brand_id=113, postcode="4209",
+                        lat=-27.8688, lng=153.3144))
+    db_session.add(PriceLatest(site_id=61403001, fuel_id=2, price_raw=2500, price_cents=2500,
+                               unavailable=False, transaction_date_utc=now, ingested_at=now))
+    await db_session.commit()
+    await client.post("/v1/admin/sync/master")
+    await ranking.ensure(db_session)
+    (ulp,) = ranking.ranks_for(owned_site_id)
+    # prices reloaded from the DB: own 2119 (the change above was never stored)
+    assert (ulp["rank"], ulp["of"]) == (2, 3)
@@ -0,0 +1,88 @@
+# tests/test_export.py
+import gzip
+import json
+from contextlib import asynccontextmanager
+
+import pytest
+
+
+@pytest.fixture()
+def export_session(db_session, monkeypatch):
+    """
+    Export streams open their own session (SessionLocal); point it at the test session.
+    """
+    from app.api.v1 import export
+
+    @asynccontextmanager
+    async def _session():
+        yield db_session
+
+    monkeypatch.setattr(export, "SessionLocal", _session)
+
+
+@pytest.mark.anyio
+async def test_export_prices_ndjson(client, export_session):
+    await client.post("/v1/admin/sync/master")
+    await client.post("/v1/admin/sync/prices")
+
+    r = await client.get("/v1/export/prices")
+    assert r.status_code == 200, r.text
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+
+    version = r.headers["X-Snapshot-Version"]
+    lines = [json.loads(x) for x in r.text.splitlines()]
+    assert len(lines) == 1
+    assert lines[0]["SiteId"] == 61401007
+    assert lines[0]["PriceCents"] == 2119
+
+    # unchanged data -> 304
+    r = await client.get("/v1/export/prices", headers={"If-None-Match": f'"{version}"'})
+    assert r.status_code == 304
+
+
+@pytest.mark.anyio
+async def test_export_prices_version_moves_on_unavailable_flip(client, db_session, export_session):
+    from datetime import datetime, timedelta
+
+    from sqlalchemy import select, update
+
+    from app.db.models.prices import PriceHistory, PriceLatest
+
+    await client.post("/v1/admin/sync/master")
+    await client.post("/v1/admin/sync/prices")
+    version = (await client.get("/v1/export/prices")).headers["X-Snapshot-Version"]
+
+    # a cycle with no price change only re-stamps ingested_at
+    await client.post("/v1/admin/sync/prices")
+    r = await client.get("/v1/export/prices", headers={"If-None-Match": f'"{version}"'})
+    assert r.status_code == 304
+
+    # flipped to unavailable, keeping the old transaction date (as ingestion writes it)
+    now = datetime.utcnow() + timedelta(seconds=1)
+    latest = (await db_session.execute(select(PriceLatest))).scalar_one()
+    await db_session.execute(update(PriceLatest).values(unavailable=True, ingested_at=now))
+    db_session.add(PriceHistory(
+        site_id=latest.site_id, fuel_id=latest.fuel_id, old_price_cents=latest.price_cents,
+        price_cents=latest.price_cents, unavailable=True,
+        transaction_date_utc=latest.transaction_date_utc, ingested_at=now,
+    ))
+    await db_session.commit()
+
+    r = await client.get("/v1/export/prices", headers={"If-None-Match": f'"{version}"'})
+    assert r.status_code == 200
+    assert r.headers["X-Snapshot-Version"] != version
+    assert json.loads(r.text.splitlines()[0])["Unavailable"] is True
+
+
+@pytest.mark.anyio
+async def test_export_sites_csv_gz(client, export_session):
+    await client.post("/v1/admin/sync/master")
+
+    r = await client.get("/v1/export/sites", params={"format": "csv"}, headers={"Accept-Encoding": "gzip"})
+    assert r.status_code == 200, r.text
+    # the file is the gzip; the middleware must not wrap it in a second one
+    assert "content-encoding" not in r.headers
+
+    rows = gzip.decompress(r.content).decode("utf-8").splitlines()
+    assert rows[0].startswith("SiteId,Name")
+    assert rows[1].startswith("61401007,7-Eleven Coomera")
@@ -25,3 +25,47 @@ async def test_me_with_token(client):
     assert r2.status_code == 200
     data = r2.json()
     assert "email" in data
+
+
+@pytest.mark.anyio
+async def test_owner_dashboard(client, db_session):
+    from datetime import datetime
+
+    from app.db.models.master import Site
+    from app.db.models.prices import PriceLatest
+    from test_rules import _auth_headers, _insert_owned_site, _me, _register_and_login
+
+    token = await _register_and_login(client)
+    me = await _me(client, token)
+    await client.post("/v1/admin/sync/master")
+    await client.post("/v1/admin/sync/prices")   # own site 61401007: 2119
+
+    now = datetime.utcnow()
+    db_session.add(Site(site_id=61401010, name="Rival", address="x", brand_id=113, postcode="4209", lat=0, lng=0))
+    db_session.add(PriceLatest(site_id=61401010, fuel_id=2, price_raw=2089.0, price_cents=2089,
+                               unavailable=False, transaction_date_utc=now, ingested_at=now))
+    await db_session.commit()
+    owned_site_id = await _insert_owned_site(db_session, user_id=me["id"], site_id=61401007)
+
+    r = await client.post("/v1/me/rules", headers=_auth_headers(token), json={
+        "ownedSiteId": owned_site_id,
+        "competitorSiteId": 61401010,
+        "name": "Undercut",
+        "conditions": [{
+            "ownFuelId": 2, "competitorFuelId": 2,
+            "direction": "OWN_MINUS_COMPETITOR", "comparator": "GT", "thresholdCents": 5,
+        }],
+    })
+    assert r.status_code == 200, r.text
+
+    r = await client.get("/v1/me/dashboard", headers=_auth_headers(token))
+    assert r.status_code == 200, r.text
+    (site,) = r.json()["ownedSites"]
+    assert site["siteName"] == "7-Eleven Coomera"
+    assert [(p["fuelName"], p["priceCents"]) for p in site["prices"]] == [("Unleaded", 2119)]
+
+    (rule,) = site["rules"]
+    assert rule["competitorSite"]["siteName"] == "Rival"
+    (cond,) = rule["conditions"]
+    assert (cond["ownPriceCents"], cond["competitorPriceCents"], cond["diffCents"]) == (2119, 2089, 30)
+    assert cond["firesNow"] is True and cond["isTriggered"] is False
@@ -0,0 +1,43 @@
+# tests/test_partitions.py
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from app.db.models_notifications import AlertPartitionLease, AlertWorker
+from app.notifications.partitions import PartitionLeases, partition_of
+
+
+def test_partition_of_is_stable():
+    assert partition_of("user-1", 16) == partition_of("user-1", 16)
+    assert {partition_of(f"user-{i}", 4) for i in range(100)} == {0, 1, 2, 3}
+
+
+@pytest.mark.anyio
+async def test_leases_rebalance_and_fence(db_session):
+    a = PartitionLeases("worker-a", partitions=4)
+    b = PartitionLeases("worker-b", partitions=4)
+
+    assert await a.renew_once(db_session) == {0, 1, 2, 3}
+    # everything is held by a live worker -> nothing for b yet
+    assert await b.renew_once(db_session) == set()
+
+    # a sees two live workers and hands back its surplus; b picks it up
+    await a.renew_once(db_session)
+    assert len(a.owned) == 2
+    assert await b.renew_once(db_session) == {0, 1, 2, 3} - a.owned
+    assert await a.verify(db_session)
+
+    # a stops renewing: once its leases lapse b takes over and a is fenced out
+    lapsed = datetime.utcnow() - timedelta(minutes=5)
+    await db_session.execute(
+        update(AlertPartitionLease).where(AlertPartitionLease.owner == "worker-a").values(expires_at=lapsed)
+    )
+    await db_session.execute(
+        update(AlertWorker).where(AlertWorker.worker_id == "worker-a").values(heartbeat_at=lapsed)
+    )
+    await db_session.commit()
+    await b.renew_once(db_session)
+    assert b.owned == {0, 1, 2, 3}
+    assert not await a.verify(db_session)
+    assert a.owned == set()
@@ -0,0 +1,77 @@
+# tests/test_price_movers.py
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.db.models.prices import PriceHistory
+from app.ingestion.events import PriceChange
+from app.services.price_movers import PriceMovers
+
+
+def _change(site, old, new, at, *, unavailable=False, old_unavailable=False):
+    return PriceChange(site, 2, old, new, unavailable, at, at, old_unavailable)
+
+
+def test_movers_slide_out_of_windows():
+    movers = PriceMovers()
+    movers._regions.update({1: (11, 21, 31), 2: (12, 21, 31), 3: (13, 22, 31)})
+    t0 = datetime(2026, 3, 1, 8, 0)
+
+    movers.apply_changes([
+        _change(1, 2000, 2100, t0),                       # +100
+        _change(2, 2000, 1950, t0),                       # -50
+        _change(3, 9999, 1500, t0, old_unavailable=True), # back from unavailable: not a move
+    ])
+    movers.apply_changes([
+        _change(1, 2100, 2120, t0 + timedelta(minutes=30)),   # net +120
+        _change(3, 1500, 1530, t0 + timedelta(minutes=30)),   # +30
+        _change(2, 1950, 9999, t0 + timedelta(minutes=31), unavailable=True),
+    ])
+
+    now = t0 + timedelta(minutes=40)
+    out = movers.movers("1h", 2, now=now)
+    assert [(m["siteId"], m["changeCents"], m["priceCents"]) for m in out["rises"]] == [(1, 120, 2120), (3, 30, 1530)]
+    assert [(m["siteId"], m["changeCents"]) for m in out["drops"]] == [(2, -50)]
+
+    # city 21 holds sites 1 and 2 only
+    out = movers.movers("1h", 2, region_level=2, region_id=21, now=now)
+    assert [m["siteId"] for m in out["rises"]] == [1] and [m["siteId"] for m in out["drops"]] == [2]
+
+    # an hour after the first changes they have left the 1h window but not the 24h one
+    later = t0 + timedelta(minutes=75)
+    out = movers.movers("1h", 2, now=later)
+    assert [(m["siteId"], m["changeCents"]) for m in out["rises"]] == [(3, 30), (1, 20)]
+    assert out["drops"] == []
+    assert movers.movers("24h", 2, limit=1, now=later)["rises"][0]["changeCents"] == 120
+
+
+@pytest.mark.anyio
+async def test_movers_warm_from_history_and_endpoint(client, db_session, monkeypatch):
+    from app.api.v1 import prices as prices_api
+
+    await client.post("/v1/admin/sync/master")
+    now = datetime.utcnow()
+    for minutes_ago, old, new in ((300, None, 2000), (90, 2000, 2080), (20, 2080, 2040)):
+        at = now - timedelta(minutes=minutes_ago)
+        db_session.add(PriceHistory(site_id=61401007, fuel_id=2, old_price_cents=old, price_cents=new,
+                                    unavailable=False, transaction_date_utc=at, ingested_at=at))
+    # backfilled: reported days late, ingested 10 minutes ago
+    db_session.add(PriceHistory(site_id=61401007, fuel_id=3, old_price_cents=1900, price_cents=1950,
+                                unavailable=False, transaction_date_utc=now - timedelta(days=3),
+                                ingested_at=now - timedelta(minutes=10)))
+    await db_session.commit()
+
+    movers = PriceMovers()
+    await movers.warm(db_session, now)
+    assert [(m["siteId"], m["changeCents"]) for m in movers.movers("1h", 3, now=now)["rises"]] == [(61401007, 50)]
+    monkeypatch.setattr(prices_api, "price_movers", movers)
+
+    r = await client.get("/v1/prices/movers", params={"fuelId": 2, "window": "24h", "regionLevel": 3, "regionId": 1})
+    assert r.status_code == 200, r.text
+    assert [(m["siteId"], m["changeCents"]) for m in r.json()["rises"]] == [(61401007, 40)]
+
+    r = await client.get("/v1/prices/movers", params={"fuelId": 2})
+    assert [(m["siteId"], m["changeCents"]) for m in r.json()["drops"]] == [(61401007, -40)]
+
+    r = await client.get("/v1/prices/movers", params={"fuelId": 2, "window": "1w"})
+    assert r.status_code == 422
@@ -0,0 +1,138 @@
+# tests/test_push_service.py
+import json
+
+import httpx
+import pytest
+
+from app.services import push_service
+
+
+def _client(handler, dead):
+    async def _on_dead(tokens):
+        dead.extend(tokens)
+
+    return push_service.ExpoPushClient(transport=httpx.MockTransport(handler), on_dead_tokens=_on_dead)
+
+
+@pytest.mark.anyio
+async def test_expo_client_chunks_and_dead_tokens():
+    posted = []
+    dead = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/getReceipts"):
+            ids = json.loads(request.content)["ids"]
+            return httpx.Response(200, json={"data": {
+                i: ({"status": "error", "details": {"error": "DeviceNotRegistered"}} if i == "r-1" else {"status": "ok"})
+                for i in ids
+            }})
+
+        chunk = json.loads(request.content)
+        posted.append(len(chunk))
+        tickets = []
+        for m in chunk:
+            if m["to"] == "ExponentPushToken[gone]":
+                tickets.append({"status": "error", "message": "gone", "details": {"error": "DeviceNotRegistered"}})
+            else:
+                tickets.append({"status": "ok", "id": f"r-{m['to'][18:-1]}"})
+        return httpx.Response(200, json={"data": tickets})
+
+    client = _client(handler, dead)
+    messages = [{"to": f"ExponentPushToken[{i}]"} for i in range(250)] + [{"to": "ExponentPushToken[gone]"}]
+    result = await client.send(messages)
+
+    assert sorted(posted) == [51, 100, 100]
+    assert dead == ["ExponentPushToken[gone]"]
+    # a dead token is done too: it's disabled, never retried
+    assert len(result.done) == 251 and result.failed == {}
+
+    # receipts aren't due yet
+    assert await client.check_receipts_once() == 0
+
+    # make every receipt due
+    for rid, (tok, _) in list(client._pending_receipts.items()):
+        client._pending_receipts[rid] = (tok, 0.0)
+    assert await client.check_receipts_once() == 250
+    assert dead == ["ExponentPushToken[gone]", "ExponentPushToken[1]"]
+
+    await client.aclose()
+
+
+@pytest.mark.anyio
+async def test_expo_client_fails_only_the_tokens_of_a_failed_chunk():
+    dead = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        chunk = json.loads(request.content)
+        if chunk[0]["to"] == "ExponentPushToken[100]":
+            return httpx.Response(503)
+        return httpx.Response(200, json={"data": [
+            {"status": "error", "message": "slow down", "details": {"error": "MessageRateExceeded"}}
+            if m["to"] == "ExponentPushToken[7]" else {"status": "ok", "id": m["to"]}
+            for m in chunk
+        ]})
+
+    client = _client(handler, dead)
+    result = await client.send([{"to": f"ExponentPushToken[{i}]"} for i in range(150)])
+
+    assert len(result.done) == 99
+    assert sorted(result.failed) == sorted(
+        [f"ExponentPushToken[{i}]" for i in range(100, 150)] + ["ExponentPushToken[7]"]
+    )
+    assert result.failed["ExponentPushToken[7]"] == "slow down"
+    assert "503" in result.failed["ExponentPushToken[120]"]
+    assert dead == []
+    await client.aclose()
+
+
+@pytest.mark.anyio
+async def test_web_push_runs_off_loop_and_prunes_gone(monkeypatch):
+    sent = []
+    pruned = []
+
+    class _Resp:
+        def __init__(self, status_code):
+            self.status_code = status_code
+
+    class _FakePusher:
+        def __init__(self, sub):
+            self.sub = sub
+
+        def send(self, payload, **kwargs):
+            sent.append((self.sub["endpoint"], kwargs["headers"]["Authorization"]))
+            return _Resp(410 if self.sub["endpoint"].endswith("/gone") else 201)
+
+    class _FakeVapid:
+        signed = 0
+
+        @classmethod
+        def from_string(cls, private_key):
+            return cls()
+
+        def sign(self, claims):
+            _FakeVapid.signed += 1
+            return {"Authorization": f"vapid t={claims['aud']}"}
+
+    async def _prune(endpoints):
+        pruned.extend(endpoints)
+
+    monkeypatch.setattr(push_service, "WebPusher", _FakePusher)
+    monkeypatch.setattr(push_service, "Vapid", _FakeVapid)
+    monkeypatch.setattr(push_service, "VAPID_PUBLIC_KEY", "pub")
+    monkeypatch.setattr(push_service, "VAPID_PRIVATE_KEY", "priv")
+    monkeypatch.setattr(push_service, "_vapid_signer", None)
+    monkeypatch.setattr(push_service, "_vapid_headers", {})
+    monkeypatch.setattr(push_service, "prune_webpush_endpoints", _prune)
+
+    subs = [
+        {"endpoint": "https://fcm.googleapis.com/fcm/send/a", "keys": {}},
+        {"endpoint": "https://fcm.googleapis.com/fcm/send/b", "keys": {}},
+        {"endpoint": "https://updates.push.services.mozilla.com/gone", "keys": {}},
+    ]
+    result = await push_service.send_web_push(subs, title="t", body="b")
+
+    assert len(sent) == 3
+    assert len(result.done) == 3 and result.failed == {}
+    assert pruned == ["https://updates.push.services.mozilla.com/gone"]
+    # one signature per push-service origin
+    assert _FakeVapid.signed == 2
@@ -0,0 +1,100 @@
+# tests/test_rule_backtest.py
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+from app.db.models.master import Site
+from app.db.models.prices import PriceHistory
+
+
+OWN_SITE = 61401007
+COMP_SITE = 61401009
+
+
+def test_backtest_replays_changes_with_cooldown():
+    from app.services.rule_backtest import BacktestCondition, backtest
+
+    t0 = datetime(2026, 1, 1)
+    own, comp = (OWN_SITE, 2), (COMP_SITE, 2)
+    series = {
+        own: [(t0, 2000), (t0 + timedelta(hours=3), 2000)],
+        comp: [
+            (t0, 2000),
+            (t0 + timedelta(minutes=10), 2100),   # diff 100 -> trigger
+            (t0 + timedelta(minutes=100), 2000),  # back to 0 -> clears
+            (t0 + timedelta(minutes=200), 2200),  # trigger again
+        ],
+    }
+    cond = BacktestCondition("c1", own, comp, "COMPETITOR_MINUS_OWN", "GT", 50)
+    out = backtest([cond], series, t0, t0 + timedelta(minutes=240), timedelta(minutes=30))
+
+    # trigger at 10, cooldown re-notifies at 40 and 70, clear at 100, trigger at 200, re-notify at 230
+    assert [(e["kind"], e["at"][11:16]) for e in out["events"]] == [
+        ("trigger", "00:10"), ("cooldown", "00:40"), ("cooldown", "01:10"),
+        ("trigger", "03:20"), ("cooldown", "03:50"),
+    ]
+    c = out["conditions"][0]
+    assert (c["triggers"], c["cooldownRenotifies"], c["notifications"]) == (2, 3, 5)
+    assert c["triggeredMinutes"] == 130.0 and c["triggeredAtEnd"] is True
+    assert out["priceChanges"] == 6
+
+
+@pytest.mark.anyio
+async def test_backtest_endpoint(client, db_session):
+    from test_rules import _insert_owned_site, _me, _register_and_login
+
+    token = await _register_and_login(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    me = await _me(client, token)
+
+    await client.post("/v1/admin/sync/master")
+    # ingestion records the changes it sees
+    await client.post("/v1/admin/sync/prices")
+    recorded = (
+        await db_session.execute(select(PriceHistory.price_cents).where(PriceHistory.site_id == OWN_SITE))
+    ).scalars().all()
+    assert 2119 in recorded
+
+    db_session.add(Site(site_id=COMP_SITE, name="Comp", address="x", brand_id=113, postcode="4209", lat=0, lng=0))
+    now = datetime.utcnow()
+    for minutes_ago, price in ((120, 2200), (60, 2100)):
+        db_session.add(
+            PriceHistory(site_id=COMP_SITE, fuel_id=2, price_cents=price, unavailable=False,
+                         transaction_date_utc=now - timedelta(minutes=minutes_ago), ingested_at=now)
+        )
+    # own price in effect before the window starts
+    db_session.add(
+        PriceHistory(site_id=OWN_SITE, fuel_id=2, price_cents=2000, unavailable=False,
+                     transaction_date_utc=now - timedelta(days=40), ingested_at=now)
+    )
+    await db_session.commit()
+
+    owned_site_id = await _insert_owned_site(db_session, user_id=me["id"], site_id=OWN_SITE)
+    r = await client.post("/v1/me/rules", headers=headers, json={
+        "ownedSiteId": owned_site_id,
+        "competitorSiteId": COMP_SITE,
+        "name": "comp dearer",
+        "conditions": [{
+            "ownFuelId": 2, "competitorFuelId": 2,
+            "direction": "COMPETITOR_MINUS_OWN", "comparator": "GT", "thresholdCents": 150,
+        }],
+    })
+    assert r.status_code == 200, r.text
+    rule_id = r.json()["id"]
+
+    r = await client.get(f"/v1/me/rules/{rule_id}/backtest?days=30", headers=headers)
+    assert r.status_code == 200, r.text
+    data = r.json()
+    assert data["ruleId"] == rule_id
+    # the synced own price (2119, stamped 2026-01-16) is outside the window;
+    # +200 triggers, +100 clears it
+    assert data["conditions"][0]["triggers"] == 1
+    assert data["conditions"][0]["cooldownRenotifies"] == 1
+
+    # a looser threshold keeps it triggered
+    r = await client.get(f"/v1/me/rules/{rule_id}/backtest?days=30&thresholdCents=50", headers=headers)
+    assert r.json()["conditions"][0]["triggeredAtEnd"] is True
+
+    r = await client.get("/v1/me/rules/nope/backtest", headers=headers)
+    assert r.status_code == 404
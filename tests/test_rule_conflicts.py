@@ -37,3 +37,123 @@ async def test_rule_conflicts_endpoint_behaviour(client):
         for key in ["ruleId", "conflictType", "message"]:
             if key in item:
                 assert item[key] is not None
+
+
+def test_find_conflicts_interval_analysis():
+    from app.services.rule_conflicts import ConditionRow, find_conflicts
+
+    def cond(rule, cid, comparator, threshold, direction="COMPETITOR_MINUS_OWN", comp_site=2):
+        return ConditionRow(rule, rule, cid, "owned-1", 1, comp_site, 2, 2, direction, comparator, threshold)
+
+    conditions = [
+        cond("r-a", "a1", "GT", 4),
+        cond("r-b", "b1", "GTE", 5),                             # same prices as r-a
+        cond("r-c", "c1", "LT", -20, "OWN_MINUS_COMPETITOR"),    # comp - own > 20: overlaps r-a / r-b / e1
+        cond("r-d", "d1", "LTE", -5),                            # disjoint from the above, overlaps e2
+        cond("r-e", "e1", "GT", 10),
+        cond("r-e", "e2", "LT", 0),                              # fires on its own, not a conflict with e1
+        cond("r-f", "f1", "GT", 0, comp_site=1),                 # own site vs itself
+        cond("r-g", "g1", "GT", 15, comp_site=3),                # competitor 3 has no price
+        cond("r-h", "h1", "GT", 30, comp_site=3),
+    ]
+    out = find_conflicts(conditions, priced={(1, 2), (2, 2)})
+    by_type = {}
+    for item in out:
+        by_type.setdefault(item["conflictType"], []).append(item)
+
+    assert [(d["ruleId"], d["relatedRuleIds"]) for d in by_type["DUPLICATE"]] == [("r-b", ["r-a"])]
+    assert [n["ruleId"] for n in by_type["NEVER_FIRES"]] == ["r-f"]
+    # a missing price is reported, but it is not a logical conflict
+    assert sorted(n["ruleId"] for n in by_type["NO_PRICE"]) == ["r-g", "r-h"]
+    assert "CONTRADICTORY" not in by_type
+
+    overlaps = {o["conditionId"]: set(o["relatedRuleIds"]) for o in by_type["OVERLAP"]}
+    assert overlaps["c1"] == {"r-a", "r-b", "r-e"}
+    assert overlaps["d1"] == {"r-e"}
+    assert ("r-a" in overlaps["b1"]) is False
+    assert overlaps["g1"] == {"r-h"}
+
+
+def test_find_conflicts_cap_counts_skipped_pairs():
+    from app.services.rule_conflicts import MAX_RELATED, ConditionRow, find_conflicts
+
+    compared = 0
+
+    class RuleId(str):
+        __hash__ = str.__hash__
+
+        def __eq__(self, other):
+            nonlocal compared
+            compared += 1
+            return str.__eq__(self, other)
+
+    def cond(rule, cid, comparator, threshold):
+        return ConditionRow(RuleId(rule), rule, cid, "owned-1", 1, 2, 2, 2, "COMPETITOR_MINUS_OWN", comparator, threshold)
+
+    # thousands of nested ranges of one rule: none pair with each other, but
+    # each one examined still counts toward the per-range cap
+    n = 2000
+    conditions = [cond("r-many", f"m{i}", "GT", i) for i in range(n)]
+    conditions.append(cond("r-other", "o1", "GT", n))
+    out = find_conflicts(conditions)
+
+    assert compared < 4 * MAX_RELATED * n   # not n * n / 2
+    overlaps = {o["conditionId"]: o["relatedRuleIds"] for o in out if o["conflictType"] == "OVERLAP"}
+    assert overlaps["o1"] == ["r-many"]
+    assert all(len(rel) <= MAX_RELATED for rel in overlaps.values())
+
+
+@pytest.mark.anyio
+async def test_rule_conflicts_for_user(client, db_session):
+    from datetime import datetime
+
+    from test_rules import _insert_owned_site, _me, _register_and_login
+
+    from app.db.models.master import Site
+    from app.db.models.prices import PriceLatest
+
+    token = await _register_and_login(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    me = await _me(client, token)
+
+    await client.post("/v1/admin/sync/master")
+    db_session.add(
+        Site(site_id=61401008, name="Competitor", address="Other St", brand_id=113, postcode="4209", lat=-27.87, lng=153.32)
+    )
+    now = datetime.utcnow()
+    for sid, price in ((61401007, 2119.0), (61401008, 2089.0)):
+        db_session.add(
+            PriceLatest(
+                site_id=sid, fuel_id=2, price_raw=price, price_cents=int(round(price)),
+                unavailable=False, transaction_date_utc=now, ingested_at=now,
+            )
+        )
+    await db_session.commit()
+    owned_site_id = await _insert_owned_site(db_session, user_id=me["id"], site_id=61401007)
+
+    rule_ids = {}
+    for comparator, threshold in (("GT", 5), ("GTE", 6), ("GT", 20)):
+        r = await client.post("/v1/me/rules", headers=headers, json={
+            "ownedSiteId": owned_site_id,
+            "competitorSiteId": 61401008,
+            "name": f"{comparator} {threshold}",
+            "conditions": [{
+                "ownFuelId": 2, "competitorFuelId": 2,
+                "direction": "COMPETITOR_MINUS_OWN", "comparator": comparator, "thresholdCents": threshold,
+            }],
+        })
+        assert r.status_code == 200, r.text
+        rule_ids[f"{comparator} {threshold}"] = r.json()["id"]
+
+    r = await client.get("/v1/rules/conflicts", headers=headers)
+    assert r.status_code == 200, r.text
+    by_type = {}
+    for item in r.json():
+        by_type.setdefault(item["conflictType"], []).append(item)
+
+    assert sorted(by_type) == ["DUPLICATE", "OVERLAP"]
+    # GT 5 and GTE 6 fire for the same prices; one is reported against the other
+    (dup,) = by_type["DUPLICATE"]
+    assert {dup["ruleId"], *dup["relatedRuleIds"]} == {rule_ids["GT 5"], rule_ids["GTE 6"]}
+    overlaps = {o["ruleId"]: set(o["relatedRuleIds"]) for o in by_type["OVERLAP"]}
+    assert overlaps[rule_ids["GT 20"]] == {rule_ids["GT 5"], rule_ids["GTE 6"]}
@@ -157,6 +157,25 @@ async def test_create_rule_invalid_comparator_returns_400(client, db_session):
     assert "Invalid comparator" in r.text
 
 
+@pytest.mark.anyio
+async def test_single_create_does_not_check_competitor_site(client, db_session):
+    # only bulk create and templates reject unknown competitor sites
+    token = await _register_and_login(client)
+    me = await _me(client, token)
+    owned_site_id = await _insert_owned_site(db_session, user_id=me["id"], site_id=61401007)
+
+    r = await client.post("/v1/me/rules", headers=_auth_headers(token), json={
+        "ownedSiteId": owned_site_id,
+        "competitorSiteId": 99999999,
+        "name": "Not synced yet",
+        "conditions": [{
+            "ownFuelId": 2, "competitorFuelId": 2,
+            "direction": "COMPETITOR_MINUS_OWN", "comparator": "GT", "thresholdCents": 5,
+        }],
+    })
+    assert r.status_code == 200, r.text
+
+
 @pytest.mark.anyio
 async def test_create_rule_invalid_direction_returns_400(client, db_session):
     token = await _register_and_login(client)
@@ -185,3 +204,244 @@ async def test_create_rule_invalid_direction_returns_400(client, db_session):
     r = await client.post("/v1/me/rules", json=payload, headers=_auth_headers(token))
     assert r.status_code == 400, r.text
     assert "Invalid direction" in r.text
+
+
+@pytest.mark.anyio
+async def test_list_rules_sparse_fields(client, db_session):
+    token = await _register_and_login(client)
+    me = await _me(client, token)
+
+    r = await client.post("/v1/admin/sync/master")
+    assert r.status_code == 200, r.text
+
+    owned_site_id = await _insert_owned_site(db_session, user_id=me["id"], site_id=61401007)
+
+    payload = {
+        "ownedSiteId": owned_site_id,
+        "competitorSiteId": 61401007,
+        "name": "Toggle Rule",
+        "conditions": [
+            {
+                "ownFuelId": 2,
+                "competitorFuelId": 2,
+                "direction": "COMPETITOR_MINUS_OWN",
+                "comparator": "LT",
+                "thresholdCents": 5,
+            }
+        ],
+    }
+    r = await client.post("/v1/me/rules", json=payload, headers=_auth_headers(token))
+    assert r.status_code == 200, r.text
+
+    r = await client.get("/v1/me/rules", params={"fields": "id,isEnabled"}, headers=_auth_headers(token))
+    assert r.status_code == 200, r.text
+    rules = r.json()
+    assert len(rules) == 1
+    assert set(rules[0]) == {"id", "isEnabled"}
+
+    r = await client.get("/v1/me/rules", params={"fields": "bogus"}, headers=_auth_headers(token))
+    assert r.status_code == 400, r.text
+
+
+@pytest.mark.anyio
+async def test_list_rules_query_count_is_constant(client, db_session, test_engine):
+    from sqlalchemy import event
+
+    token = await _register_and_login(client)
+    me = await _me(client, token)
+    await client.post("/v1/admin/sync/master")
+    owned_site_id = await _insert_owned_site(db_session, user_id=me["id"], site_id=61401007)
+
+    statements = []
+
+    def _count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    async def _list_queries() -> int:
+        statements.clear()
+        event.listen(test_engine.sync_engine, "before_cursor_execute", _count)
+        try:
+            r = await client.get("/v1/me/rules", headers=_auth_headers(token))
+        finally:
+            event.remove(test_engine.sync_engine, "before_cursor_execute", _count)
+        assert r.status_code == 200, r.text
+        assert all(x["ownedSite"]["siteId"] == 61401007 for x in r.json())
+        return len(statements)
+
+    async def _create(name: str) -> None:
+        r = await client.post("/v1/me/rules", headers=_auth_headers(token), json={
+            "ownedSiteId": owned_site_id,
+            "competitorSiteId": 61401007,
+            "name": name,
+            "conditions": [{
+                "ownFuelId": 2, "competitorFuelId": 2,
+                "direction": "COMPETITOR_MINUS_OWN", "comparator": "LT", "thresholdCents": 5,
+            }],
+        })
+        assert r.status_code == 200, r.text
+
+    await _create("one")
+    single = await _list_queries()
+    for i in range(5):
+        await _create(f"more {i}")
+    assert await _list_queries() == single
+
+
+@pytest.mark.anyio
+async def test_rules_read_model_follows_writes_and_rebuilds(client, db_session):
+    from datetime import datetime
+
+    from app.db.models_notifications import RuleAlertState
+    from app.services.rule_read_model import apply_trigger_transitions, rebuild_rule_read_models
+
+    token = await _register_and_login(client)
+    me = await _me(client, token)
+    await client.post("/v1/admin/sync/master")
+    owned_site_id = await _insert_owned_site(db_session, user_id=me["id"], site_id=61401007)
+
+    r = await client.post("/v1/me/rules", headers=_auth_headers(token), json={
+        "ownedSiteId": owned_site_id,
+        "competitorSiteId": 61401007,
+        "name": "Read model",
+        "conditions": [{
+            "ownFuelId": 2, "competitorFuelId": 2,
+            "direction": "COMPETITOR_MINUS_OWN", "comparator": "LT", "thresholdCents": 5,
+        }],
+    })
+    assert r.status_code == 200, r.text
+    rule_id = r.json()["id"]
+    cond_id = r.json()["conditions"][0]["id"]
+
+    async def _listed() -> dict:
+        r = await client.get("/v1/me/rules", headers=_auth_headers(token))
+        assert r.status_code == 200, r.text
+        return {x["id"]: x for x in r.json()}
+
+    listed = (await _listed())[rule_id]
+    assert listed["competitorSite"]["siteName"] == "7-Eleven Coomera"
+    assert listed["isTriggered"] is False
+
+    # alert state transition
+    await apply_trigger_transitions(db_session, {rule_id: {cond_id: True}}, datetime.utcnow())
+    await db_session.commit()
+    listed = (await _listed())[rule_id]
+    assert listed["isTriggered"] is True and listed["conditions"][0]["isTriggered"] is True
+
+    # rule and owned site edits; trigger state survives
+    r = await client.patch(f"/v1/me/rules/{rule_id}", headers=_auth_headers(token), json={"name": "Renamed"})
+    assert r.status_code == 200, r.text
+    r = await client.patch(f"/v1/me/owned-sites/{owned_site_id}", headers=_auth_headers(token), json={"nickname": "Home"})
+    assert r.status_code == 200, r.text
+    listed = (await _listed())[rule_id]
+    assert listed["name"] == "Renamed" and listed["ownedSite"]["nickname"] == "Home"
+    assert listed["isTriggered"] is True
+
+    # rebuilt from scratch: trigger state comes from rule_alert_state
+    db_session.add(RuleAlertState(user_id=me["id"], rule_id=rule_id, condition_id=cond_id, is_currently_triggered=False))
+    await db_session.commit()
+    assert await rebuild_rule_read_models(db_session, me["id"]) == 1
+    listed = (await _listed())[rule_id]
+    assert listed["name"] == "Renamed" and listed["isTriggered"] is False
+
+    r = await client.delete(f"/v1/me/rules/{rule_id}", headers=_auth_headers(token))
+    assert r.status_code == 200, r.text
+    assert await _listed() == {}
+
+
+@pytest.mark.anyio
+async def test_rules_read_model_follows_master_sync_and_startup_check(client, db_session, monkeypatch):
+    from contextlib import asynccontextmanager
+
+    from sqlalchemy import update
+
+    from app.db.models.master import Site
+    from app.db.models_rules import PricingRuleReadModel
+    from app.ingestion import events
+    from app.services import rule_read_model
+
+    @asynccontextmanager
+    async def _session():
+        yield db_session
+
+    monkeypatch.setattr(rule_read_model, "SessionLocal", _session)
+    monkeypatch.setattr(events, "_master_listeners", [rule_read_model.on_master_synced])
+
+    token = await _register_and_login(client)
+    me = await _me(client, token)
+    await client.post("/v1/admin/sync/master")
+    owned_site_id = await _insert_owned_site(db_session, user_id=me["id"], site_id=61401007)
+    r = await client.post("/v1/me/rules", headers=_auth_headers(token), json={
+        "ownedSiteId": owned_site_id,
+        "competitorSiteId": 61401007,
+        "name": "Names",
+        "conditions": [{
+            "ownFuelId": 2, "competitorFuelId": 2,
+            "direction": "COMPETITOR_MINUS_OWN", "comparator": "LT", "thresholdCents": 5,
+        }],
+    })
+    assert r.status_code == 200, r.text
+    rule_id = r.json()["id"]
+
+    async def _site_name() -> str:
+        r = await client.get("/v1/me/rules", headers=_auth_headers(token))
+        return {x["id"]: x for x in r.json()}[rule_id]["competitorSite"]["siteName"]
+
+    # stored under an old name; the next master sync renames it and the rule follows
+    await db_session.execute(update(Site).where(Site.site_id == 61401007).values(name="Old name"))
+    await rule_read_model.refresh_rule_read_models(db_session, [rule_id])
+    await db_session.commit()
+    assert await _site_name() == "Old name"
+    await client.post("/v1/admin/sync/master")
+    assert await _site_name() == "7-Eleven Coomera"
+
+    # same row count, different ids: startup still rebuilds
+    row = await db_session.get(PricingRuleReadModel, rule_id)
+    await db_session.delete(row)
+    await db_session.flush()
+    db_session.add(PricingRuleReadModel(
+        rule_id="orphan", user_id=me["id"], owned_site_id=owned_site_id,
+        created_at=row.created_at, doc={}, triggered=[],
+    ))
+    await db_session.commit()
+    await rule_read_model.ensure_rule_read_models()
+    assert await db_session.get(PricingRuleReadModel, "orphan") is None
+    assert await _site_name() == "7-Eleven Coomera"
+
+
+@pytest.mark.anyio
+async def test_bulk_import_and_template_report_row_errors(client, db_session):
+    token = await _register_and_login(client)
+    me = await _me(client, token)
+    await client.post("/v1/admin/sync/master")
+    site_a = await _insert_owned_site(db_session, user_id=me["id"], site_id=61401007)
+    site_b = await _insert_owned_site(db_session, user_id=me["id"], site_id=61401007)
+
+    cond = {
+        "ownFuelId": 2, "competitorFuelId": 2,
+        "direction": "COMPETITOR_MINUS_OWN", "comparator": "LT", "thresholdCents": 5,
+    }
+    r = await client.post("/v1/me/rules/bulk", headers=_auth_headers(token), json={"rules": [
+        {"ownedSiteId": site_a, "competitorSiteId": 61401007, "name": "ok", "conditions": [cond, cond]},
+        {"ownedSiteId": site_a, "competitorSiteId": 61401007, "name": "bad", "conditions": [{**cond, "comparator": "NOPE"}]},
+        {"ownedSiteId": str(uuid.uuid4()), "competitorSiteId": 61401007, "name": "not mine", "conditions": [cond]},
+    ]})
+    assert r.status_code == 200, r.text
+    data = r.json()
+    assert (data["created"], data["failed"]) == (1, 2)
+    assert [e["index"] for e in data["errors"]] == [1, 2]
+    assert data["errors"][1]["status"] == 404
+
+    # all owned sites x two competitors, one of which doesn't exist
+    r = await client.post("/v1/me/rules/template", headers=_auth_headers(token), json={
+        "name": "Undercut", "competitorSiteIds": [61401007, 99999999], "conditions": [cond],
+    })
+    assert r.status_code == 200, r.text
+    data = r.json()
+    assert data["created"] == 2 and data["failed"] == 2
+    assert {x["ownedSiteId"] for x in data["rules"]} == {site_a, site_b}
+    assert {e["competitorSiteId"] for e in data["errors"]} == {99999999}
+
+    r = await client.get("/v1/me/rules", headers=_auth_headers(token))
+    rules = r.json()
+    assert sorted(x["name"] for x in rules) == ["Undercut", "Undercut", "ok"]
+    assert [len(x["conditions"]) for x in rules if x["name"] == "ok"] == [2]
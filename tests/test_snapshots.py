@@ -0,0 +1,73 @@
+# tests/test_snapshots.py
+from contextlib import asynccontextmanager
+
+import pytest
+
+
+@pytest.fixture()
+def snapshot_env(db_session, monkeypatch, tmp_path):
+    from app.core.settings import settings
+    from app.services import snapshot_service
+
+    @asynccontextmanager
+    async def _session():
+        yield db_session
+
+    monkeypatch.setattr(settings, "SNAPSHOT_DIR", str(tmp_path))
+    monkeypatch.setattr(snapshot_service, "SessionLocal", _session)
+    return snapshot_service
+
+
+@pytest.mark.anyio
+async def test_snapshot_written_and_served(client, snapshot_env):
+    r = await client.get("/v1/snapshots/latest")
+    assert r.status_code == 404
+
+    await client.post("/v1/admin/sync/master")
+    await client.post("/v1/admin/sync/prices")
+
+    manifest = await snapshot_env.write_snapshot()
+    assert manifest["sites"] == 1
+    assert manifest["prices"] == 1
+
+    r = await client.get("/v1/snapshots/manifest")
+    assert r.status_code == 200, r.text
+    assert r.json()["version"] == manifest["version"]
+
+    r = await client.get("/v1/snapshots/latest")
+    assert r.status_code == 200, r.text
+    assert r.headers["etag"] == f'"{manifest["version"]}"'
+    data = r.json()
+    assert data["prices"]["siteId"] == [61401007]
+    assert data["prices"]["priceCents"] == [2119]
+
+    r = await client.get("/v1/snapshots/latest", headers={"If-None-Match": f'"{manifest["version"]}"'})
+    assert r.status_code == 304
+
+    # same data -> same immutable file
+    again = await snapshot_env.write_snapshot()
+    assert again["file"] == manifest["file"]
+
+    r = await client.get(f"/v1/snapshots/{manifest['version']}")
+    assert r.status_code == 200, r.text
+    assert "immutable" in r.headers["cache-control"]
+
+
+@pytest.mark.anyio
+async def test_snapshot_decoded_for_clients_without_gzip(client, snapshot_env):
+    await client.post("/v1/admin/sync/master")
+    await client.post("/v1/admin/sync/prices")
+    manifest = await snapshot_env.write_snapshot()
+
+    r = await client.get("/v1/snapshots/latest", headers={"Accept-Encoding": "identity"})
+    assert r.status_code == 200, r.text
+    assert "content-encoding" not in r.headers
+    assert r.headers["etag"] == f'"{manifest["version"]}-identity"'
+    assert r.json()["prices"]["priceCents"] == [2119]
+
+    # the gzip'd representation's tag doesn't validate the decoded one
+    r = await client.get(
+        "/v1/snapshots/latest",
+        headers={"Accept-Encoding": "identity", "If-None-Match": f'"{manifest["version"]}"'},
+    )
+    assert r.status_code == 200